@@ -7,8 +7,15 @@ from __future__ import annotations
 import base64
 import csv
 from enum import Enum, auto
-from functools import wraps
+from collections import OrderedDict
+from functools import lru_cache, wraps
+import hmac
+import math
+import os
 from pathlib import Path
+import sqlite3
+import threading
+import time
 from typing import (
     cast,
     Optional,
@@ -20,9 +27,11 @@ from typing import (
     Iterable,
     Union,
     Iterator,
+    NamedTuple,
 )
 import werkzeug.security
 from flask import Flask, current_app, jsonify, request, abort, g, Response
+import model
 
 
 class Role(Enum):
@@ -68,8 +77,9 @@ class User:
         self.password = werkzeug.security.generate_password_hash(plain_text)
 
     def is_valid_password(self, plain_text: str) -> bool:
-        return werkzeug.security.check_password_hash(
-            self.password or "md5$$", plain_text
+        # An anonymous user, without a password, can't be authenticated.
+        return self.password is not None and werkzeug.security.check_password_hash(
+            self.password, plain_text
         )
 
     def __repr__(self) -> str:
@@ -138,20 +148,27 @@ class Users:
 
     def load(self) -> None:
         """Load file when needed."""
+        self.users = self.read()
+
+    def read(self) -> dict[str, User]:
         if not self.app:
             raise RuntimeError("Users not bound to an app")
         with self.app.config["USER_FILE"].open() as user_file:
             row_iter = csv.DictReader(user_file)
             user_iter = (User.from_dict(row) for row in row_iter if row)
-            self.users = {user.username: user for user in user_iter}
+            return {user.username: user for user in user_iter}
 
     def save(self) -> None:
         if not self.app:
             raise RuntimeError("Users not bound to an app")
-        with self.app.config["USER_FILE"].open("w", newline="") as user_file:
+        user_path = self.app.config["USER_FILE"]
+        temporary = user_path.with_name(f".{user_path.name}.tmp")
+        with temporary.open("w", newline="") as user_file:
             writer = csv.DictWriter(user_file, User.headers)
             writer.writeheader()
             writer.writerows(u.asdict() for u in self.users.values())
+        # Replace the whole file at once, so it's never read half-written.
+        os.replace(temporary, user_path)
 
     def __len__(self) -> int:
         return len(self.users)
@@ -160,6 +177,169 @@ class Users:
         return iter(self.users.values())
 
 
+class ReloadingUsers(Users):
+    """
+    Users from a file that's reloaded when it changes, without a restart.
+
+    The file is checked, with one :func:`os.stat`, at most once every
+    ``USER_FILE_INTERVAL`` seconds. A new device, inode, size, or modification time
+    starts a background thread to read it. The new dictionary replaces the old one
+    in a single assignment: a lookup is a dictionary ``get()``, without a lock,
+    and never waits for a reload. If the file can't be read, the previous users
+    are kept, and it's read again after the next check.
+
+    Users added by :meth:`add_user` are replaced by the next reload; :meth:`save` them first.
+    """
+
+    def __init__(self, init: Optional[dict[str, User]] = None) -> None:
+        super().__init__(init)
+        self.interval = 1.0
+        self.checked = float("-inf")
+        self.signature: Optional[tuple[int, int, int, int]] = None
+        self.reloading = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        super().init_app(app)
+        self.interval = app.config.setdefault("USER_FILE_INTERVAL", self.interval)
+
+    def get_user(self, name: str, default: Optional[User] = None) -> User:
+        if not self.app:
+            raise RuntimeError("Users not bound to an app")
+        now = time.monotonic()
+        if now - self.checked >= self.interval:
+            self.checked = now
+            self.check()
+        return self.users.get(name, default or self.anonymous)
+
+    def stat(self) -> Optional[tuple[int, int, int, int]]:
+        if not self.app:
+            raise RuntimeError("Users not bound to an app")
+        try:
+            status = self.app.config["USER_FILE"].stat()
+        except OSError:
+            return None
+        return (status.st_dev, status.st_ino, status.st_size, status.st_mtime_ns)
+
+    def check(self) -> None:
+        """Start a reload if the file has changed; the first load is done immediately."""
+        signature = self.stat()
+        if signature is None or signature == self.signature:
+            return
+        if not self.users:
+            self.users = self.read()
+            self.signature = signature
+        elif self.reloading.acquire(blocking=False):
+            threading.Thread(
+                target=self.reload,
+                args=(signature,),
+                name="ReloadingUsers",
+                daemon=True,
+            ).start()
+
+    def reload(self, signature: tuple[int, int, int, int]) -> None:
+        try:
+            self.users = self.read()
+            self.signature = signature
+        except (OSError, KeyError, ValueError) as ex:
+            if self.app:
+                self.app.logger.warning(f"users not reloaded: {ex!r}")
+        finally:
+            self.reloading.release()
+
+
+class SQLiteUsers(Users):
+    """
+    Users in a SQLite database, ``USER_DATABASE``, for a large number of users.
+    The username is the primary key, so a lookup is one indexed query,
+    and there's nothing to load or reload: each query sees the committed changes.
+    Each thread has its own connection; the table is created once, by :meth:`init_app`.
+    A ``":memory:"`` database belongs to one connection, so each thread gets its own,
+    empty, database, without the table; it only works from the thread that
+    called :meth:`init_app`, as in this example.
+
+    >>> demo = Flask("demo")
+    >>> demo.config["USER_DATABASE"] = ":memory:"
+    >>> database = SQLiteUsers()
+    >>> database.init_app(demo)
+    >>> database.add_user(User("noriko", "noriko@example.com", "Noriko K. L.", Role.BOTANIST))
+    >>> database.get_user("noriko")
+    User(username='noriko', email='noriko@example.com', real_name='Noriko K. L.', role='botanist', password=None)
+    >>> database.get_user("nobody").role
+    <Role.UNDEFINED: ''>
+    >>> len(database)
+    1
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            email TEXT NOT NULL,
+            real_name TEXT NOT NULL,
+            role TEXT NOT NULL,
+            password TEXT
+        ) WITHOUT ROWID
+    """
+    insert = (
+        "INSERT {} INTO users VALUES (:username, :email, :real_name, :role, :password)"
+    )
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.local = threading.local()
+
+    def init_app(self, app: Flask) -> None:
+        super().init_app(app)
+        app.config.setdefault("USER_DATABASE", Path("users.db"))
+        with self.connection() as connection:
+            connection.execute(self.schema)
+
+    def connection(self) -> sqlite3.Connection:
+        if not self.app:
+            raise RuntimeError("Users not bound to an app")
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.app.config["USER_DATABASE"])
+            connection.row_factory = sqlite3.Row
+            self.local.connection = connection
+        return cast(sqlite3.Connection, connection)
+
+    def get_user(self, name: str, default: Optional[User] = None) -> User:
+        row = (
+            self.connection()
+            .execute("SELECT * FROM users WHERE username = ?", (name,))
+            .fetchone()
+        )
+        if row is None:
+            return default or self.anonymous
+        return User.from_dict(dict(row))
+
+    def add_user(self, user: User) -> None:
+        try:
+            with self.connection() as connection:
+                connection.execute(self.insert.format(""), user.asdict())
+        except sqlite3.IntegrityError as ex:
+            raise ValueError("Duplicate Username") from ex
+
+    def import_csv(self, source: Path) -> int:
+        """Add, or replace, the users in a CSV file; returns the number of rows."""
+        with source.open() as user_file, self.connection() as connection:
+            rows = (row for row in csv.DictReader(user_file) if row)
+            cursor = connection.executemany(self.insert.format("OR REPLACE"), rows)
+        return cursor.rowcount
+
+    def save(self) -> None:
+        """Changes are committed as they're made."""
+        pass
+
+    def __len__(self) -> int:
+        (count,) = self.connection().execute("SELECT count(*) FROM users").fetchone()
+        return int(count)
+
+    def values(self) -> Iterator[User]:
+        for row in self.connection().execute("SELECT * FROM users"):
+            yield User.from_dict(dict(row))
+
+
 class NotAuthorized(Exception):
     def __init__(
         self,
@@ -178,6 +358,129 @@ class NotAuthorized(Exception):
         return rv
 
 
+class Verified(NamedTuple):
+    """A verified credential: when it expires, and the password hash it was checked against."""
+
+    expires: float
+    password: Optional[str]
+
+
+class CredentialCache:
+    """
+    Remember credentials that passed the password check,
+    so a request with the same credentials doesn't repeat the slow password hash.
+    An entry is used until it's ``ttl`` seconds old, or the user's password changes.
+    Only the most recent ``size`` entries are kept.
+
+    The entries are keyed by an HMAC of the username and password,
+    with a key that's random for each process: no password is kept in memory.
+
+    After ``failure_limit`` failures for a username from one client,
+    within ``failure_window`` seconds, more attempts are refused, unchecked,
+    with a 429 status, until the earliest failure is outside the window.
+    The failures are kept for the most recent ``failure_size`` usernames and clients;
+    they're only counted for users with a password, so an unknown username,
+    which fails quickly, can't push out the failures for a real one.
+
+    >>> cache = CredentialCache(ttl=60)
+    >>> user = User("noriko", "noriko@example.com", "Noriko K. L.", Role.BOTANIST)
+    >>> user.set_password("Hunter2")
+    >>> cache.valid(user, "noriko", "Hunter2", "127.0.0.1"), len(cache)
+    (True, 1)
+    >>> cache.valid(user, "noriko", "Hunter2", "127.0.0.1")
+    True
+    >>> user.set_password("correct horse battery staple")
+    >>> cache.valid(user, "noriko", "Hunter2", "127.0.0.1")
+    False
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        size: int = 1024,
+        failure_limit: int = 5,
+        failure_window: float = 60.0,
+        failure_size: int = 65536,
+    ) -> None:
+        self.ttl = ttl
+        self.size = size
+        self.failure_limit = failure_limit
+        self.failure_window = failure_window
+        self.failure_size = failure_size
+        self.secret = os.urandom(32)
+        self.verified: OrderedDict[bytes, Verified] = OrderedDict()
+        self.failures: OrderedDict[tuple[str, str], list[float]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        self.ttl = app.config.setdefault("AUTH_CACHE_TTL", self.ttl)
+        self.size = app.config.setdefault("AUTH_CACHE_SIZE", self.size)
+        self.failure_limit = app.config.setdefault(
+            "AUTH_FAILURE_LIMIT", self.failure_limit
+        )
+        self.failure_window = app.config.setdefault(
+            "AUTH_FAILURE_WINDOW", self.failure_window
+        )
+        self.failure_size = app.config.setdefault(
+            "AUTH_FAILURE_SIZE", self.failure_size
+        )
+
+    def digest(self, username: str, password: str) -> bytes:
+        message = username.encode("utf-8") + b"\0" + password.encode("utf-8")
+        return hmac.digest(self.secret, message, "sha256")
+
+    def valid(self, user: User, username: str, password: str, client: str) -> bool:
+        """
+        True if the password is valid for the user, who has the given username.
+        Raises :exc:`NotAuthorized` if there have been too many failures.
+
+        A check counts as a failure while it's in progress,
+        so concurrent guesses can't get past the limit.
+        """
+        key = self.digest(username, password)
+        now = time.monotonic()
+        entry = self.verified.get(key)
+        if entry and now < entry.expires and entry.password == user.password:
+            with self.lock:
+                if key in self.verified:
+                    self.verified.move_to_end(key)
+            return True
+        if user.password is None:
+            return False
+        attempt = (username, client)
+        with self.lock:
+            recent = [
+                t
+                for t in self.failures.get(attempt, [])
+                if now - t < self.failure_window
+            ]
+            if len(recent) >= self.failure_limit:
+                self.failures[attempt] = recent
+                raise NotAuthorized("Too Many Attempts", 429)
+            self.failures[attempt] = recent + [now]
+            self.failures.move_to_end(attempt)
+            while len(self.failures) > self.failure_size:
+                self.failures.popitem(last=False)
+        if user.is_valid_password(password):
+            with self.lock:
+                self.failures.pop(attempt, None)
+                if self.ttl > 0:
+                    self.verified[key] = Verified(now + self.ttl, user.password)
+                    self.verified.move_to_end(key)
+                    while len(self.verified) > self.size:
+                        self.verified.popitem(last=False)
+            return True
+        return False
+
+    def clear(self) -> None:
+        with self.lock:
+            self.verified.clear()
+            self.failures.clear()
+
+    def __len__(self) -> int:
+        return len(self.verified)
+
+
 def authenticate(view_function: Callable[..., Response]) -> Callable[..., Response]:
     @wraps(view_function)
     def decorated_function(*args: str) -> Response:
@@ -189,7 +492,9 @@ def authenticate(view_function: Callable[..., Response]) -> Callable[..., Respon
         g.user = users.get_user(username)  # type: ignore [attr-defined]
         conditions = [
             auth_type.upper() == "BASIC",
-            g.user.is_valid_password(password),  # type: ignore [attr-defined]
+            credential_cache.valid(
+                g.user, username, password, request.remote_addr or ""  # type: ignore [attr-defined]
+            ),
         ]
         if not all(conditions):
             raise NotAuthorized("Unknown User")
@@ -198,8 +503,183 @@ def authenticate(view_function: Callable[..., Response]) -> Callable[..., Respon
     return decorated_function
 
 
+class InvalidSample(Exception):
+    status_code = 400
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        payload: Optional[dict[str, Any]] = None,
+    ) -> None:
+        super().__init__(message)
+        self.message = message
+        if status_code is not None:
+            self.status_code = status_code
+        self.payload = payload
+
+    def to_dict(self) -> dict[str, Any]:
+        rv: dict[str, Any] = dict(self.payload or ())
+        rv["message"] = self.message
+        return rv
+
+
+def finite(value: Any) -> bool:
+    """
+    Is this a JSON number that's a usable measurement?
+    Flask's JSON parser accepts ``NaN`` and ``Infinity``, which JSON doesn't allow.
+
+    >>> finite(5.1), finite(True), finite(float("nan")), finite(10**400)
+    (True, False, False, False)
+    """
+    if type(value) not in (int, float):
+        return False
+    try:
+        return math.isfinite(value)
+    except OverflowError:
+        return False  # An int too big to be a float.
+
+
+class Classifier:
+    """
+    The :class:`model.Hyperparameter` used by the ``/classify`` route.
+    The training data is loaded once, by :meth:`load` when the app starts,
+    or by the first request; after that, it's shared, read-only, by all requests.
+
+    The hyperparameter never changes, so the species for each distinct set of
+    measurements is remembered, up to ``CLASSIFIER_CACHE_SIZE`` of them.
+
+    Requests are checked by :meth:`model.UnknownSample.from_dict`:
+    each sample must be an object with exactly the four measurements.
+    """
+
+    distances: dict[str, model.Distance] = {
+        "Chebyshev": model.Chebyshev(),
+        "Euclidean": model.Euclidean(),
+        "Manhattan": model.Manhattan(),
+        "Sorensen": model.Sorensen(),
+    }
+
+    header = ["sepal_length", "sepal_width", "petal_length", "petal_width", "species"]
+
+    def __init__(self) -> None:
+        self.app: Optional[Flask] = None
+        self.training: Optional[model.TrainingData] = None
+        self.hyperparameter: Optional[model.Hyperparameter] = None
+        self.species: Callable[[tuple[float, float, float, float]], str]
+        self.lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        self.app = app
+        self.app.config.setdefault("TRAINING_FILE", Path("bezdekIris.data"))
+        self.app.config.setdefault("CLASSIFIER_K", 5)
+        self.app.config.setdefault("CLASSIFIER_DISTANCE", "Euclidean")
+        self.app.config.setdefault("CLASSIFIER_BATCH_LIMIT", 1000)
+        self.app.config.setdefault("CLASSIFIER_CACHE_SIZE", 4096)
+
+    def load(self) -> model.Hyperparameter:
+        """Load the training data, and build the hyperparameter, replacing any previous one."""
+        if not self.app:
+            raise RuntimeError("Classifier not bound to an app")
+        config = self.app.config
+        training = model.TrainingData(config["TRAINING_FILE"].name)
+        with config["TRAINING_FILE"].open() as source_file:
+            reader = csv.DictReader(source_file, self.header)
+            training.load(reader)
+        hyperparameter = model.Hyperparameter(
+            config["CLASSIFIER_K"],
+            self.distances[config["CLASSIFIER_DISTANCE"]],
+            training,
+        )
+
+        @lru_cache(maxsize=int(config["CLASSIFIER_CACHE_SIZE"]))
+        def species(measurements: tuple[float, float, float, float]) -> str:
+            return hyperparameter.classify(model.UnknownSample(*measurements))
+
+        # The Hyperparameter only has a weak reference to its TrainingData.
+        self.training, self.species = training, species
+        self.hyperparameter = hyperparameter
+        return hyperparameter
+
+    def get_hyperparameter(self) -> model.Hyperparameter:
+        if self.hyperparameter is None:
+            with self.lock:
+                if self.hyperparameter is None:
+                    self.load()
+        return cast(model.Hyperparameter, self.hyperparameter)
+
+    def classify(self, samples: list[model.UnknownSample]) -> list[str]:
+        self.get_hyperparameter()
+        species = self.species
+        return [
+            species((s.sepal_length, s.sepal_width, s.petal_length, s.petal_width))
+            for s in samples
+        ]
+
+    def samples(self, rows: list[Any]) -> list[model.UnknownSample]:
+        """
+        Validate a batch of request rows, and create the samples.
+
+        >>> knn = Classifier()
+        >>> knn.samples([{"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4, "petal_width": 0.2}])
+        [UnknownSample(sepal_length=5.1, sepal_width=3.5, petal_length=1.4, petal_width=0.2, )]
+        >>> knn.samples([{"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4, "petal_width": "0.2x"}])
+        Traceback (most recent call last):
+        ...
+        classifier.InvalidSample: 1 invalid sample
+        >>> knn.samples([{"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4, "petal_width": float("nan")}])
+        Traceback (most recent call last):
+        ...
+        classifier.InvalidSample: 1 invalid sample
+        """
+        samples: list[model.UnknownSample] = []
+        invalid: dict[int, model.InvalidSampleError] = {}
+        for n, row in enumerate(rows):
+            try:
+                if not isinstance(row, dict):
+                    raise model.InvalidSampleError(f"invalid {row!r}")
+                sample = model.UnknownSample.from_dict(row)
+                if not all(
+                    finite(m)
+                    for m in (
+                        sample.sepal_length,
+                        sample.sepal_width,
+                        sample.petal_length,
+                        sample.petal_width,
+                    )
+                ):
+                    raise model.InvalidSampleError(f"non-finite value in {row!r}")
+                samples.append(sample)
+            except model.InvalidSampleError as ex:
+                invalid[n] = ex
+            except OverflowError:
+                invalid[n] = model.InvalidSampleError(f"invalid {row!r}")
+        if invalid:
+            raise InvalidSample(
+                f"{len(invalid)} invalid sample{'' if len(invalid) == 1 else 's'}",
+                payload={
+                    "errors": [
+                        {"index": n, "error": str(error)}
+                        for n, error in invalid.items()
+                    ]
+                },
+            )
+        return samples
+
+
 class Config:
     USER_FILE = Path("data/users.csv")
+    USER_FILE_INTERVAL = 1.0
+    TRAINING_FILE = Path("../bezdekIris.data")
+    CLASSIFIER_K = 5
+    CLASSIFIER_DISTANCE = "Euclidean"
+    CLASSIFIER_BATCH_LIMIT = 1000
+    CLASSIFIER_CACHE_SIZE = 4096
+    AUTH_CACHE_TTL = 300.0
+    AUTH_CACHE_SIZE = 1024
+    AUTH_FAILURE_LIMIT = 5
+    AUTH_FAILURE_WINDOW = 60.0
+    AUTH_FAILURE_SIZE = 65536
 
 
 class Demo(Config):
@@ -211,8 +691,12 @@ class Demo(Config):
 app = Flask(__name__)
 # Might want to use os.environ["CLASSIFIER_CONFIG"]
 app.config.from_object(Demo)
-users = Users()
+users = ReloadingUsers()
 users.init_app(app)
+knn = Classifier()
+knn.init_app(app)
+credential_cache = CredentialCache()
+credential_cache.init_app(app)
 
 
 @app.errorhandler(NotAuthorized)  # type: ignore [misc]
@@ -222,6 +706,13 @@ def handle_unauthorized(error: NotAuthorized) -> Response:
     return response
 
 
+@app.errorhandler(InvalidSample)  # type: ignore [misc]
+def handle_invalid_sample(error: InvalidSample) -> Response:
+    response = jsonify(error.to_dict())
+    response.status_code = error.status_code
+    return response
+
+
 @app.route("/health")
 def user_list() -> Response:
     # Be sure the users database gets loaded.
@@ -244,5 +735,38 @@ def who_am_i() -> Response:
     )
 
 
+@app.route("/classify", methods=["POST"])
+@authenticate
+def classify() -> Response:
+    """
+    Classify one sample, a JSON object, or a batch of samples, a JSON array of objects.
+    The response has the species, or a list of species for a batch.
+    The ``Server-Timing`` header has the milliseconds spent on validation and classification.
+    """
+    start = time.perf_counter()
+    document = request.get_json(silent=True)
+    batch = document if isinstance(document, list) else [document]
+    if len(batch) > app.config["CLASSIFIER_BATCH_LIMIT"]:
+        raise InvalidSample(
+            f"more than {app.config['CLASSIFIER_BATCH_LIMIT']} samples", 413
+        )
+    samples = knn.samples(batch)
+    validated = time.perf_counter()
+    species = knn.classify(samples)
+    classified = time.perf_counter()
+    response = jsonify(
+        {
+            "status": "OK",
+            "species": species if isinstance(document, list) else species[0],
+        }
+    )
+    response.headers["Server-Timing"] = (
+        f"validate;dur={(validated - start) * 1000:.3f}, "
+        f"classify;dur={(classified - validated) * 1000:.3f}"
+    )
+    return response
+
+
 if __name__ == "__main__":
+    knn.load()
     app.run(ssl_context="adhoc")
@@ -82,7 +82,13 @@ class KnownSample(Sample):
 
     @classmethod
     def from_dict(cls, row: dict[str, str]) -> "KnownSample":
-        if row["species"] not in {"Iris-setosa", "Iris-versicolour", "Iris-virginica"}:
+        # bezdekIris.data spells it "versicolor", iris.names spells it "Versicolour".
+        if row["species"] not in {
+            "Iris-setosa",
+            "Iris-versicolor",
+            "Iris-versicolour",
+            "Iris-virginica",
+        }:
             raise InvalidSampleError(f"invalid species in {row!r}")
         try:
             return cls(
@@ -405,8 +411,12 @@ class Hyperparameter:
         if not training_data:
             raise RuntimeError("No TrainingData object")
         distances: list[tuple[float, TrainingKnownSample]] = sorted(
-            (self.algorithm.distance(sample, known), known)
-            for known in training_data.training
+            (
+                (self.algorithm.distance(sample, known), known)
+                for known in training_data.training
+            ),
+            # Equally distant samples aren't ordered.
+            key=lambda distance_known: distance_known[0],
         )
         k_nearest = (known.species for d, known in distances[: self.k])
         frequency: Counter[str] = collections.Counter(k_nearest)
@@ -323,8 +323,12 @@ class Hyperparameter:
         if not training_data:
             raise RuntimeError("No TrainingData object")
         distances: list[tuple[float, KnownSample]] = sorted(
-            (self.algorithm.distance(sample, known), known)
-            for known in training_data.training
+            (
+                (self.algorithm.distance(sample, known), known)
+                for known in training_data.training
+            ),
+            # Equally distant samples aren't ordered.
+            key=lambda distance_known: distance_known[0],
         )
         k_nearest = (known.species for d, known in distances[: self.k])
         frequency: Counter[str] = collections.Counter(k_nearest)
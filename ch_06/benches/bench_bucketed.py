@@ -0,0 +1,64 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 6, Abstract Base Classes and Operator Overloading
+
+Compare BucketedCollection with BucketedCollection_128 for duplicate rejection.
+"""
+from __future__ import annotations
+import random
+import sys
+import time
+from typing import Union
+from model import *
+
+
+def generated(n: int, duplicates: float = 0.10) -> list[SampleDict]:
+    """Rows with two decimal places, like the Iris data, some of them repeated."""
+    random.seed(42)
+    rows: list[SampleDict] = []
+    for i in range(n):
+        if rows and random.random() < duplicates:
+            rows.append(random.choice(rows))
+        else:
+            rows.append(
+                {
+                    "sepal_length": round(random.uniform(4, 8), 2),
+                    "sepal_width": round(random.uniform(2, 4.5), 2),
+                    "petal_length": round(random.uniform(1, 7), 2),
+                    "petal_width": round(random.uniform(0.1, 2.5), 2),
+                    "species": random.choice(["setosa", "versicolor", "virginica"]),
+                }
+            )
+    return rows
+
+
+class BucketedDealingPartition_80_128(BucketedDealingPartition_80):
+    collection_class = BucketedCollection_128
+
+
+def dealing(
+    partition_class: type[BucketedDealingPartition_80], rows: list[SampleDict]
+) -> None:
+    start = time.perf_counter()
+    partition = partition_class(rows)
+    end = time.perf_counter()
+    print(
+        f"| {partition_class.collection_class.__name__:24s} "
+        f"| {len(rows):8,d} "
+        f"| {len(partition.training):8,d} | {len(partition.testing):8,d} "
+        f"| {end-start:8.3f}s |"
+    )
+
+
+def main(sizes: list[int]) -> None:
+    print("| collection               | rows     | training | testing  | time      |")
+    print("|--------------------------|----------|----------|----------|-----------|")
+    for n in sizes:
+        rows = generated(n)
+        dealing(BucketedDealingPartition_80, rows)
+        dealing(BucketedDealingPartition_80_128, rows)
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 50_000, 100_000])
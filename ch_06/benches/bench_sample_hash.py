@@ -0,0 +1,113 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 6, Abstract Base Classes and Operator Overloading
+
+Deduplicate a million samples, with and without a memoised hash.
+"""
+
+from __future__ import annotations
+import random
+import sys
+import time
+from typing import Any, Callable, Iterable
+from model import *
+
+
+class RecomputingSample(KnownSample):
+    """The hash and equality of the samples before the hash was memoised."""
+
+    def hash(self) -> int:
+        return (
+            sum(
+                [
+                    hash(self.sepal_length),
+                    hash(self.sepal_width),
+                    hash(self.petal_length),
+                    hash(self.petal_width),
+                ]
+            )
+            % sys.hash_info.modulus
+        )
+
+    def __hash__(self) -> int:
+        return self.hash()
+
+    def __eq__(self, other: Any) -> bool:
+        if self.hash() != other.hash():
+            return False
+        return all(
+            [
+                self.sepal_length == other.sepal_length,
+                self.sepal_width == other.sepal_width,
+                self.petal_length == other.petal_length,
+                self.petal_width == other.petal_width,
+                self.species == other.species,
+            ]
+        )
+
+
+def generated(
+    sample_class: type[KnownSample], n: int, distinct: int = 50_000
+) -> list[KnownSample]:
+    """
+    ``n`` samples, drawn from ``distinct`` different rows,
+    so most samples are duplicates; the measurements have one decimal place,
+    so many rows share a measurement sum, and some share all four measurements
+    with a different species.
+    """
+    random.seed(42)
+    rows = [
+        (
+            random.choice(["setosa", "versicolor", "virginica"]),
+            round(random.uniform(4, 8), 1),
+            round(random.uniform(2, 4.5), 1),
+            round(random.uniform(1, 7), 1),
+            round(random.uniform(0.1, 2.5), 1),
+        )
+        for _ in range(distinct)
+    ]
+    return [sample_class(*random.choice(rows)) for _ in range(n)]
+
+
+def bucketed(samples: Iterable[KnownSample]) -> int:
+    unique = BucketedCollection()
+    for s in samples:
+        if s not in unique:
+            unique.append(s)
+    return len(unique)
+
+
+def hashed(samples: Iterable[KnownSample]) -> int:
+    return len(set(samples))
+
+
+def run(
+    dedup: Callable[[Iterable[KnownSample]], int], samples: list[KnownSample]
+) -> None:
+    start = time.perf_counter()
+    unique = dedup(samples)
+    end = time.perf_counter()
+    print(
+        f"| {type(samples[0]).__name__:20s} "
+        f"| {dedup.__name__:8s} "
+        f"| {len(samples):9,d} | {unique:7,d} "
+        f"| {end-start:7.3f}s |"
+    )
+
+
+def main(n: int = 1_000_000, baseline: int = 100_000) -> None:
+    """
+    The recomputed hash collides so often that deduplicating is close to quadratic;
+    it gets a smaller ``baseline`` count of samples so the benchmark finishes.
+    """
+    print("| sample               | dedup    | samples   | unique  | time     |")
+    print("|----------------------|----------|-----------|---------|----------|")
+    for sample_class, count in (TrainingKnownSample, n), (RecomputingSample, baseline):
+        samples = generated(sample_class, count)
+        for dedup in bucketed, hashed:
+            run(dedup, samples)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
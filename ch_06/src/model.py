@@ -31,13 +31,19 @@ from typing import (
     TypedDict,
     TypeVar,
     DefaultDict,
+    SupportsIndex,
 )
 import weakref
 import yaml
 
 
 class Sample:
-    """Abstract superclass for all samples."""
+    """
+    Abstract superclass for all samples.
+
+    The measurements are an immutable tuple, :attr:`features`,
+    so the hash is computed once, when the sample is created.
+    """
 
     def __init__(
         self,
@@ -46,10 +52,24 @@ class Sample:
         petal_length: float,
         petal_width: float,
     ) -> None:
-        self.sepal_length = sepal_length
-        self.sepal_width = sepal_width
-        self.petal_length = petal_length
-        self.petal_width = petal_width
+        self.features = (sepal_length, sepal_width, petal_length, petal_width)
+        self._hash = hash(self.features)
+
+    @property
+    def sepal_length(self) -> float:
+        return self.features[0]
+
+    @property
+    def sepal_width(self) -> float:
+        return self.features[1]
+
+    @property
+    def petal_length(self) -> float:
+        return self.features[2]
+
+    @property
+    def petal_width(self) -> float:
+        return self.features[3]
 
     def __repr__(self) -> str:
         return (
@@ -62,31 +82,17 @@ class Sample:
         )
 
     def hash(self) -> int:
-        return (
-            sum(
-                [
-                    hash(self.sepal_length),
-                    hash(self.sepal_width),
-                    hash(self.petal_length),
-                    hash(self.petal_width),
-                ]
-            )
-            % sys.hash_info.modulus
-        )
+        return self._hash
+
+    def __hash__(self) -> int:
+        return self._hash
 
     def __eq__(self, other: Any) -> bool:
-        if not issubclass(type(other), Sample):
+        if not isinstance(other, Sample):
             return False
-        if self.hash() != other.hash():
+        if self._hash != other._hash:
             return False
-        return all(
-            [
-                self.sepal_length == other.sepal_length,
-                self.sepal_width == other.sepal_width,
-                self.petal_length == other.petal_length,
-                self.petal_width == other.petal_width,
-            ]
-        )
+        return self.features == other.features
 
 
 class KnownSample(Sample):
@@ -120,16 +126,14 @@ class KnownSample(Sample):
         )
 
     def __eq__(self, other: Any) -> bool:
-        other = cast(KnownSample, other)
-        return all(
-            [
-                self.sepal_length == other.sepal_length,
-                self.sepal_width == other.sepal_width,
-                self.petal_length == other.petal_length,
-                self.petal_width == other.petal_width,
-                self.species == other.species,
-            ]
-        )
+        if not isinstance(other, KnownSample):
+            return False
+        if self._hash != other._hash:
+            return False
+        return self.features == other.features and self.species == other.species
+
+    # Defining __eq__() would otherwise make this class unhashable.
+    __hash__ = Sample.__hash__
 
 
 class TrainingKnownSample(KnownSample):
@@ -366,8 +370,12 @@ class Hyperparameter:
         if not training_data:
             raise RuntimeError("No TrainingData object")
         distances: list[tuple[float, TrainingKnownSample]] = sorted(
-            (self.algorithm.distance(sample, known), known)
-            for known in training_data.training
+            (
+                (self.algorithm.distance(sample, known), known)
+                for known in training_data.training
+            ),
+            # Equally distant samples aren't ordered.
+            key=lambda distance_known: distance_known[0],
         )
         k_nearest = (known.species for d, known in distances[: self.k])
         frequency: Counter[str] = collections.Counter(k_nearest)
@@ -422,6 +430,15 @@ class SamplePartition(List[SampleDict], abc.ABC):
 
 
 class ShufflingSamplePartition(SamplePartition):
+    """
+    Shuffle once, then split. The training and testing lists are built once,
+    and reused until the samples change. ``extend()`` and ``append()`` bump
+    :attr:`version`; after the split, they route new samples to training or testing
+    to keep the ratio, without reshuffling the samples already split.
+    Any other change to the list, like ``ssp[i] = row``, ``pop()``, or ``sort()``,
+    also bumps :attr:`version`, and the lists are rebuilt.
+    """
+
     def __init__(
         self,
         iterable: Optional[Iterable[SampleDict]] = None,
@@ -430,21 +447,121 @@ class ShufflingSamplePartition(SamplePartition):
     ) -> None:
         super().__init__(iterable, training_subset=training_subset)
         self.split: Optional[int] = None
+        self.version = 0
+        self._partitions: Optional[
+            tuple[int, int, list[TrainingKnownSample], list[TestingKnownSample]]
+        ] = None
 
     def shuffle(self) -> None:
         if not self.split:
-            random.shuffle(self)
+            shuffled = list(self)
+            random.shuffle(shuffled)
+            super().__setitem__(slice(None), shuffled)
             self.split = int(len(self) * self.training_subset)
+            self._partitions = None
+
+    def partitions(
+        self,
+    ) -> tuple[list[TrainingKnownSample], list[TestingKnownSample]]:
+        """The training and testing lists, built if the samples have changed."""
+        self.shuffle()
+        cached = self.cached()
+        if cached is None:
+            cached = (
+                [TrainingKnownSample(**sd) for sd in self[: self.split]],
+                [TestingKnownSample(**sd) for sd in self[self.split :]],
+            )
+            self._partitions = (self.version, len(self), *cached)
+        return cached
+
+    def extend(self, items: Iterable[SampleDict]) -> None:
+        self.route(list(items))
+
+    def append(self, item: SampleDict) -> None:
+        self.route([item])
+
+    def route(self, new: list[SampleDict]) -> None:
+        """Add new samples; after the split, add them to training or testing."""
+        cached = self.cached()
+        self.version += 1
+        if not self.split:
+            super().extend(new)
+            return
+        # Enough of the new samples go to training to keep the ratio.
+        target = int((len(self) + len(new)) * self.training_subset)
+        to_training = min(len(new), max(0, target - self.split))
+        new_training, new_testing = new[:to_training], new[to_training:]
+        super().__setitem__(slice(self.split, self.split), new_training)
+        self.split += len(new_training)
+        super().extend(new_testing)
+        if cached:
+            training, testing = cached
+            training.extend(TrainingKnownSample(**sd) for sd in new_training)
+            testing.extend(TestingKnownSample(**sd) for sd in new_testing)
+            self._partitions = (self.version, len(self), training, testing)
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        self.version += 1
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index: Any) -> None:
+        self.version += 1
+        super().__delitem__(index)
+
+    def __iadd__(  # type: ignore[override, misc]
+        self, items: Iterable[SampleDict]
+    ) -> ShufflingSamplePartition:
+        self.extend(items)
+        return self
+
+    def __imul__(self, n: SupportsIndex) -> ShufflingSamplePartition:
+        self.version += 1
+        super().__imul__(n)
+        return self
+
+    def insert(self, index: SupportsIndex, item: SampleDict) -> None:
+        self.version += 1
+        super().insert(index, item)
+
+    def pop(self, index: SupportsIndex = -1) -> SampleDict:
+        self.version += 1
+        return super().pop(index)
+
+    def remove(self, item: SampleDict) -> None:
+        self.version += 1
+        super().remove(item)
+
+    def clear(self) -> None:
+        self.version += 1
+        super().clear()
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        self.version += 1
+        super().sort(*args, **kwargs)
+
+    def reverse(self) -> None:
+        self.version += 1
+        super().reverse()
+
+    def cached(
+        self,
+    ) -> Optional[tuple[list[TrainingKnownSample], list[TestingKnownSample]]]:
+        """The training and testing lists, if they match the current samples."""
+        if (
+            self._partitions is None
+            or self._partitions[0] != self.version
+            or self._partitions[1] != len(self)
+        ):
+            return None
+        return self._partitions[2], self._partitions[3]
 
     @property
     def training(self) -> list[TrainingKnownSample]:
-        self.shuffle()
-        return [TrainingKnownSample(**sd) for sd in self[: self.split]]
+        return self.partitions()[0]
 
     @property
     def testing(self) -> list[TestingKnownSample]:
-        self.shuffle()
-        return [TestingKnownSample(**sd) for sd in self[self.split :]]
+        return self.partitions()[1]
 
 
 test_shuffling = """
@@ -467,6 +584,45 @@ test_shuffling = """
 [TestingKnownSample(sepal_length=0.1, sepal_width=0.2, petal_length=0.3, petal_width=0.4, species='sample 0', classification=None, ),
  TestingKnownSample(sepal_length=1.1, sepal_width=1.2, petal_length=1.3, petal_width=1.4, species='sample 1', classification=None, )]
 
+The lists are built once, and reused.
+
+>>> training = ssp.training
+>>> ssp.training is training
+True
+
+New samples are routed without a reshuffle.
+
+>>> ssp.append(
+...     {"sepal_length": 10.1, "sepal_width": 10.2, "petal_length": 10.3, "petal_width": 10.4, "species": "sample 10"}
+... )
+>>> ssp.version, len(ssp.training), len(ssp.testing)
+(1, 8, 3)
+>>> ssp.extend(
+...     {"sepal_length": i + 0.1, "sepal_width": i + 0.2, "petal_length": i + 0.3, "petal_width": i + 0.4, "species": f"sample {i}"}
+...     for i in range(11, 15)
+... )
+>>> ssp.version, len(ssp.training), len(ssp.testing)
+(2, 12, 3)
+>>> ssp.training is training
+True
+>>> [s.species for s in ssp.testing]
+['sample 0', 'sample 1', 'sample 10']
+
+Other changes to the samples rebuild the lists.
+
+>>> ssp[0] = ssp[-1]
+>>> [s.species for s in ssp.training][0]
+'sample 10'
+>>> removed = ssp.pop(0)
+>>> ssp.insert(0, removed)
+>>> ssp.training is training
+False
+>>> ssp.reverse()
+>>> [s.species for s in ssp.training][0]
+'sample 10'
+>>> ssp.sort(key=lambda sd: sd["sepal_length"])
+>>> [s.species for s in ssp.training][:3]
+['sample 0', 'sample 1', 'sample 2']
 """
 
 
@@ -546,6 +702,13 @@ else:
 
 class BucketedCollection(BucketCollection):
     """
+    An open-addressing hash index over the samples, in the style of a :class:`dict`.
+
+    Each slot of the table has a sample's :meth:`Sample.hash` and the position of the sample
+    in :attr:`samples`. The table doubles when it's more than 2/3 full; the cached hashes
+    mean resizing never recomputes one. A probe only compares samples with ``==``
+    when their hashes match. Equal samples are all kept, but only the first is indexed.
+
     >>> from pprint import pprint
     >>> b = BucketedCollection()
     >>> b.extend(
@@ -564,6 +727,128 @@ class BucketedCollection(BucketCollection):
     >>> len(b)
     4
     >>> pprint(list(b))
+    [Sample(sepal_length=1, sepal_width=2, petal_length=3, petal_width=4, ),
+     Sample(sepal_length=1, sepal_width=2, petal_length=3, petal_width=4, ),
+     Sample(sepal_length=1, sepal_width=1, petal_length=1, petal_width=1, ),
+     Sample(sepal_length=2, sepal_width=2, petal_length=2, petal_width=2, )]
+    >>> b.update(Sample(i, i, i, i) for i in range(3, 100))
+    >>> len(b), b.capacity
+    (101, 256)
+    >>> Sample(99, 99, 99, 99) in b
+    True
+    """
+
+    EMPTY = -1
+    # The probe sequence treats a hash as unsigned, like CPython's.
+    UNSIGNED = 2**64 - 1
+
+    def __init__(self, samples: Optional[Iterable[Sample]] = None) -> None:
+        super().__init__()
+        self.samples: list[Sample] = []
+        self.capacity = 8
+        self.used = 0
+        self.hashes: list[int] = [0] * self.capacity
+        self.slots: list[int] = [self.EMPTY] * self.capacity
+        if samples:
+            self.extend(samples)
+
+    def extend(self, samples: Iterable[Sample]) -> None:
+        self.update(samples)
+
+    def update(self, samples: Iterable[Sample]) -> None:
+        """Add many samples, growing the table once if the number of samples is known."""
+        if isinstance(samples, collections.abc.Sized):
+            self.reserve(self.used + len(samples))
+        for sample in samples:
+            self.append(sample)
+
+    def append(self, sample: Sample) -> None:
+        h = sample.hash()
+        slot = self.find(sample, h)
+        position = len(self.samples)
+        self.samples.append(sample)
+        if self.slots[slot] == self.EMPTY:
+            self.hashes[slot] = h
+            self.slots[slot] = position
+            self.used += 1
+            if self.used * 3 > self.capacity * 2:
+                self.resize(self.capacity * 2)
+
+    def reserve(self, count: int) -> None:
+        """Make room for ``count`` distinct samples without resizing."""
+        capacity = self.capacity
+        while count * 3 > capacity * 2:
+            capacity *= 2
+        if capacity != self.capacity:
+            self.resize(capacity)
+
+    def find(self, target: Sample, h: int) -> int:
+        """
+        The slot with a sample equal to ``target``, or the empty slot where it would go.
+        The probe sequence follows CPython's dict, so every slot is eventually tried.
+        """
+        mask = self.capacity - 1
+        perturb = h & self.UNSIGNED
+        slot = h & mask
+        while True:
+            position = self.slots[slot]
+            if position == self.EMPTY:
+                return slot
+            if self.hashes[slot] == h and self.samples[position] == target:
+                return slot
+            perturb >>= 5
+            slot = (slot * 5 + perturb + 1) & mask
+
+    def resize(self, capacity: int) -> None:
+        old = [(h, p) for h, p in zip(self.hashes, self.slots) if p != self.EMPTY]
+        self.capacity = capacity
+        self.hashes = [0] * capacity
+        self.slots = [self.EMPTY] * capacity
+        mask = capacity - 1
+        for h, position in old:
+            perturb = h & self.UNSIGNED
+            slot = h & mask
+            while self.slots[slot] != self.EMPTY:
+                perturb >>= 5
+                slot = (slot * 5 + perturb + 1) & mask
+            self.hashes[slot] = h
+            self.slots[slot] = position
+
+    def __contains__(self, target: Any) -> bool:
+        if not isinstance(target, Sample):
+            return False
+        slot = self.find(target, target.hash())
+        return self.slots[slot] != self.EMPTY
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def __iter__(self) -> Iterator[Sample]:
+        return iter(self.samples)
+
+
+class BucketedCollection_128(BucketCollection):
+    """
+    A fixed 128 buckets, each a list searched with ``==``.
+
+    >>> from pprint import pprint
+    >>> b = BucketedCollection_128()
+    >>> b.extend(
+    ...     [
+    ...         Sample(1, 2, 3, 4),
+    ...         Sample(1, 2, 3, 4),
+    ...         Sample(1, 1, 1, 1),
+    ...         Sample(2, 2, 2, 2),
+    ...     ]
+    ... )
+    ...
+    >>> Sample(1, 2, 3, 4) in b
+    True
+    >>> Sample(2, 2, 2, 3) in b
+    False
+    >>> len(b)
+    4
+    >>> pprint(list(b))
     [Sample(sepal_length=1, sepal_width=2, petal_length=3, petal_width=4, ),
      Sample(sepal_length=1, sepal_width=2, petal_length=3, petal_width=4, ),
      Sample(sepal_length=1, sepal_width=1, petal_length=1, petal_width=1, ),
@@ -598,10 +883,15 @@ class BucketedCollection(BucketCollection):
 class BucketedDealingPartition_80(DealingPartition):
     training_subset = (8, 10)  # 8/10 == 80%
     # 2/3 and 1/2 are common choices.
+    collection_class: type[Union[BucketedCollection, BucketedCollection_128]] = (
+        BucketedCollection
+    )
 
     def __init__(self, items: Optional[Iterable[SampleDict]]) -> None:
         self.counter = 0
-        self._training = BucketedCollection()
+        # Needed to avoid making look like a method
+        collection_class = self.collection_class
+        self._training = collection_class()
         self._testing: list[TestingKnownSample] = []
         if items:
             self.extend(items)
@@ -807,9 +1097,11 @@ True
 True
 >>> z = Sample(2, 3, 4, 1)
 >>> x.hash() == z.hash()
-True
+False
 >>> x == z
 False
+>>> len({x, y, z})
+2
 >>> a = Sample(1, 1, 2, 2)
 >>> x.hash() == a.hash()
 False
@@ -62,3 +62,64 @@ def test_dealing(data):
     # random.seed(42)  # Not used.
     assert len(cdp.training) == 8
     assert len(cdp.testing) == 2
+
+
+def test_shuffling_cached(data):
+    ssp = ShufflingSamplePartition(data)
+    random.seed(42)
+    training = ssp.training
+    assert ssp.training is training
+    assert ssp.version == 0
+    before = list(ssp)
+    ssp.extend(dict(row, species=f"new {i}") for i, row in enumerate(data))
+    assert ssp.version == 1
+    assert ssp.training is training
+    assert len(ssp.training) == 16
+    assert len(ssp.testing) == 4
+    # The samples already split keep their places.
+    assert ssp[:8] == before[:8]
+    assert ssp[-4:-2] == before[-2:]
+    assert [s.species for s in ssp.training[8:]] == [f"new {i}" for i in range(8)]
+
+
+from model import BucketedDealingPartition_80, BucketedCollection, BucketedCollection_128, Sample
+
+
+def test_bucketed_collections_agree(data):
+    # The second pass deals rows 1 and 0 to testing; they're duplicates of training rows.
+    rows = data + data[::-1]
+    new = BucketedDealingPartition_80(rows)
+
+    class Fixed(BucketedDealingPartition_80):
+        collection_class = BucketedCollection_128
+
+    old = Fixed(rows)
+    # The fixed buckets are iterated bucket by bucket, the new index in order.
+    assert sorted(map(repr, new.training)) == sorted(map(repr, old.training))
+    assert list(map(repr, new.testing)) == list(map(repr, old.testing))
+    assert len(new.training) == 18 and len(new.testing) == 2
+
+
+def test_bucketed_collection_grows():
+    b = BucketedCollection(Sample(i / 100, 1.0, 2.0, 3.0) for i in range(1000))
+    assert len(b) == 1000
+    assert b.used * 3 <= b.capacity * 2
+    assert all(Sample(i / 100, 1.0, 2.0, 3.0) in b for i in range(1000))
+    assert Sample(10.5, 1.0, 2.0, 3.0) not in b
+    assert "not a sample" not in b
+
+
+from model import KnownSample
+
+
+def test_sample_hash_memoised():
+    s = Sample(5.1, 3.5, 1.4, 0.2)
+    assert s.hash() == hash(s) == hash((5.1, 3.5, 1.4, 0.2))
+    # Equal sums of measurements no longer collide.
+    assert hash(Sample(5.1, 3.5, 1.4, 0.2)) != hash(Sample(3.5, 5.1, 1.4, 0.2))
+    with raises(AttributeError):
+        s.sepal_length = 6.0  # type: ignore [misc]
+    rows = [KnownSample("setosa", 5.1, 3.5, 1.4, 0.2) for _ in range(3)]
+    rows.append(KnownSample("virginica", 5.1, 3.5, 1.4, 0.2))
+    assert len(set(rows)) == 2
+    assert rows[0] != rows[3] and rows[0] != s and s != rows[0]
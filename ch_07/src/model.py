@@ -6,6 +6,7 @@ Chapter 7.
 from __future__ import annotations
 import collections
 from dataclasses import dataclass, asdict
+from math import hypot
 from typing import Optional, Counter, List
 import weakref
 import sys
@@ -48,6 +49,16 @@ class Distance:
         raise NotImplementedError
 
 
+class Euclidean(Distance):
+    def distance(self, s1: Sample, s2: Sample) -> float:
+        return hypot(
+            s1.sepal_length - s2.sepal_length,
+            s1.sepal_width - s2.sepal_width,
+            s1.petal_length - s2.petal_length,
+            s1.petal_width - s2.petal_width,
+        )
+
+
 @dataclass
 class Hyperparameter:
     """A specific tuning parameter set with k and a distance algorithm"""
@@ -61,8 +72,12 @@ class Hyperparameter:
         if not (training_data := self.data()):
             raise RuntimeError("No TrainingData object")
         distances: list[tuple[float, TrainingKnownSample]] = sorted(
-            (self.algorithm.distance(sample, known), known)
-            for known in training_data.training
+            (
+                (self.algorithm.distance(sample, known), known)
+                for known in training_data.training
+            ),
+            # Equally distant samples aren't ordered.
+            key=lambda distance_known: distance_known[0],
         )
         k_nearest = (known.species for d, known in distances[: self.k])
         frequency: Counter[str] = collections.Counter(k_nearest)
@@ -126,5 +141,13 @@ test_UnknownSample = """
 UnknownSample(sepal_length=5.1, sepal_width=3.5, petal_length=1.4, petal_width=0.2, classification=None)
 """
 
+test_Euclidean = """
+>>> s1 = TrainingKnownSample(
+...     sepal_length=5.1, sepal_width=3.5, petal_length=1.4, petal_width=0.2, species="Iris-setosa")
+>>> u = UnknownSample(sepal_length=7.9, sepal_width=3.2, petal_length=4.7, petal_width=1.4)
+>>> round(Euclidean().distance(s1, u), 4)
+4.5011
+"""
+
 
 __test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
@@ -0,0 +1,106 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 7.
+"""
+
+import base64
+from pathlib import Path
+from pytest import *
+import classifier
+
+
+@fixture(scope="module")
+def app_client():
+    user = classifier.User(
+        username="noriko",
+        email="noriko@example.com",
+        real_name="Noriko K. L.",
+        role=classifier.Role.BOTANIST,
+    )
+    user.set_password("Hunter2")
+    with classifier.app.app_context():
+        classifier.app.config["TESTING"] = True
+        classifier.app.config["USER_FILE"] = Path.cwd() / "test_data"
+        classifier.app.config["bezdekIris.data_FILE"] = Path.cwd().parent / "TRAINING"
+        classifier.users.add_user(user)
+        classifier.knn.load()
+
+    yield classifier.app.test_client()
+
+
+@fixture
+def authorization():
+    credentials = base64.b64encode("noriko:Hunter2".encode("utf-8"))
+    return {"Authorization": f"BASIC {credentials.decode('ASCII')}"}
+
+
+def test_classify_one(app_client, authorization):
+    result = app_client.post(
+        "classify",
+        json={
+            "sepal_length": 5.1,
+            "sepal_width": 3.5,
+            "petal_length": 1.4,
+            "petal_width": 0.2,
+        },
+        headers=authorization,
+    )
+    assert result.status_code == 200
+    assert result.json == {"status": "OK", "species": "Iris-setosa"}
+    assert "classify;dur=" in result.headers["Server-Timing"]
+
+
+def test_classify_batch(app_client, authorization):
+    result = app_client.post(
+        "classify",
+        json=[
+            {
+                "sepal_length": 5.1,
+                "sepal_width": 3.5,
+                "petal_length": 1.4,
+                "petal_width": 0.2,
+            },
+            {
+                "sepal_length": 7.7,
+                "sepal_width": 3.0,
+                "petal_length": 6.1,
+                "petal_width": 2.3,
+            },
+        ],
+        headers=authorization,
+    )
+    assert result.status_code == 200
+    assert result.json == {"status": "OK", "species": ["Iris-setosa", "Iris-virginica"]}
+
+
+def test_classify_invalid(app_client, authorization):
+    result = app_client.post(
+        "classify",
+        json=[{"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4}],
+        headers=authorization,
+    )
+    assert result.status_code == 400
+    assert result.json["message"] == "1 invalid sample"
+    assert [e["index"] for e in result.json["errors"]] == [0]
+
+
+def test_classify_not_finite(app_client, authorization):
+    # Flask's JSON parser accepts these, though they aren't JSON numbers.
+    for value in ("NaN", "Infinity", "-Infinity", "1e400", "1" + "0" * 400):
+        result = app_client.post(
+            "classify",
+            data=(
+                '{"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4, '
+                f'"petal_width": {value}}}'
+            ),
+            content_type="application/json",
+            headers=authorization,
+        )
+        assert result.status_code == 400, value
+        assert result.json["message"] == "1 invalid sample"
+
+
+def test_classify_unauthorized(app_client):
+    result = app_client.post("classify", json=[])
+    assert result.status_code == 401
@@ -0,0 +1,84 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 8. The Intersection of Object-Oriented and Functional Programming
+
+Partition a few million generated rows, reporting time and peak memory.
+Each scenario runs in its own process, so the peak RSS is its own.
+"""
+from __future__ import annotations
+import multiprocessing
+import random
+import resource
+import sys
+import time
+from typing import Callable, Iterator
+from model import *
+
+
+def generated(n: int) -> Iterator[KnownSample]:
+    """Rows like a CSV reader's, created as they're consumed."""
+    rng = random.Random(42)
+    for i in range(n):
+        yield KnownSample(
+            sample=Sample(
+                sepal_length=rng.random(),
+                sepal_width=rng.random(),
+                petal_length=rng.random(),
+                petal_width=rng.random(),
+            ),
+            species=rng.choice(("setosa", "versicolor", "virginica")),
+        )
+
+
+def lists(n: int) -> tuple[int, int]:
+    train, test = partition(generated(n), training_80)
+    return len(train), len(test)
+
+
+def lists_1p(n: int) -> tuple[int, int]:
+    train, test = partition_1p(generated(n), training_80)
+    return len(train), len(test)
+
+
+def stream(n: int) -> tuple[int, int]:
+    counts = [0, 0]
+    for s in partition_stream(generated(n), training_80):
+        counts[isinstance(s, TestingKnownSample)] += 1
+    return counts[0], counts[1]
+
+
+def reservoir(n: int) -> tuple[int, int]:
+    train, test = partition_reservoir(
+        generated(n), training_80, 8_000, 2_000, random.Random(42)
+    )
+    return len(train), len(test)
+
+
+def run(scenario: Callable[[int], tuple[int, int]], n: int) -> None:
+    start = time.perf_counter()
+    train, test = scenario(n)
+    end = time.perf_counter()
+    # ru_maxrss is KiB on Linux.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"| {scenario.__name__:10s} "
+        f"| {n:10,d} "
+        f"| {train:10,d} | {test:10,d} "
+        f"| {end-start:7.3f}s "
+        f"| {peak:8.1f}MiB |"
+    )
+
+
+def main(n: int = 3_000_000) -> None:
+    print("| partition  | rows       | training   | testing    | time     | peak RSS    |")
+    print("|------------|------------|------------|------------|----------|-------------|")
+    context = multiprocessing.get_context("spawn")
+    for scenario in lists, lists_1p, stream, reservoir:
+        p = context.Process(target=run, args=(scenario, n))
+        p.start()
+        p.join()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3_000_000)
@@ -6,19 +6,25 @@ Chapter 8. The Intersection of Object-Oriented and Functional Programming
 Parts of this are also shown in Chapter 10.
 """
 from __future__ import annotations
+import math
+import random
 from typing import (
     cast,
     Callable,
+    Generic,
     Iterable,
     Iterator,
     List,
     NamedTuple,
     Optional,
     Type,
+    TypeVar,
     Union,
 )
 from collections import defaultdict, Counter
 
+T = TypeVar("T")
+
 
 class Sample(NamedTuple):
     sepal_length: float
@@ -59,6 +65,21 @@ TestingList = List[TestingKnownSample]
 def partition(
     samples: Iterable[KnownSample], rule: Callable[[KnownSample, int], bool]
 ) -> tuple[TrainingList, TestingList]:
+    """
+    Two list comprehensions, one for each pool.
+    Enumerating ``samples`` twice doubles the work, and an iterator would be
+    exhausted by the first comprehension, so an iterator is consumed once,
+    with :func:`partition_stream`.
+    """
+    if iter(samples) is samples:
+        training_samples: TrainingList = []
+        test_samples: TestingList = []
+        for s in partition_stream(samples, rule):
+            if isinstance(s, TrainingKnownSample):
+                training_samples.append(s)
+            else:
+                test_samples.append(s)
+        return training_samples, test_samples
 
     training_samples = [
         TrainingKnownSample(s) for i, s in enumerate(samples) if rule(s, i)
@@ -83,6 +104,11 @@ test_partition = """
 3
 >>> len(test)
 1
+>>> train, test = partition(iter(data), training_75)
+>>> len(train)
+3
+>>> len(test)
+1
 """
 
 
@@ -149,4 +175,115 @@ test_partition_1p = """
 """
 
 
+AnyKnownSample = Union[TrainingKnownSample, TestingKnownSample]
+
+
+def partition_stream(
+    samples: Iterable[KnownSample], rule: Callable[[KnownSample, int], bool]
+) -> Iterator[AnyKnownSample]:
+    """
+    Route each sample to training or testing as it arrives.
+    Nothing is kept, so this works for an unbounded iterator, like a CSV reader's rows.
+
+    >>> data = (
+    ...     KnownSample(sample=Sample(i, i + 1, i + 2, i + 3), species="ab"[i % 2])
+    ...     for i in range(4)
+    ... )
+    >>> for s in partition_stream(data, training_75):
+    ...     print(type(s).__name__, s.sample.sample.sepal_length)
+    TestingKnownSample 0
+    TrainingKnownSample 1
+    TrainingKnownSample 2
+    TrainingKnownSample 3
+    """
+    for i, s in enumerate(samples):
+        if rule(s, i):
+            yield TrainingKnownSample(s)
+        else:
+            yield TestingKnownSample(s)
+
+
+class Reservoir(Generic[T]):
+    """
+    A fixed-size uniform random sample of a stream of unknown length.
+
+    This is Li's "Algorithm L": after the reservoir fills, it computes how many
+    items to skip before the next replacement, instead of drawing a random number
+    for every item. Memory is ``size`` items, no matter how many are offered.
+
+    >>> r: Reservoir[int] = Reservoir(3, random.Random(42))
+    >>> for n in range(1_000):
+    ...     r.offer(n)
+    >>> r.seen
+    1000
+    >>> len(r.items)
+    3
+    """
+
+    def __init__(self, size: int, rng: Optional[random.Random] = None) -> None:
+        self.size = size
+        self.rng = rng or random.Random()
+        self.items: list[T] = []
+        self.seen = 0
+        self.weight = 1.0
+        self.next = 0
+
+    def offer(self, item: T) -> None:
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            if len(self.items) == self.size:
+                self.weight = math.exp(math.log(self.random()) / self.size)
+                self.skip()
+        elif self.seen == self.next:
+            self.items[self.rng.randrange(self.size)] = item
+            self.weight *= math.exp(math.log(self.random()) / self.size)
+            self.skip()
+
+    def random(self) -> float:
+        """A random number in (0, 1); log() of it is finite."""
+        return 1.0 - self.rng.random()
+
+    def skip(self) -> None:
+        """Set the position of the next item to put into the reservoir."""
+        if self.weight >= 1.0:
+            self.next = self.seen + 1
+        else:
+            gap = math.floor(math.log(self.random()) / math.log(1.0 - self.weight))
+            self.next = self.seen + gap + 1
+
+
+def partition_reservoir(
+    samples: Iterable[KnownSample],
+    rule: Callable[[KnownSample, int], bool],
+    training_size: int,
+    testing_size: int,
+    rng: Optional[random.Random] = None,
+) -> tuple[TrainingList, TestingList]:
+    """
+    One pass, in bounded memory: route each sample with :func:`partition_stream`,
+    and keep a uniform random sample of at most ``training_size`` training samples
+    and ``testing_size`` testing samples.
+
+    >>> data = (
+    ...     KnownSample(sample=Sample(i, i + 1, i + 2, i + 3), species="ab"[i % 2])
+    ...     for i in range(100_000)
+    ... )
+    >>> train, test = partition_reservoir(data, training_75, 120, 30, random.Random(42))
+    >>> len(train), len(test)
+    (120, 30)
+    >>> all(t.sample.sample.sepal_length % 4 == 0 for t in test)
+    True
+    """
+    rng = rng or random.Random()
+    training: Reservoir[TrainingKnownSample] = Reservoir(training_size, rng)
+    testing: Reservoir[TestingKnownSample] = Reservoir(testing_size, rng)
+    for s in partition_stream(samples, rule):
+        if isinstance(s, TrainingKnownSample):
+            training.offer(s)
+        else:
+            testing.offer(s)
+    return training.items, testing.items
+
+
 __test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
@@ -0,0 +1,51 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 9. Strings and Serialization
+
+Compare authenticated request throughput with and without the CredentialCache.
+Requests go through the Flask test client, so there's no network in the measurement.
+"""
+from __future__ import annotations
+import base64
+import logging
+import time
+import classifier
+
+
+def setup() -> dict[str, str]:
+    user = classifier.User(
+        "bench", "bench@example.com", "Bench Mark", classifier.Role.BOTANIST
+    )
+    user.set_password("Hunter2")
+    classifier.app.config["TESTING"] = False
+    classifier.app.logger.setLevel(logging.WARNING)
+    classifier.users.add_user(user)
+    credentials = base64.b64encode("bench:Hunter2".encode("utf-8"))
+    return {"Authorization": f"BASIC {credentials.decode('ASCII')}"}
+
+
+def measure(name: str, ttl: float, requests: int, headers: dict[str, str]) -> None:
+    classifier.credential_cache.clear()
+    classifier.credential_cache.ttl = ttl
+    client = classifier.app.test_client()
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get("/whoami", headers=headers)
+        assert response.status_code == 200, response.json
+    end = time.perf_counter()
+    print(
+        f"| {name:8s} | {requests:8,d} | {end-start:8.2f}s | {requests/(end-start):10,.0f} |"
+    )
+
+
+def main(requests: int = 5_000, uncached: int = 50) -> None:
+    headers = setup()
+    print("| scenario | requests | time      | req/s      |")
+    print("|----------|----------|-----------|------------|")
+    measure("uncached", 0, uncached, headers)
+    measure("cached", 300.0, requests, headers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 9. Strings and Serialization
+
+Compare the start-up time of parsing a CSV file with memory-mapping
+the same samples in a BinaryIrisFormat file.
+Each scenario runs in a fresh process, so its peak resident memory is its own.
+"""
+from __future__ import annotations
+from pathlib import Path
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+from model import *
+from bench_csv_load import generated
+
+
+def csv_rows(directory: Path) -> int:
+    return len(list(CSVIrisReader(directory / "iris.data").data_iter()))
+
+
+def csv_columns(directory: Path) -> int:
+    return len(CSVIrisReader(directory / "iris.data").columns().species)
+
+
+def binary_open(directory: Path) -> int:
+    """Open the file, and create the last sample."""
+    with BinaryIrisReader(directory / "iris.bin") as rdr:
+        rdr[-1]
+        return len(rdr)
+
+
+def binary_scan(directory: Path) -> int:
+    """Open the file, and touch every measurement."""
+    with BinaryIrisReader(directory / "iris.bin") as rdr:
+        sum(rdr.features)
+        return len(rdr)
+
+
+SCENARIOS: dict[str, Callable[[Path], int]] = {
+    f.__name__: f for f in (csv_rows, csv_columns, binary_open, binary_scan)
+}
+
+
+def measure(name: str, directory: Path) -> None:
+    """Run one scenario in this process, and print a row of the table."""
+    start = time.perf_counter()
+    rows = SCENARIOS[name](directory)
+    end = time.perf_counter()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"| {name:11s} | {rows:10,d} | {end-start:8.3f}s | {peak:8,.0f} MiB |")
+
+
+def main(n: int = 5_000_000) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory)
+        generated(path / "iris.data", n)
+        start = time.perf_counter()
+        write_binary(CSVIrisReader(path / "iris.data"), path / "iris.bin")
+        end = time.perf_counter()
+        print(
+            f"iris.data {(path / 'iris.data').stat().st_size:,d} bytes, "
+            f"iris.bin {(path / 'iris.bin').stat().st_size:,d} bytes, "
+            f"written in {end-start:.2f}s"
+        )
+        print("| scenario    | rows       | time      | peak RSS     |")
+        print("|-------------|------------|-----------|--------------|")
+        for name in SCENARIOS:
+            subprocess.run(
+                [sys.executable, __file__, "--measure", name, directory],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[2], Path(sys.argv[3]))
+    else:
+        main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,119 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 9. Strings and Serialization
+
+The throughput and latency of single-sample ``/classify`` requests on the ASGI app,
+as the :class:`async_classifier.Coalescer` batch size and delay change.
+A batch size of 1 sends every request to the process pool by itself.
+
+The classifier's cache is off, so every sample is classified.
+Each client task keeps its connection open, so connecting isn't part of the latency.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+from pathlib import Path
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+import async_classifier
+import classifier
+from load_classify import ROOT, free_port, user_file
+from load_async import request, send, stop, wait_for
+
+SETTINGS = [(1, 0.0), (8, 0.0005), (16, 0.001), (64, 0.002), (64, 0.005), (256, 0.010)]
+
+
+def serve(port: int, users: Path, size: int, delay: float) -> None:
+    classifier.app.config["USER_FILE"] = users
+    classifier.app.config["TRAINING_FILE"] = ROOT / "bezdekIris.data"
+    classifier.app.config["TESTING"] = False
+    classifier.app.config["CLASSIFIER_CACHE_SIZE"] = 0
+    classifier.app.logger.setLevel(logging.WARNING)
+    classifier.knn.load()
+    service = async_classifier.ASGIClassifier(classifier.app)
+    service.coalescer.max_batch = size
+    service.coalescer.max_delay = delay
+    asyncio.run(async_classifier.serve(service, port=port))
+
+
+async def measure(
+    port: int,
+    server: subprocess.Popen[bytes],
+    messages: list[bytes],
+    requests: int,
+    concurrency: int,
+) -> str:
+    await wait_for(port, server)
+    # Warm up the credential cache, and the worker processes.
+    for message in messages:
+        await send(port, message.replace(b"keep-alive", b"close"))
+    results: list[tuple[int, float]] = []
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            for n in remaining:
+                start = time.perf_counter()
+                writer.write(messages[n % len(messages)])
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(head.split(b"content-length: ")[1].split(b"\r\n")[0])
+                await reader.readexactly(length)
+                results.append(
+                    (int(head.split(b" ", 2)[1]), time.perf_counter() - start)
+                )
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    end = time.perf_counter()
+    errors = sum(status != 200 for status, _ in results)
+    latencies = sorted(latency * 1000 for _, latency in results)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+    return f"{requests / (end - start):8,.0f} | {p50:8.2f} | {p99:8.2f} | {errors:6d}"
+
+
+def main(requests: int = 2_000, concurrency: int = 64) -> None:
+    with (ROOT / "bezdekIris.json").open() as source:
+        samples: list[dict[str, Any]] = json.load(source)
+    random.seed(42)
+    messages = []
+    for sample in random.sample(samples, 32):
+        del sample["species"]
+        message = request(json.dumps(sample).encode("utf-8"))
+        messages.append(
+            message.replace(b"Connection: close", b"Connection: keep-alive")
+        )
+    with tempfile.TemporaryDirectory() as directory:
+        users = Path(directory) / "users.csv"
+        user_file(users, "")
+        print("| batch | delay ms | req/s    | p50 ms   | p99 ms   | errors |")
+        print("|-------|----------|----------|----------|----------|--------|")
+        for size, delay in SETTINGS:
+            port = free_port()
+            server = subprocess.Popen(
+                [sys.executable, __file__, "--serve"]
+                + [str(port), str(users), str(size), str(delay)]
+            )
+            try:
+                result = asyncio.run(
+                    measure(port, server, messages, requests, concurrency)
+                )
+            finally:
+                stop(server)
+            print(f"| {size:5d} | {delay * 1000:8.1f} | {result} |")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--serve"]:
+        serve(int(sys.argv[2]), Path(sys.argv[3]), int(sys.argv[4]), float(sys.argv[5]))
+    else:
+        main(*(int(arg) for arg in sys.argv[1:3]))
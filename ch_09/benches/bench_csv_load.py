@@ -0,0 +1,93 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 9. Strings and Serialization
+
+Compare load time and peak memory of the csv.DictReader path with CSVIrisReader.columns().
+Each scenario runs in a fresh process, so its peak resident memory is its own.
+"""
+from __future__ import annotations
+from pathlib import Path
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+from model import *
+
+
+def generated(target: Path, n: int) -> None:
+    """Write ``n`` rows in the style of the bezdekIris.data file."""
+    random.seed(42)
+    species = ["Iris-setosa", "Iris-versicolor", "Iris-virginica"]
+    with target.open("w") as output:
+        for _ in range(n):
+            print(
+                f"{random.uniform(4, 8):.1f},{random.uniform(2, 4.5):.1f},"
+                f"{random.uniform(1, 7):.1f},{random.uniform(0.1, 2.5):.1f},"
+                f"{random.choice(species)}",
+                file=output,
+            )
+
+
+def dict_rows(source: Path) -> int:
+    return len(list(CSVIrisReader(source).data_iter()))
+
+
+def columns(source: Path) -> int:
+    return len(CSVIrisReader(source).columns().species)
+
+
+def load(source: Path) -> int:
+    td = TrainingData("dict_rows")
+    td.load(CSVIrisReader(source).data_iter())  # type: ignore [arg-type]
+    return len(td.training) + len(td.testing)
+
+
+def load_csv(source: Path) -> int:
+    td = TrainingData("columns")
+    td.load_csv(CSVIrisReader(source))
+    return len(td.training) + len(td.testing)
+
+
+SCENARIOS: dict[str, Callable[[Path], int]] = {
+    f.__name__: f for f in (dict_rows, columns, load, load_csv)
+}
+
+# The scenarios that keep a Python object for each row need 350 to 550 bytes a row;
+# dict_rows needs over 5 GiB for 10,000,000 rows. Above these sizes, they're skipped.
+ROW_LIMITS = {"dict_rows": 4_000_000, "load": 6_000_000, "load_csv": 6_000_000}
+
+
+def measure(name: str, source: Path) -> None:
+    """Run one scenario in this process, and print a row of the table."""
+    start = time.perf_counter()
+    rows = SCENARIOS[name](source)
+    end = time.perf_counter()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"| {name:10s} | {rows:10,d} | {end-start:8.2f}s | {peak:8,.0f} MiB |")
+
+
+def main(n: int = 2_000_000) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        source = Path(directory) / "iris.data"
+        generated(source, n)
+        print("| scenario   | rows       | time      | peak RSS     |")
+        print("|------------|------------|-----------|--------------|")
+        for name in SCENARIOS:
+            if n > ROW_LIMITS.get(name, n):
+                print(f"| {name:10s} | {'skipped':>10s} | {'':9s} | {'':12s} |")
+                continue
+            subprocess.run(
+                [sys.executable, __file__, "--measure", name, str(source)],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[2], Path(sys.argv[3]))
+    else:
+        main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,82 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 9. Strings and Serialization
+
+Compare the one-process NDJSON and CSV readers with ParallelIrisReader,
+for a range of worker counts, in rows per second.
+"""
+from __future__ import annotations
+import csv
+import json
+import os
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Iterator, Protocol
+from model import *
+
+
+class Reader(Protocol):
+    def data_iter(self) -> Iterator[Any]: ...
+
+
+def generated(directory: Path, n: int) -> tuple[Path, Path]:
+    """The same ``n`` rows, as NDJSON and as CSV."""
+    random.seed(42)
+    species = ["Iris-setosa", "Iris-versicolor", "Iris-virginica"]
+    ndjson_path, csv_path = directory / "iris.ndjson", directory / "iris.data"
+    with ndjson_path.open("w") as ndjson_file, csv_path.open(
+        "w", newline=""
+    ) as csv_file:
+        writer = csv.writer(csv_file)
+        for _ in range(n):
+            row = [
+                round(random.uniform(4, 8), 1),
+                round(random.uniform(2, 4.5), 1),
+                round(random.uniform(1, 7), 1),
+                round(random.uniform(0.1, 2.5), 1),
+                random.choice(species),
+            ]
+            writer.writerow(row)
+            print(json.dumps(dict(zip(CSVIrisReader.header, row))), file=ndjson_file)
+    return ndjson_path, csv_path
+
+
+def run(name: str, reader: Reader) -> None:
+    start = time.perf_counter()
+    rows = sum(1 for _ in reader.data_iter())
+    end = time.perf_counter()
+    print(
+        f"| {name:28s} | {rows:10,d} | {end-start:8.2f}s | {rows/(end-start):11,.0f} |"
+    )
+
+
+def main(n: int = 2_000_000) -> None:
+    cpus = os.cpu_count() or 1
+    workers = sorted({1, 2, 4, cpus})
+    print(f"{cpus} CPUs")
+    print("| reader                       | rows       | time      | rows/sec    |")
+    print("|------------------------------|------------|-----------|-------------|")
+    with tempfile.TemporaryDirectory() as directory:
+        ndjson_path, csv_path = generated(Path(directory), n)
+        run("NDJSONIrisReader", NDJSONIrisReader(ndjson_path))
+        for w in workers:
+            run(f"ParallelNDJSON {w} ordered", ParallelNDJSONIrisReader(ndjson_path, w))
+            run(
+                f"ParallelNDJSON {w} unordered",
+                ParallelNDJSONIrisReader(ndjson_path, w, ordered=False),
+            )
+        run("CSVIrisReader_2", CSVIrisReader_2(csv_path))
+        for w in workers:
+            run(f"ParallelCSV {w} ordered", ParallelCSVIrisReader(csv_path, w))
+            run(
+                f"ParallelCSV {w} unordered",
+                ParallelCSVIrisReader(csv_path, w, ordered=False),
+            )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,87 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 9. Strings and Serialization
+
+Compare jsonschema validation of each row with ValidatingNDJSONIrisReader's
+compiled, batched check, in rows per second.
+"""
+from __future__ import annotations
+import contextlib
+import io
+import json
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Iterator
+import jsonschema  # type: ignore[import]
+from model import *
+
+
+class JSONSchemaNDJSONIrisReader:
+    """The reader before the schema was compiled: validate and print each row."""
+
+    def __init__(self, source: Path, schema: dict[str, Any]) -> None:
+        self.source = source
+        self.validator = jsonschema.Draft7Validator(schema)
+
+    def data_iter(self) -> Iterator[SampleDict]:
+        with self.source.open() as source_file:
+            for line in source_file:
+                sample = json.loads(line)
+                if self.validator.is_valid(sample):
+                    yield sample
+                else:
+                    print(f"Invalid: {sample}")
+
+
+def generated(target: Path, n: int, invalid: float = 0.01) -> None:
+    """``n`` rows, with about a fraction ``invalid`` of them having a bad species."""
+    random.seed(42)
+    species = ["Iris-setosa", "Iris-versicolor", "Iris-virginica"]
+    with target.open("w") as output:
+        for _ in range(n):
+            row = {
+                "sepal_length": round(random.uniform(4, 8), 1),
+                "sepal_width": round(random.uniform(2, 4.5), 1),
+                "petal_length": round(random.uniform(1, 7), 1),
+                "petal_width": round(random.uniform(0.1, 2.5), 1),
+                "species": random.choice(species),
+            }
+            if random.random() < invalid:
+                row["species"] = "Iris-unknown"
+            print(json.dumps(row), file=output)
+
+
+def run(reader: JSONSchemaNDJSONIrisReader | ValidatingNDJSONIrisReader) -> None:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        valid = sum(1 for _ in reader.data_iter())
+    end = time.perf_counter()
+    rows = sum(1 for _ in reader.source.open())
+    print(
+        f"| {type(reader).__name__:28s} | {rows:10,d} | {valid:10,d} "
+        f"| {end-start:7.2f}s | {rows/(end-start):11,.0f} |"
+    )
+
+
+def main(n: int = 1_000_000) -> None:
+    print(
+        "| reader                       | rows       | valid      | time     | rows/sec    |"
+    )
+    print(
+        "|------------------------------|------------|------------|----------|-------------|"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        source = Path(directory) / "iris.ndjson"
+        generated(source, n)
+        run(JSONSchemaNDJSONIrisReader(source, IRIS_SCHEMA))
+        compiled = ValidatingNDJSONIrisReader(source, IRIS_SCHEMA)
+        run(compiled)
+        print(compiled.report)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
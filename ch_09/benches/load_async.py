@@ -0,0 +1,180 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 9. Strings and Serialization
+
+Compare the latency of the ``/classify`` route on the threaded Flask development
+server and on the ASGI app in :mod:`async_classifier`, as concurrency increases.
+
+Each server runs in its own process, with the same temporary users file.
+The client is a single event loop, with ``concurrency`` tasks each sending requests
+one after another, so the offered load grows with the concurrency.
+Every request uses a new connection, since the development server doesn't keep them alive.
+"""
+from __future__ import annotations
+import asyncio
+import base64
+import json
+import logging
+from pathlib import Path
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+import async_classifier
+import classifier
+from load_classify import PASSWORD, ROOT, USERNAME, free_port, serve, user_file
+
+
+def serve_async(port: int, users: Path) -> None:
+    """Run the ASGI app on the small asyncio server."""
+    classifier.app.config["USER_FILE"] = users
+    classifier.app.config["TRAINING_FILE"] = ROOT / "bezdekIris.data"
+    classifier.app.config["TESTING"] = False
+    classifier.app.logger.setLevel(logging.WARNING)
+    classifier.knn.load()
+    asyncio.run(async_classifier.serve(async_classifier.app, port=port))
+
+
+def request(body: bytes) -> bytes:
+    credentials = base64.b64encode(f"{USERNAME}:{PASSWORD}".encode("utf-8"))
+    return (
+        b"POST /classify HTTP/1.1\r\n"
+        b"Host: 127.0.0.1\r\n"
+        b"Authorization: BASIC " + credentials + b"\r\n"
+        b"Content-Type: application/json\r\n"
+        b"Content-Length: %d\r\n"
+        b"Connection: close\r\n\r\n" % len(body)
+    ) + body
+
+
+async def send(port: int, message: bytes) -> tuple[int, float]:
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(message)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b" ", 2)[1]), time.perf_counter() - start
+
+
+async def wait_for(port: int, server: subprocess.Popen[bytes]) -> None:
+    for _ in range(100):
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode}")
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+            if response.startswith(b"HTTP/1.1 200") or response.startswith(
+                b"HTTP/1.0 200"
+            ):
+                return
+        except ConnectionError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server didn't start")
+
+
+async def load(
+    name: str, port: int, message: bytes, requests: int, concurrency: int
+) -> str:
+    results: list[tuple[int, float]] = []
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        for _ in remaining:
+            results.append(await send(port, message))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    end = time.perf_counter()
+    errors = sum(status != 200 for status, _ in results)
+    latencies = sorted(latency * 1000 for _, latency in results)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+    return (
+        f"| {name:6s} | {concurrency:4d} | {requests / (end - start):8,.0f} "
+        f"| {p50:8.2f} | {p99:8.2f} | {errors:6d} |"
+    )
+
+
+def start(mode: str, port: int, users: Path) -> subprocess.Popen[bytes]:
+    return subprocess.Popen([sys.executable, __file__, mode, str(port), str(users)])
+
+
+def stop(server: subprocess.Popen[bytes]) -> None:
+    """
+    Stop a server with SIGTERM; :func:`async_classifier.serve` handles it
+    by shutting down its process pool, so no workers are left running.
+    """
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def compare(
+    ports: dict[str, int],
+    servers: dict[str, subprocess.Popen[bytes]],
+    requests: int,
+    batch: int,
+    levels: tuple[int, ...],
+) -> None:
+    with (ROOT / "bezdekIris.json").open() as source:
+        samples: list[dict[str, Any]] = json.load(source)
+    for sample in samples:
+        del sample["species"]
+    random.seed(42)
+    body: Any = random.choices(samples, k=batch) if batch > 1 else samples[0]
+    message = request(json.dumps(body).encode("utf-8"))
+    for name, port in ports.items():
+        await wait_for(port, servers[name])
+        # Warm up: the credential cache, and the worker processes.
+        await load(name, port, message, 16, 4)
+    print("| server | conc | req/s    | p50 ms   | p99 ms   | errors |")
+    print("|--------|------|----------|----------|----------|--------|")
+    for concurrency in levels:
+        for name, port in ports.items():
+            print(
+                await load(
+                    name, port, message, max(requests, 4 * concurrency), concurrency
+                )
+            )
+
+
+def main(
+    requests: int = 1_000,
+    batch: int = 10,
+    *,
+    levels: tuple[int, ...] = (1, 4, 16, 64),
+) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        users = Path(directory) / "users.csv"
+        user_file(users, "")
+        ports = {"sync": free_port(), "async": free_port()}
+        servers = {
+            "sync": start("--serve", ports["sync"], users),
+            "async": start("--serve-async", ports["async"], users),
+        }
+        try:
+            asyncio.run(compare(ports, servers, requests, batch, levels))
+        finally:
+            for server in servers.values():
+                stop(server)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--serve"]:
+        serve(int(sys.argv[2]), Path(sys.argv[3]))
+    elif sys.argv[1:2] == ["--serve-async"]:
+        serve_async(int(sys.argv[2]), Path(sys.argv[3]))
+    else:
+        main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,176 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 9. Strings and Serialization
+
+Load test of the ``/classify`` route, against the Flask development server.
+The server runs in its own process, with a temporary users file; the requests
+come from a pool of client threads, each one with a new connection.
+
+Every request is authenticated, so the password hash is part of the cost.
+A cheap hash ``method``, like ``pbkdf2:sha256:1``, shows the rest of the cost.
+"""
+
+from __future__ import annotations
+import base64
+from concurrent import futures
+import csv
+import http.client
+import json
+import logging
+from pathlib import Path
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, NamedTuple
+import werkzeug.security
+import classifier
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+USERNAME, PASSWORD = "load", "Hunter2"
+
+
+def serve(port: int, user_file: Path) -> None:
+    """Run the development server, without the reloader, debugger, or request log."""
+    classifier.app.config["USER_FILE"] = user_file
+    classifier.app.config["TRAINING_FILE"] = ROOT / "bezdekIris.data"
+    classifier.app.config["TESTING"] = False
+    classifier.knn.load()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    classifier.app.run(port=port, debug=False, use_reloader=False, threaded=True)
+
+
+def user_file(target: Path, method: str) -> None:
+    user = classifier.User(
+        USERNAME, "load@example.com", "Load Test", classifier.Role.BOTANIST
+    )
+    if method:
+        user.password = werkzeug.security.generate_password_hash(PASSWORD, method)
+    else:
+        user.set_password(PASSWORD)
+    with target.open("w", newline="") as output:
+        writer = csv.DictWriter(output, classifier.User.headers)
+        writer.writeheader()
+        writer.writerow(user.asdict())
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+class Result(NamedTuple):
+    status: int
+    latency: float
+    classify: float
+
+
+class Client:
+    def __init__(self, port: int, batch: int) -> None:
+        self.port = port
+        credentials = base64.b64encode(f"{USERNAME}:{PASSWORD}".encode("utf-8"))
+        self.headers = {
+            "Authorization": f"BASIC {credentials.decode('ASCII')}",
+            "Content-Type": "application/json",
+        }
+        with (ROOT / "bezdekIris.json").open() as source:
+            samples: list[dict[str, Any]] = json.load(source)
+        for sample in samples:
+            del sample["species"]
+        random.seed(42)
+        body: Any = random.choices(samples, k=batch) if batch > 1 else samples[0]
+        self.body = json.dumps(body).encode("utf-8")
+
+    def get(self, path: str) -> int:
+        connection = http.client.HTTPConnection("127.0.0.1", self.port)
+        try:
+            connection.request("GET", path)
+            return connection.getresponse().status
+        finally:
+            connection.close()
+
+    def classify(self) -> Result:
+        start = time.perf_counter()
+        connection = http.client.HTTPConnection("127.0.0.1", self.port)
+        try:
+            connection.request("POST", "/classify", self.body, self.headers)
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        timing = dict(
+            part.strip().split(";dur=")
+            for part in response.getheader("Server-Timing", "classify;dur=0").split(",")
+        )
+        return Result(
+            response.status, time.perf_counter() - start, float(timing["classify"])
+        )
+
+
+def wait_for(client: Client, server: subprocess.Popen[bytes]) -> None:
+    for _ in range(100):
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode}")
+        try:
+            if client.get("/health") == 200:
+                return
+        except ConnectionError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("server didn't start")
+
+
+def load(client: Client, requests: int, concurrency: int, batch: int) -> None:
+    with futures.ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda _: client.classify(), range(requests)))
+        end = time.perf_counter()
+    errors = sum(r.status != 200 for r in results)
+    latencies = sorted(r.latency * 1000 for r in results)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+    classify = statistics.mean(r.classify for r in results)
+    rate = requests / (end - start)
+    print(
+        f"| {batch:5d} | {concurrency:4d} | {rate:8,.0f} | {rate * batch:9,.0f} "
+        f"| {p50:7.2f} | {p99:7.2f} | {classify:8.3f} | {errors:6d} |"
+    )
+
+
+def main(requests: int = 2_000, concurrency: int = 8, method: str = "") -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        users = Path(directory) / "users.csv"
+        user_file(users, method)
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, __file__, "--serve", str(port), str(users)]
+        )
+        try:
+            print(
+                "| batch | conc | req/s    | samples/s | p50 ms  | p99 ms  | knn ms   | errors |"
+            )
+            print(
+                "|-------|------|----------|-----------|---------|---------|----------|--------|"
+            )
+            for batch in (1, 10, 100):
+                client = Client(port, batch)
+                wait_for(client, server)
+                load(client, requests, concurrency, batch)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--serve"]:
+        serve(int(sys.argv[2]), Path(sys.argv[3]))
+    else:
+        requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+        concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+        method = sys.argv[3] if len(sys.argv) > 3 else ""
+        main(requests, concurrency, method)
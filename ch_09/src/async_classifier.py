@@ -0,0 +1,498 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 9. Strings and Serialization
+
+An ASGI version of the classifier web service, with the same ``/health``,
+``/whoami``, and ``/classify`` routes, the same configuration, and the same users,
+credential cache, and Basic authentication as the Flask app in :mod:`classifier`.
+
+A slow client only holds a coroutine, not a thread.
+The slow work is kept off the event loop: a password check that isn't in the
+credential cache runs in a thread, and so does validating a large batch;
+classification runs in a pool of processes, each with its own copy of the hyperparameter.
+Looking up a user, and validating a small batch, are quick enough to run on the loop.
+Concurrent classification requests are coalesced by a :class:`Coalescer`,
+so one trip to a worker process classifies the samples from many requests.
+
+Run it with any ASGI server, ``uvicorn async_classifier:app``,
+or with the small HTTP/1.1 server in this module, ``python src/async_classifier.py``.
+"""
+from __future__ import annotations
+import asyncio
+import base64
+import binascii
+from concurrent import futures
+import json
+import multiprocessing
+import signal
+import time
+from typing import Any, Awaitable, Callable, Optional, cast
+from flask import Flask
+import classifier
+
+Scope = dict[str, Any]
+Message = dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+Measurements = classifier.Measurements
+
+# The configuration a worker process needs to build its own hyperparameter.
+WORKER_CONFIG = (
+    "TRAINING_FILE",
+    "CLASSIFIER_K",
+    "CLASSIFIER_DISTANCE",
+    "CLASSIFIER_CACHE_SIZE",
+)
+
+
+def start_worker(config: dict[str, Any]) -> None:
+    """Initialize a worker process: load the training data, and build the hyperparameter."""
+    classifier.app.config.update(config)
+    classifier.knn.load()
+
+
+def classify_batch(batch: list[Measurements]) -> list[str]:
+    """Classify the measurements, in a worker process."""
+    return classifier.knn.species(batch)
+
+
+class Coalescer:
+    """
+    Collect the measurements from concurrent requests, and classify them together.
+    A batch is sent when it has ``max_batch`` samples, or when the first request
+    in it has waited ``max_delay`` seconds; each caller gets its own results back.
+    A larger batch costs fewer trips to the process pool, and a single pass
+    through the training data, but the first requests in it wait longer.
+
+    >>> async def classify(batch):
+    ...     print(f"classify {len(batch)}")
+    ...     return [f"species {m[0]}" for m in batch]
+    >>> async def requests():
+    ...     coalescer = Coalescer(classify, max_batch=3, max_delay=0.01)
+    ...     return await asyncio.gather(
+    ...         coalescer.species([(1, 1, 1, 1)]),
+    ...         coalescer.species([(2, 2, 2, 2), (3, 3, 3, 3)]),
+    ...         coalescer.species([(4, 4, 4, 4)]),
+    ...     )
+    >>> asyncio.run(requests())
+    classify 3
+    classify 1
+    [['species 1'], ['species 2', 'species 3'], ['species 4']]
+    """
+
+    def __init__(
+        self,
+        classify: Callable[[list[Measurements]], Awaitable[list[str]]],
+        max_batch: int = 16,
+        max_delay: float = 0.001,
+    ) -> None:
+        self.classify = classify
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending: list[tuple[list[Measurements], asyncio.Future[list[str]]]] = []
+        self.size = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.running: set[asyncio.Task[None]] = set()
+
+    async def species(self, batch: list[Measurements]) -> list[str]:
+        """Wait for the species of these measurements, classified with any others pending."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[list[str]] = loop.create_future()
+        self.pending.append((batch, future))
+        self.size += len(batch)
+        if self.size >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_delay, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        """Start classifying the pending measurements."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        pending, self.pending, self.size = self.pending, [], 0
+        if pending:
+            task = asyncio.create_task(self.run(pending))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def run(
+        self, pending: list[tuple[list[Measurements], asyncio.Future[list[str]]]]
+    ) -> None:
+        try:
+            species = await self.classify([m for batch, _ in pending for m in batch])
+        except Exception as error:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        start = 0
+        for batch, future in pending:
+            # A caller may have gone away, cancelling its future.
+            if not future.done():
+                future.set_result(species[start : start + len(batch)])
+            start += len(batch)
+
+
+class Response:
+    """A JSON response."""
+
+    def __init__(
+        self,
+        document: dict[str, Any],
+        status: int = 200,
+        headers: Optional[dict[str, str]] = None,
+    ) -> None:
+        self.body = json.dumps(document).encode("utf-8")
+        self.status = status
+        self.headers = {"content-type": "application/json"} | (headers or {})
+
+    async def __call__(self, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status,
+                "headers": [
+                    (name.encode("latin-1"), value.encode("latin-1"))
+                    for name, value in self.headers.items()
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": self.body})
+
+
+class ASGIClassifier:
+    """
+    The classifier web service as an ASGI application.
+    The process pool starts with the ASGI lifespan, or with the first classification.
+    An unexpected error in a route is logged, and gets a 500 response.
+
+    >>> import asyncio
+    >>> service = ASGIClassifier(classifier.app, workers=1)
+    >>> sent = []
+    >>> async def receive():
+    ...     return {"type": "http.request", "body": b"", "more_body": False}
+    >>> async def send(message):
+    ...     sent.append(message)
+    >>> scope = {"type": "http", "method": "GET", "path": "/whoami", "headers": []}
+    >>> asyncio.run(service(scope, receive, send))
+    >>> sent[0]["status"], json.loads(sent[1]["body"])
+    (401, {'message': 'Unknown User'})
+    """
+
+    # A larger batch is validated in a thread; an invalid batch of 1,000
+    # samples takes about 90ms, which is too long to hold the event loop.
+    INLINE_ROWS = 16
+
+    def __init__(self, app: Flask, workers: Optional[int] = None) -> None:
+        self.app = app
+        self.workers = workers
+        self.pool: Optional[futures.ProcessPoolExecutor] = None
+        app.config.setdefault("CLASSIFIER_COALESCE_SIZE", 16)
+        app.config.setdefault("CLASSIFIER_COALESCE_DELAY", 0.001)
+        self.coalescer = Coalescer(
+            self.classify_batch,
+            app.config["CLASSIFIER_COALESCE_SIZE"],
+            app.config["CLASSIFIER_COALESCE_DELAY"],
+        )
+        self.routes: dict[
+            tuple[str, str], Callable[[Scope, bytes], Awaitable[Response]]
+        ] = {
+            ("GET", "/health"): self.health,
+            ("GET", "/whoami"): self.who_am_i,
+            ("POST", "/classify"): self.classify,
+        }
+
+    def startup(self) -> None:
+        if self.pool is None:
+            config = {name: self.app.config[name] for name in WORKER_CONFIG}
+            # Forking while a thread holds a lock can deadlock the worker.
+            self.pool = futures.ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=start_worker,
+                initargs=(config,),
+            )
+
+    def shutdown(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    async def classify_batch(self, batch: list[Measurements]) -> list[str]:
+        """Classify the measurements in the process pool."""
+        self.startup()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.pool, classify_batch, batch
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError(f"unsupported scope {scope['type']!r}")
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        route = self.routes.get((scope["method"], scope["path"]))
+        try:
+            if route is None:
+                paths = {path for method, path in self.routes}
+                status = 405 if scope["path"] in paths else 404
+                response = Response({"message": "Not Found"}, status)
+            else:
+                response = await route(scope, body)
+        except (classifier.NotAuthorized, classifier.InvalidSample) as error:
+            response = Response(error.to_dict(), error.status_code)
+        except Exception:
+            self.app.logger.exception("%s %s failed", scope["method"], scope["path"])
+            response = Response({"message": "Internal Server Error"}, 500)
+        await response(send)
+
+    async def lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def authenticate(self, scope: Scope) -> classifier.User:
+        """
+        The same Basic authentication as :func:`classifier.authenticate`.
+        Credentials that aren't in the credential cache are checked in a thread.
+        The user is looked up on the event loop: that's a dictionary lookup,
+        except when :class:`classifier.ReloadingUsers` re-reads a changed users file,
+        or with :class:`classifier.SQLiteUsers`, a query of a local database.
+        """
+        headers = dict(scope["headers"])
+        auth_header = headers.get(b"authorization", b"").decode("latin-1")
+        auth_body = auth_header.split(" ") if auth_header else [""]
+        auth_type, credentials = auth_body if len(auth_body) == 2 else ("", ":")
+        try:
+            username, _, password = (
+                base64.b64decode(credentials).decode("utf-8").partition(":")
+            )
+        except (binascii.Error, UnicodeDecodeError):
+            raise classifier.NotAuthorized("Unknown User")
+        user = classifier.users.get_user(username)
+        cache = classifier.credential_cache
+        valid = cache.cached(user, username, password)
+        if not valid:
+            client = scope["client"][0] if scope.get("client") else ""
+            valid = await asyncio.get_running_loop().run_in_executor(
+                None, cache.valid, user, username, password, client
+            )
+        if not (auth_type.upper() == "BASIC" and valid):
+            raise classifier.NotAuthorized("Unknown User")
+        return user
+
+    async def health(self, scope: Scope, body: bytes) -> Response:
+        users = classifier.users
+        # Be sure the users database gets loaded.
+        users.get_user("")
+        document: dict[str, Any] = {"status": "OK", "user_count": len(users)}
+        if self.app.config["TESTING"]:
+            document["users"] = [u.asdict() for u in users.values()]
+        return Response(document)
+
+    async def who_am_i(self, scope: Scope, body: bytes) -> Response:
+        user = await self.authenticate(scope)
+        return Response({"status": "OK", "user": user.asdict()})
+
+    async def classify(self, scope: Scope, body: bytes) -> Response:
+        """Like :func:`classifier.classify`, with the classification coalesced and in the process pool."""
+        await self.authenticate(scope)
+        start = time.perf_counter()
+        try:
+            document = json.loads(body)
+        except ValueError:
+            document = None
+        batch = document if isinstance(document, list) else [document]
+        limit = self.app.config["CLASSIFIER_BATCH_LIMIT"]
+        if len(batch) > limit:
+            raise classifier.InvalidSample(f"more than {limit} samples", 413)
+        if len(batch) <= self.INLINE_ROWS:
+            samples = classifier.knn.samples(batch)
+        else:
+            samples = await asyncio.get_running_loop().run_in_executor(
+                None, classifier.knn.samples, batch
+            )
+        validated = time.perf_counter()
+        species = await self.coalescer.species(
+            [
+                (s.sepal_length, s.sepal_width, s.petal_length, s.petal_width)
+                for s in samples
+            ]
+        )
+        classified = time.perf_counter()
+        return Response(
+            {
+                "status": "OK",
+                "species": species if isinstance(document, list) else species[0],
+            },
+            headers={
+                "server-timing": (
+                    f"validate;dur={(validated - start) * 1000:.3f}, "
+                    f"classify;dur={(classified - validated) * 1000:.3f}"
+                )
+            },
+        )
+
+
+app = ASGIClassifier(classifier.app)
+
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+}
+
+
+async def handle(
+    asgi_app: ASGIClassifier,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    max_body: int = 1 << 20,
+) -> None:
+    """
+    Serve HTTP/1.1 requests on one connection, until the client closes it,
+    or a request asks for the connection to be closed.
+    Request bodies need a ``Content-Length``; chunked bodies aren't supported.
+    A malformed request gets a 400 response, and the connection is closed.
+    """
+
+    async def reply(status: int, message: str) -> None:
+        await Response({"message": message}, status)(
+            lambda response: write(writer, response, False)
+        )
+
+    client = writer.get_extra_info("peername")
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")[:-2]
+            method, target, version = (request_line.split(" ") + ["", "", ""])[:3]
+            headers = [
+                (
+                    name.strip().lower().encode("latin-1"),
+                    value.strip().encode("latin-1"),
+                )
+                for name, _, value in (line.partition(":") for line in header_lines)
+            ]
+            fields = dict(headers)
+            keep_alive = version == "HTTP/1.1" and fields.get(b"connection") != b"close"
+            content_length = fields.get(b"content-length", b"0")
+            if not (
+                request_line.count(" ") == 2
+                and method
+                and version.startswith("HTTP/")
+                and content_length.isdigit()
+            ):
+                await reply(400, "Bad Request")
+                return
+            length = int(content_length)
+            if length > max_body:
+                await reply(413, "Payload Too Large")
+                return
+            body = await reader.readexactly(length)
+            path, _, query = target.partition("?")
+            scope: Scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": version.removeprefix("HTTP/"),
+                "method": method,
+                "path": path,
+                "query_string": query.encode("latin-1"),
+                "headers": headers,
+                "client": client,
+            }
+
+            async def receive() -> Message:
+                return {"type": "http.request", "body": body, "more_body": False}
+
+            async def send(message: Message) -> None:
+                await write(writer, message, keep_alive)
+
+            await asgi_app(scope, receive, send)
+            if not keep_alive:
+                return
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def write(
+    writer: asyncio.StreamWriter, message: Message, keep_alive: bool
+) -> None:
+    if message["type"] == "http.response.start":
+        status = message["status"]
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}".encode("latin-1")]
+        lines.extend(name + b": " + value for name, value in message["headers"])
+        lines.append(b"connection: " + (b"keep-alive" if keep_alive else b"close"))
+        writer.write(b"\r\n".join(lines) + b"\r\n")
+    elif message["type"] == "http.response.body":
+        body = message.get("body", b"")
+        writer.write(b"content-length: %d\r\n\r\n" % len(body) + body)
+        await writer.drain()
+
+
+async def serve(
+    asgi_app: ASGIClassifier, host: str = "127.0.0.1", port: int = 8000
+) -> None:
+    """
+    Serve the ASGI application until cancelled, or until the process gets SIGTERM.
+    Either way, the process pool is shut down, so no worker is left behind.
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    terminated = False
+
+    def terminate() -> None:
+        nonlocal terminated
+        terminated = True
+        cast(asyncio.Task[None], task).cancel()
+
+    asgi_app.startup()
+    server = await asyncio.start_server(
+        lambda reader, writer: handle(asgi_app, reader, writer),
+        host,
+        port,
+        backlog=1024,
+    )
+    loop.add_signal_handler(signal.SIGTERM, terminate)
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        if not terminated:
+            raise
+    finally:
+        loop.remove_signal_handler(signal.SIGTERM)
+        asgi_app.shutdown()
+
+
+if __name__ == "__main__":
+    classifier.knn.load()
+    asyncio.run(serve(app))
@@ -4,25 +4,40 @@ Python 3 Object-Oriented Programming Case Study
 Chapter 9. Strings and Serialization
 """
 from __future__ import annotations
+from array import array
 import collections
+from concurrent import futures
 import csv
 import datetime
+import heapq
 import json
 import jsonschema  # type: ignore[import]
+from itertools import islice
 from math import isclose
+from operator import itemgetter
+import mmap
 from pathlib import Path
 from typing import (
     cast,
     Any,
+    BinaryIO,
     Optional,
     Union,
     Iterator,
     Iterable,
     Counter,
+    Literal,
     Callable,
+    Generic,
+    NamedTuple,
     Protocol,
+    Sequence,
     TypedDict,
+    TypeVar,
 )
+import os
+import struct
+import sys
 import weakref
 import yaml
 
@@ -330,8 +345,12 @@ class Hyperparameter:
         if not training_data:
             raise RuntimeError("No TrainingData object")
         distances: list[tuple[float, TrainingKnownSample]] = sorted(
-            (self.algorithm.distance(sample, known), known)
-            for known in training_data.training
+            (
+                (self.algorithm.distance(sample, known), known)
+                for known in training_data.training
+            ),
+            # Equally distant samples aren't ordered.
+            key=lambda distance_known: distance_known[0],
         )
         k_nearest = (known.species for d, known in distances[: self.k])
         frequency: Counter[str] = collections.Counter(k_nearest)
@@ -339,6 +358,29 @@ class Hyperparameter:
         species, votes = best_fit
         return species
 
+    def classify_batch(self, samples: Sequence[Sample]) -> list[str]:
+        """
+        The k-NN algorithm for several samples, with one pass through the training data.
+        The results are the same as :meth:`classify` for each sample.
+        """
+        training_data = self.data()
+        if not training_data:
+            raise RuntimeError("No TrainingData object")
+        distance = self.algorithm.distance
+        distances: list[list[tuple[float, str]]] = [[] for _ in samples]
+        for known in training_data.training:
+            species = known.species
+            for row, sample in zip(distances, samples):
+                row.append((distance(sample, known), species))
+        classifications = []
+        for row in distances:
+            # Like sorted(), nsmallest() keeps equally distant samples in order.
+            k_nearest = heapq.nsmallest(self.k, row, key=itemgetter(0))
+            frequency: Counter[str] = collections.Counter(s for d, s in k_nearest)
+            best_fit, *others = frequency.most_common()
+            classifications.append(best_fit[0])
+        return classifications
+
 
 class TrainingData:
     """A set of training data and testing data with methods to load and test the samples."""
@@ -374,6 +416,34 @@ class TrainingData:
                 self.training.append(train)
         self.uploaded = datetime.datetime.now(tz=datetime.timezone.utc)
 
+    def load_columns(self, columns: IrisColumns) -> None:
+        """Like :meth:`load`, with the measurements already in typed columns."""
+        rows = zip(
+            columns.species,
+            columns.sepal_length,
+            columns.sepal_width,
+            columns.petal_length,
+            columns.petal_width,
+        )
+        for n, (species, sl, sw, pl, pw) in enumerate(rows):
+            if n % 5 == 0:
+                self.testing.append(TestingKnownSample(species, sl, sw, pl, pw))
+            else:
+                self.training.append(TrainingKnownSample(species, sl, sw, pl, pw))
+        self.uploaded = datetime.datetime.now(tz=datetime.timezone.utc)
+
+    def load_csv(self, reader: CSVIrisReader) -> None:
+        """
+        Load from :meth:`CSVIrisReader.columns`.
+        A file the fast path can't parse is loaded from :meth:`CSVIrisReader.data_iter`.
+        """
+        try:
+            columns = reader.columns()
+        except ValueError:
+            self.load(cast(Iterable[SampleDict], reader.data_iter()))
+        else:
+            self.load_columns(columns)
+
     def test(self, parameter: Hyperparameter) -> None:
         """Test this hyperparamater value."""
         parameter.test()
@@ -396,6 +466,60 @@ class SampleDict(TypedDict):
     species: str
 
 
+class IrisColumns(NamedTuple):
+    """
+    The samples as columns: an array of floats for each measurement,
+    and a list of species names, interned so each name is stored once.
+    """
+
+    sepal_length: array[float]
+    sepal_width: array[float]
+    petal_length: array[float]
+    petal_width: array[float]
+    species: list[str]
+
+    @classmethod
+    def empty(cls) -> IrisColumns:
+        return cls(array("d"), array("d"), array("d"), array("d"), [])
+
+    def extend(self, text: str) -> None:
+        """
+        Parse complete lines of unquoted CSV text, skipping blank lines.
+        Raises :exc:`ValueError` for anything else; the :mod:`csv` module can handle it.
+        """
+        if '"' in text:
+            raise ValueError("quoted fields need the csv module")
+        # One flat list of strings: a list for each row would be far slower to build.
+        lines = [line for line in text.splitlines() if line]
+        if not lines:
+            return
+        fields = ",".join(lines).split(",")
+        if len(fields) != 5 * len(lines):
+            raise ValueError("each row needs five fields")
+        # A row with too few or too many fields shifts a species name into a measurement.
+        self.sepal_length.extend(map(float, fields[0::5]))
+        self.sepal_width.extend(map(float, fields[1::5]))
+        self.petal_length.extend(map(float, fields[2::5]))
+        self.petal_width.extend(map(float, fields[3::5]))
+        self.species.extend(map(sys.intern, fields[4::5]))
+
+    def data_iter(self) -> Iterator[SampleDict]:
+        for species, sl, sw, pl, pw in zip(
+            self.species,
+            self.sepal_length,
+            self.sepal_width,
+            self.petal_length,
+            self.petal_width,
+        ):
+            yield SampleDict(
+                sepal_length=sl,
+                sepal_width=sw,
+                petal_length=pl,
+                petal_width=pw,
+                species=species,
+            )
+
+
 class CSVIrisReader:
     """
     Attribute Information:
@@ -425,6 +549,24 @@ class CSVIrisReader:
             reader = csv.DictReader(source_file, self.header)
             yield from reader
 
+    def columns(self, block_size: int = 1 << 20) -> IrisColumns:
+        """
+        Parse the file in blocks of about ``block_size`` characters, straight into columns.
+        There's no dictionary for each row, and the text of each field is discarded
+        as soon as it's converted.
+
+        Raises :exc:`ValueError` if a row doesn't have exactly five unquoted fields,
+        or a measurement isn't a number; use :meth:`data_iter` for those files.
+        """
+        columns = IrisColumns.empty()
+        tail = ""
+        with self.source.open() as source_file:
+            while block := source_file.read(block_size):
+                lines, _, tail = (tail + block).rpartition("\n")
+                columns.extend(lines)
+        columns.extend(tail)
+        return columns
+
 
 class CSVIrisReader_2:
     """
@@ -476,6 +618,154 @@ class NDJSONIrisReader:
                 yield sample
 
 
+class ByteRange(NamedTuple):
+    start: int
+    end: int
+
+
+def byte_ranges(source: Path, chunk_size: int) -> list[ByteRange]:
+    """
+    Split a file into ranges of about ``chunk_size`` bytes.
+    Each range is extended to the end of its last line, so no line is split.
+
+    >>> from tempfile import TemporaryDirectory
+    >>> with TemporaryDirectory() as directory:
+    ...     source = Path(directory) / "lines.txt"
+    ...     _ = source.write_bytes(b"one\\ntwo\\nthree\\nfour\\n")
+    ...     byte_ranges(source, 5)
+    [ByteRange(start=0, end=8), ByteRange(start=8, end=14), ByteRange(start=14, end=19)]
+    """
+    size = source.stat().st_size
+    ranges = []
+    with source.open("rb") as source_file:
+        start = 0
+        while start < size:
+            source_file.seek(start + chunk_size - 1)
+            source_file.readline()
+            end = min(source_file.tell(), size)
+            ranges.append(ByteRange(start, end))
+            start = end
+    return ranges
+
+
+def parse_ndjson(data: bytes) -> list[SampleDict]:
+    """The rows of a block of complete NDJSON lines."""
+    return [json.loads(line) for line in data.splitlines()]
+
+
+def parse_csv(data: bytes) -> list[dict[str, str]]:
+    """The rows of a block of complete CSV lines, like :class:`CSVIrisReader_2`."""
+    return [
+        dict(
+            sepal_length=row[0],  # in cm
+            sepal_width=row[1],  # in cm
+            petal_length=row[2],  # in cm
+            petal_width=row[3],  # in cm
+            species=row[4],  # class string
+        )
+        for row in csv.reader(data.decode().splitlines())
+        if row
+    ]
+
+
+Row = TypeVar("Row")
+
+
+def parse_range(
+    parse: Callable[[bytes], list[Row]], source: Path, byte_range: ByteRange
+) -> list[Row]:
+    """Read and parse one range of a file. This runs in a worker process."""
+    with source.open("rb") as source_file:
+        source_file.seek(byte_range.start)
+        data = source_file.read(byte_range.end - byte_range.start)
+    return parse(data)
+
+
+class ParallelIrisReader(Generic[Row]):
+    """
+    Split the source into byte ranges at line boundaries, and parse them in a process pool.
+
+    With ``ordered`` true, :meth:`data_iter` yields the rows in the order of the file.
+    Otherwise, each range's rows are yielded as soon as that range is parsed;
+    the rows of a range stay in order.
+    At most two ranges per worker are in progress, so only a few ranges of rows
+    are held in memory at once.
+
+    This depends on each row being one line: a quoted CSV field can't contain a newline.
+    """
+
+    def __init__(
+        self,
+        source: Path,
+        parse: Callable[[bytes], list[Row]],
+        workers: Optional[int] = None,
+        chunk_size: int = 16 * 2**20,
+        ordered: bool = True,
+    ) -> None:
+        self.source = source
+        self.parse = parse
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.ordered = ordered
+
+    def data_iter(self) -> Iterator[Row]:
+        ranges = iter(byte_ranges(self.source, self.chunk_size))
+        with futures.ProcessPoolExecutor(self.workers) as workers:
+            running: list[futures.Future[list[Row]]] = []
+
+            def submit() -> None:
+                byte_range = next(ranges, None)
+                if byte_range is not None:
+                    running.append(
+                        workers.submit(parse_range, self.parse, self.source, byte_range)
+                    )
+
+            for _ in range(2 * self.workers):
+                submit()
+            try:
+                while running:
+                    if self.ordered:
+                        done = running.pop(0)
+                    else:
+                        finished, _ = futures.wait(
+                            running, return_when=futures.FIRST_COMPLETED
+                        )
+                        done = min(finished, key=running.index)
+                        running.remove(done)
+                    rows = done.result()
+                    submit()
+                    yield from rows
+            finally:
+                for future in running:
+                    future.cancel()
+
+
+class ParallelNDJSONIrisReader(ParallelIrisReader[SampleDict]):
+    """The rows of :class:`NDJSONIrisReader`, parsed in parallel."""
+
+    def __init__(
+        self,
+        source: Path,
+        workers: Optional[int] = None,
+        chunk_size: int = 16 * 2**20,
+        ordered: bool = True,
+    ) -> None:
+        super().__init__(source, parse_ndjson, workers, chunk_size, ordered)
+
+
+class ParallelCSVIrisReader(ParallelIrisReader[dict[str, str]]):
+    """The rows of :class:`CSVIrisReader_2`, parsed in parallel."""
+
+    def __init__(
+        self,
+        source: Path,
+        workers: Optional[int] = None,
+        chunk_size: int = 16 * 2**20,
+        ordered: bool = True,
+    ) -> None:
+        super().__init__(source, parse_csv, workers, chunk_size, ordered)
+
+
 IRIS_SCHEMA = {
     "$schema": "https://json-schema.org/draft/2019-09/hyper-schema",
     "title": "Iris Data Schema",
@@ -496,19 +786,219 @@ IRIS_SCHEMA = {
 }
 
 
+# A JSON type, as a test of a value. These are the exact types json.loads() creates.
+# json.loads() also accepts NaN and Infinity, which aren't JSON; a "number" that's
+# NaN, infinite, or too big for a float fails, and is left to the full validator.
+JSON_TYPES: dict[str, Callable[[Any], bool]] = {
+    "number": lambda v: type(v) in (int, float) and abs(v) <= sys.float_info.max,
+    "integer": lambda v: type(v) is int,
+    "string": lambda v: type(v) is str,
+    "boolean": lambda v: type(v) is bool,
+    "null": lambda v: v is None,
+    "object": lambda v: type(v) is dict,
+    "array": lambda v: type(v) is list,
+}
+
+# Keywords that don't constrain the values.
+ANNOTATIONS = {"$schema", "title", "description"}
+
+
+def compile_schema(schema: dict[str, Any]) -> Callable[[list[Any]], list[int]]:
+    """
+    Compile a simple object schema into a function that checks a batch of rows,
+    and returns the positions of the rows that might be invalid.
+    The schema can have ``type``, ``properties``, and ``required``;
+    each property can have a single ``type`` and an ``enum`` of strings.
+
+    A row that passes is valid. A row that fails may only be unusual,
+    for example, an ``"integer"`` written as ``1.0``;
+    only a full validator can say why, or if, it's invalid.
+    Raises :exc:`ValueError` for anything else.
+
+    >>> invalid = compile_schema(IRIS_SCHEMA)
+    >>> invalid([
+    ...     {"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4, "petal_width": 0.2, "species": "Iris-setosa"},
+    ...     {"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4, "petal_width": "0.2"},
+    ...     {"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4, "petal_width": 0.2, "species": "Iris"},
+    ...     ["not", "an", "object"],
+    ...     {"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4, "petal_width": float("nan")},
+    ... ])
+    [1, 2, 3, 4]
+    >>> compile_schema({"properties": {"sepal-length": {"type": ["number", "null"]}}})
+    Traceback (most recent call last):
+    ...
+    ValueError: can't compile type ['number', 'null']
+    """
+
+    def keywords(schema: Any, allowed: set[str]) -> None:
+        if not isinstance(schema, dict):
+            raise ValueError(f"can't compile schema {schema!r}")
+        if unknown := schema.keys() - allowed - ANNOTATIONS:
+            raise ValueError(f"can't compile {sorted(unknown)}")
+
+    def value_tests(schema: Any) -> list[Callable[[Any], bool]]:
+        keywords(schema, {"type", "enum"})
+        tests = []
+        if "type" in schema:
+            json_type = schema["type"]
+            if not isinstance(json_type, str) or json_type not in JSON_TYPES:
+                raise ValueError(f"can't compile type {json_type!r}")
+            tests.append(JSON_TYPES[json_type])
+        if "enum" in schema:
+            enum = schema["enum"]
+            if not (
+                isinstance(enum, list) and all(isinstance(value, str) for value in enum)
+            ):
+                raise ValueError("can't compile a non-string enum")
+            values = frozenset(enum)
+            tests.append(lambda v: type(v) is str and v in values)
+        return tests
+
+    keywords(schema, {"type", "properties", "required"})
+    if schema.get("type", "object") != "object":
+        raise ValueError(f"can't compile type {schema['type']!r}")
+    required = schema.get("required", [])
+    if not (
+        isinstance(required, list) and all(isinstance(name, str) for name in required)
+    ):
+        raise ValueError(f"can't compile required {required!r}")
+    properties = schema.get("properties", {})
+    if not isinstance(properties, dict):
+        raise ValueError(f"can't compile properties {properties!r}")
+    checks = [
+        (name, test)
+        for name, subschema in properties.items()
+        for test in value_tests(subschema)
+    ]
+
+    def valid(row: Any) -> bool:
+        if type(row) is not dict:
+            return False
+        for name in required:
+            if name not in row:
+                return False
+        for name, test in checks:
+            if name in row and not test(row[name]):
+                return False
+        return True
+
+    def invalid(rows: list[Any]) -> list[int]:
+        return [n for n, row in enumerate(rows) if not valid(row)]
+
+    return invalid
+
+
+class RowError(NamedTuple):
+    """One schema violation: the line, the path to the bad value, and the reason."""
+
+    line: int
+    path: str
+    message: str
+
+
+class ValidationReport:
+    """
+    How many rows were read and how many were invalid,
+    with the details of no more than :attr:`limit` errors;
+    :attr:`dropped` counts the errors after that.
+
+    >>> error = jsonschema.ValidationError("'species' is a required property")
+    >>> report = ValidationReport(limit=2)
+    >>> report.add(1, [error, error])
+    >>> report
+    ValidationReport(rows=0, invalid=1, errors=2)
+    >>> report.add(2, [error])
+    >>> report, report.dropped
+    (ValidationReport(rows=0, invalid=2, errors=2+), 1)
+    """
+
+    def __init__(self, limit: int = 100) -> None:
+        self.limit = limit
+        self.rows = 0
+        self.invalid = 0
+        self.errors: list[RowError] = []
+        self.dropped = 0
+
+    def add(self, line: int, errors: Iterable[jsonschema.ValidationError]) -> None:
+        self.invalid += 1
+        for error in errors:
+            if len(self.errors) >= self.limit:
+                self.dropped += 1
+                continue
+            path = "/".join(str(p) for p in error.absolute_path)
+            self.errors.append(RowError(line, path, error.message))
+
+    @property
+    def truncated(self) -> bool:
+        """True if there were more errors than the :attr:`limit`."""
+        return self.dropped > 0
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}("
+            f"rows={self.rows}, "
+            f"invalid={self.invalid}, "
+            f"errors={len(self.errors)}{'+' if self.truncated else ''}"
+            f")"
+        )
+
+
 class ValidatingNDJSONIrisReader:
-    def __init__(self, source: Path, schema: dict[str, Any]) -> None:
+    """
+    Yield the rows that are valid for the schema.
+    The schema is compiled with :func:`compile_schema`, when it can be,
+    and rows are checked in batches of ``batch_size``.
+    Only the rows that fail that check are given to :mod:`jsonschema`,
+    which decides if they're valid, and explains the errors.
+    The errors are in :attr:`report`, a :class:`ValidationReport`,
+    which keeps up to ``limit`` of them.
+    """
+
+    def __init__(
+        self,
+        source: Path,
+        schema: dict[str, Any],
+        batch_size: int = 1024,
+        limit: int = 100,
+    ) -> None:
         self.source = source
         self.validator = jsonschema.Draft7Validator(schema)
+        self.invalid: Callable[[list[Any]], list[int]]
+        try:
+            self.invalid = compile_schema(schema)
+        except ValueError:
+            self.invalid = lambda rows: list(range(len(rows)))
+        self.batch_size = batch_size
+        self.limit = limit
+        self.report = ValidationReport(limit)
 
     def data_iter(self) -> Iterator[SampleDict]:
+        self.report = ValidationReport(self.limit)
         with self.source.open() as source_file:
-            for line in source_file:
-                sample = json.loads(line)
-                if self.validator.is_valid(sample):
-                    yield sample
-                else:
-                    print(f"Invalid: {sample}")
+            first = 1
+            while batch := [
+                json.loads(line) for line in islice(source_file, self.batch_size)
+            ]:
+                yield from self.validated(first, batch)
+                first += len(batch)
+
+    def validated(self, first: int, batch: list[Any]) -> Iterator[SampleDict]:
+        """The valid rows of a batch; the first row of the batch is on line ``first``."""
+        self.report.rows += len(batch)
+        invalid = self.invalid(batch)
+        if not invalid:
+            yield from batch
+            return
+        start = 0
+        for n in invalid:
+            yield from batch[start:n]
+            start = n + 1
+            errors = list(self.validator.iter_errors(batch[n]))
+            if errors:
+                self.report.add(first + n, errors)
+            else:
+                yield batch[n]
+        yield from batch[start:]
 
 
 class YAMLIrisReader:
@@ -520,6 +1010,206 @@ class YAMLIrisReader:
             yield from yaml.load_all(source_file, Loader=yaml.SafeLoader)
 
 
+class IrisReader(Protocol):
+    def data_iter(self) -> Iterator[Any]: ...
+
+
+class BinaryIrisFormat:
+    """
+    A versioned binary file of samples.
+
+    ``HEADER``
+        Magic number, format version, float size (4 or 8), number of rows,
+        number of species, and the offsets of the three blocks.
+    Features
+        Four floats per row, in the order of :attr:`CSVIrisReader.header`.
+    Codes
+        An unsigned 16-bit index into the species dictionary for each row.
+    Species dictionary
+        Each name as a 16-bit length and its UTF-8 bytes.
+
+    Everything is little-endian. The features start on a 64-byte boundary,
+    so a memory-mapped file can be used as an array of floats without copying.
+    """
+
+    MAGIC = b"IRIS"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHBxQIQQQ")
+    FEATURES_OFFSET = 64
+    TYPECODES: dict[int, Literal["f", "d"]] = {4: "f", 8: "d"}
+
+
+def write_binary(reader: IrisReader, target: Path, float_size: int = 8) -> int:
+    """
+    Write the rows of any reader to a :class:`BinaryIrisFormat` file,
+    and return the number of rows.
+    The features are written in blocks as they're read; only the species codes
+    are kept in memory until the end.
+    With a ``float_size`` of 4, the file is half the size, but measurements are
+    rounded to float32: 5.1 is read back as 5.099999904632568.
+    """
+    if float_size not in BinaryIrisFormat.TYPECODES:
+        raise ValueError(f"float_size must be 4 or 8, not {float_size!r}")
+    block: array[float] = array(BinaryIrisFormat.TYPECODES[float_size])
+    codes: array[int] = array("H")
+    species: dict[str, int] = {}
+
+    def flush(data: array[Any], output: BinaryIO) -> None:
+        if sys.byteorder == "big":
+            data.byteswap()
+        data.tofile(output)
+        del data[:]
+
+    with target.open("wb") as output:
+        output.write(bytes(BinaryIrisFormat.FEATURES_OFFSET))
+        for row in reader.data_iter():
+            block.extend(
+                (
+                    float(row["sepal_length"]),
+                    float(row["sepal_width"]),
+                    float(row["petal_length"]),
+                    float(row["petal_width"]),
+                )
+            )
+            codes.append(species.setdefault(row["species"], len(species)))
+            if len(block) >= 2**18:
+                flush(block, output)
+        flush(block, output)
+        codes_offset = output.tell()
+        rows = len(codes)
+        flush(codes, output)
+        species_offset = output.tell()
+        for name in species:
+            encoded = name.encode("utf-8")
+            output.write(struct.pack("<H", len(encoded)) + encoded)
+        output.seek(0)
+        output.write(
+            BinaryIrisFormat.HEADER.pack(
+                BinaryIrisFormat.MAGIC,
+                BinaryIrisFormat.VERSION,
+                float_size,
+                rows,
+                len(species),
+                BinaryIrisFormat.FEATURES_OFFSET,
+                codes_offset,
+                species_offset,
+            )
+        )
+    return rows
+
+
+class BinaryIrisReader:
+    """
+    Memory-map a :class:`BinaryIrisFormat` file. Opening it only reads the header
+    and the species dictionary; the operating system pages in the rest as it's used.
+    The samples are created one at a time, by index or by :meth:`data_iter`.
+    :attr:`features` is the flat array of measurements, four per row.
+
+    Use :meth:`close`, or a ``with`` statement, to release the file.
+    """
+
+    def __init__(self, source: Path) -> None:
+        self.source = source
+        if sys.byteorder == "big":
+            raise ValueError("BinaryIrisReader needs a little-endian machine")
+        with source.open("rb") as source_file:
+            self.map = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (
+                magic,
+                version,
+                float_size,
+                self.rows,
+                species_count,
+                features_offset,
+                codes_offset,
+                species_offset,
+            ) = BinaryIrisFormat.HEADER.unpack_from(self.map)
+        except struct.error as ex:
+            self.map.close()
+            raise ValueError(f"{source} is too short for a header") from ex
+        if (
+            magic != BinaryIrisFormat.MAGIC
+            or version != BinaryIrisFormat.VERSION
+            or float_size not in BinaryIrisFormat.TYPECODES
+        ):
+            self.map.close()
+            raise ValueError(
+                f"{source} isn't a version {BinaryIrisFormat.VERSION} file"
+            )
+        # Check every block is inside the file before it's cast or unpacked.
+        end = len(self.map)
+        if not (
+            BinaryIrisFormat.HEADER.size
+            <= features_offset
+            <= codes_offset
+            <= species_offset
+            <= end
+            and codes_offset - features_offset == 4 * float_size * self.rows
+            and species_offset - codes_offset == 2 * self.rows
+        ):
+            self.map.close()
+            raise ValueError(f"{source} is truncated, or its offsets are wrong")
+        self.species: list[str] = []
+        offset = species_offset
+        for _ in range(species_count):
+            if offset + 2 > end:
+                break
+            (size,) = struct.unpack_from("<H", self.map, offset)
+            if offset + 2 + size > end:
+                break
+            self.species.append(
+                self.map[offset + 2 : offset + 2 + size].decode("utf-8")
+            )
+            offset += 2 + size
+        else:
+            whole = memoryview(self.map)
+            self.features = whole[features_offset:codes_offset].cast(
+                BinaryIrisFormat.TYPECODES[float_size]
+            )
+            self.codes = whole[codes_offset:species_offset].cast("H")
+            whole.release()
+            return
+        self.map.close()
+        raise ValueError(f"{source} is truncated in the species dictionary")
+
+    def __len__(self) -> int:
+        return cast(int, self.rows)
+
+    def __getitem__(self, index: int) -> KnownSample:
+        index = range(self.rows)[index]
+        f = self.features
+        return KnownSample(
+            species=self.species[self.codes[index]],
+            sepal_length=f[4 * index],
+            sepal_width=f[4 * index + 1],
+            petal_length=f[4 * index + 2],
+            petal_width=f[4 * index + 3],
+        )
+
+    def data_iter(self) -> Iterator[SampleDict]:
+        measurements = iter(self.features)
+        for (sl, sw, pl, pw), code in zip(zip(*[measurements] * 4), self.codes):
+            yield SampleDict(
+                sepal_length=sl,
+                sepal_width=sw,
+                petal_length=pl,
+                petal_width=pw,
+                species=self.species[code],
+            )
+
+    def close(self) -> None:
+        self.features.release()
+        self.codes.release()
+        self.map.close()
+
+    def __enter__(self) -> BinaryIrisReader:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
 # Special case, we don't *often* test abstract superclasses.
 # In this example, however, we can create instances of the abstract class.
 test_Sample = """
@@ -610,6 +1300,8 @@ test_Hyperparameter = """
 >>> u = UnknownSample(sepal_length=5.1, sepal_width=3.5, petal_length=1.4, petal_width=0.2)
 >>> h.classify(u)
 'Iris-setosa'
+>>> h.classify_batch([u, UnknownSample(7.8, 3.2, 4.7, 1.4)])
+['Iris-setosa', 'Iris-versicolor']
 >>> h.test()
 >>> print(f"data={td.name!r}, k={h.k}, quality={h.quality}")
 data='test', k=3, quality=1.0
@@ -632,4 +1324,36 @@ test_TrainingData = """
 data='test', k=3, quality=0.0
 """
 
+test_CSVIrisReader_columns = """
+>>> from pathlib import Path
+>>> from tempfile import TemporaryDirectory
+>>> with TemporaryDirectory() as directory:
+...     source = Path(directory) / "iris.data"
+...     _ = source.write_text(
+...         "5.1,3.5,1.4,0.2,Iris-setosa\\n"
+...         "7.9,3.2,4.7,1.4,Iris-versicolor\\n"
+...         "4.9,3.0,1.4,0.2,Iris-setosa\\n\\n"
+...     )
+...     columns = CSVIrisReader(source).columns(block_size=16)
+...     td = TrainingData('fast')
+...     td.load_csv(CSVIrisReader(source))
+...     _ = source.write_text('5.1,3.5,1.4,0.2,"Iris-setosa"\\n7.9,3.2,4.7,1.4,Iris-versicolor\\n')
+...     fallback = TrainingData('fallback')
+...     fallback.load_csv(CSVIrisReader(source))
+>>> columns.sepal_length
+array('d', [5.1, 7.9, 4.9])
+>>> columns.species
+['Iris-setosa', 'Iris-versicolor', 'Iris-setosa']
+>>> columns.species[0] is columns.species[2]
+True
+>>> next(columns.data_iter())
+{'sepal_length': 5.1, 'sepal_width': 3.5, 'petal_length': 1.4, 'petal_width': 0.2, 'species': 'Iris-setosa'}
+>>> td.testing
+[TestingKnownSample(sepal_length=5.1, sepal_width=3.5, petal_length=1.4, petal_width=0.2, species='Iris-setosa', classification=None, )]
+>>> len(td.training)
+2
+>>> fallback.testing
+[TestingKnownSample(sepal_length=5.1, sepal_width=3.5, petal_length=1.4, petal_width=0.2, species='Iris-setosa', classification=None, )]
+"""
+
 __test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
@@ -0,0 +1,272 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 9. Strings and Serialization
+"""
+
+import asyncio
+import base64
+from concurrent import futures
+import json
+import os
+from pathlib import Path
+import signal
+from pytest import *
+import classifier
+import async_classifier
+
+
+@fixture(scope="module")
+def service():
+    user = classifier.User(
+        username="kenji",
+        email="kenji@example.com",
+        real_name="Kenji T.",
+        role=classifier.Role.BOTANIST,
+    )
+    user.set_password("Hunter2")
+    classifier.app.config["TESTING"] = True
+    classifier.app.config["USER_FILE"] = Path.cwd() / "test_data"
+    classifier.app.config["TRAINING_FILE"] = Path.cwd().parent / "bezdekIris.data"
+    classifier.users.add_user(user)
+    classifier.knn.load()
+    service = async_classifier.ASGIClassifier(classifier.app, workers=1)
+    yield service
+    service.shutdown()
+
+
+@fixture
+def authorization():
+    credentials = base64.b64encode("kenji:Hunter2".encode("utf-8"))
+    return [(b"authorization", b"BASIC " + credentials)]
+
+
+def call(service, method, path, headers=(), body=b""):
+    """Run one request through the ASGI application; return status, headers, and document."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": list(headers),
+        "client": ("127.0.0.1", 54321),
+    }
+    asyncio.run(service(scope, receive, send))
+    start, response = sent
+    return start["status"], dict(start["headers"]), json.loads(response["body"])
+
+
+def test_health(service):
+    status, headers, document = call(service, "GET", "/health")
+    assert status == 200
+    assert headers[b"content-type"] == b"application/json"
+    assert document["status"] == "OK"
+
+
+def test_whoami(service, authorization):
+    status, _, document = call(service, "GET", "/whoami", authorization)
+    assert status == 200
+    assert document["user"]["username"] == "kenji"
+
+
+def test_classify(service, authorization):
+    sample = {
+        "sepal_length": 5.1,
+        "sepal_width": 3.5,
+        "petal_length": 1.4,
+        "petal_width": 0.2,
+    }
+    status, headers, document = call(
+        service, "POST", "/classify", authorization, json.dumps(sample).encode()
+    )
+    assert status == 200
+    assert document == {"status": "OK", "species": "Iris-setosa"}
+    assert headers[b"server-timing"].startswith(b"validate;dur=")
+
+    batch = [
+        sample,
+        {
+            "sepal_length": 7.7,
+            "sepal_width": 3,
+            "petal_length": 6.1,
+            "petal_width": 2.3,
+        },
+    ]
+    status, _, document = call(
+        service, "POST", "/classify", authorization, json.dumps(batch).encode()
+    )
+    assert status == 200
+    assert document["species"] == ["Iris-setosa", "Iris-virginica"]
+
+
+def test_classify_invalid(service, authorization):
+    status, _, document = call(
+        service, "POST", "/classify", authorization, b'{"sepal_length": "big"}'
+    )
+    assert status == 400
+    assert document["message"] == "1 invalid sample"
+    status, _, _ = call(service, "POST", "/classify", authorization, b"not json")
+    assert status == 400
+    too_many = json.dumps([{}] * 1001).encode()
+    status, _, _ = call(service, "POST", "/classify", authorization, too_many)
+    assert status == 413
+
+
+def test_unauthorized(service):
+    status, _, document = call(service, "POST", "/classify", body=b"{}")
+    assert status == 401
+    assert document == {"message": "Unknown User"}
+    bad_encoding = [(b"authorization", b"BASIC !!!")]
+    status, _, _ = call(service, "GET", "/whoami", bad_encoding)
+    assert status == 401
+
+
+def test_not_found(service):
+    assert call(service, "GET", "/nowhere")[0] == 404
+    assert call(service, "GET", "/classify")[0] == 405
+
+
+def test_classify_coalesced(service, authorization, monkeypatch):
+    batches = []
+    classify_batch = service.classify_batch
+
+    async def counting(batch):
+        batches.append(len(batch))
+        return await classify_batch(batch)
+
+    monkeypatch.setattr(service.coalescer, "classify", counting)
+    monkeypatch.setattr(service.coalescer, "max_delay", 0.05)
+    samples = [
+        {
+            "sepal_length": 5.1,
+            "sepal_width": 3.5,
+            "petal_length": 1.4,
+            "petal_width": 0.2,
+        },
+        {
+            "sepal_length": 7.7,
+            "sepal_width": 3,
+            "petal_length": 6.1,
+            "petal_width": 2.3,
+        },
+        {
+            "sepal_length": 5.9,
+            "sepal_width": 2.8,
+            "petal_length": 4.3,
+            "petal_width": 1.3,
+        },
+    ]
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/classify",
+        "headers": authorization,
+    }
+
+    async def request(sample):
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": json.dumps(sample).encode()}
+
+        async def send(message):
+            sent.append(message)
+
+        await service(scope, receive, send)
+        return json.loads(sent[1]["body"])["species"]
+
+    async def requests():
+        return await asyncio.gather(*(request(sample) for sample in samples))
+
+    assert asyncio.run(requests()) == [
+        "Iris-setosa",
+        "Iris-virginica",
+        "Iris-versicolor",
+    ]
+    assert batches == [3]
+
+
+def test_classify_large_batch(service, authorization):
+    sample = {
+        "sepal_length": 5.1,
+        "sepal_width": 3.5,
+        "petal_length": 1.4,
+        "petal_width": 0.2,
+    }
+    batch = [sample] * (service.INLINE_ROWS + 1)
+    status, _, document = call(
+        service, "POST", "/classify", authorization, json.dumps(batch).encode()
+    )
+    assert status == 200
+    assert document["species"] == ["Iris-setosa"] * len(batch)
+    status, _, document = call(
+        service, "POST", "/classify", authorization, json.dumps(batch + [{}]).encode()
+    )
+    assert status == 400
+    assert document["errors"][0]["index"] == len(batch)
+
+
+def test_classify_broken_pool(service, authorization, monkeypatch):
+    async def broken(batch):
+        raise futures.process.BrokenProcessPool("a worker died")
+
+    monkeypatch.setattr(service.coalescer, "classify", broken)
+    sample = {
+        "sepal_length": 5.1,
+        "sepal_width": 3.5,
+        "petal_length": 1.4,
+        "petal_width": 0.2,
+    }
+    status, _, document = call(
+        service, "POST", "/classify", authorization, json.dumps(sample).encode()
+    )
+    assert status == 500
+    assert document == {"message": "Internal Server Error"}
+
+
+def test_handle_bad_requests(service):
+    async def exchange(request):
+        server = await asyncio.start_server(
+            lambda reader, writer: async_classifier.handle(service, reader, writer),
+            "127.0.0.1",
+            0,
+        )
+        async with server:
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request)
+            response = await reader.read()
+            writer.close()
+        return response
+
+    for request in [
+        b"GET\r\n\r\n",
+        b"GET /health HTTP/1.1 extra\r\n\r\n",
+        b"POST /classify HTTP/1.1\r\nContent-Length: ten\r\n\r\n",
+        b"POST /classify HTTP/1.1\r\nContent-Length: -1\r\n\r\n",
+    ]:
+        response = asyncio.run(exchange(request))
+        assert response.startswith(b"HTTP/1.1 400 Bad Request\r\n"), request
+    response = asyncio.run(
+        exchange(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+    )
+    assert response.startswith(b"HTTP/1.1 200 OK\r\n")
+
+
+def test_serve_terminate():
+    service = async_classifier.ASGIClassifier(classifier.app, workers=1)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.2, os.kill, os.getpid(), signal.SIGTERM)
+        await async_classifier.serve(service, port=0)
+
+    asyncio.run(run())
+    assert service.pool is None
@@ -0,0 +1,291 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 9. Strings and Serialization
+"""
+
+import base64
+from concurrent import futures
+import csv
+from pathlib import Path
+import threading
+from pytest import *
+from flask import Flask
+import werkzeug.security
+import classifier
+
+
+@fixture(scope="module")
+def app_client():
+    user = classifier.User(
+        username="noriko",
+        email="noriko@example.com",
+        real_name="Noriko K. L.",
+        role=classifier.Role.BOTANIST,
+    )
+    user.set_password("Hunter2")
+    with classifier.app.app_context():
+        classifier.app.config["TESTING"] = True
+        classifier.app.config["USER_FILE"] = Path.cwd() / "test_data"
+        classifier.app.config["TRAINING_FILE"] = Path.cwd().parent / "bezdekIris.data"
+        classifier.users.add_user(user)
+        classifier.knn.load()
+
+    yield classifier.app.test_client()
+
+
+@fixture
+def authorization():
+    credentials = base64.b64encode("noriko:Hunter2".encode("utf-8"))
+    return {"Authorization": f"BASIC {credentials.decode('ASCII')}"}
+
+
+def test_classify_one(app_client, authorization):
+    result = app_client.post(
+        "classify",
+        json={
+            "sepal_length": 5.1,
+            "sepal_width": 3.5,
+            "petal_length": 1.4,
+            "petal_width": 0.2,
+        },
+        headers=authorization,
+    )
+    assert result.status_code == 200
+    assert result.json == {"status": "OK", "species": "Iris-setosa"}
+    assert result.headers["Server-Timing"].startswith("validate;dur=")
+
+
+def test_classify_batch(app_client, authorization):
+    result = app_client.post(
+        "classify",
+        json=[
+            {
+                "sepal_length": 5.1,
+                "sepal_width": 3.5,
+                "petal_length": 1.4,
+                "petal_width": 0.2,
+            },
+            {
+                "sepal_length": 7.7,
+                "sepal_width": 3,
+                "petal_length": 6.1,
+                "petal_width": 2.3,
+            },
+        ],
+        headers=authorization,
+    )
+    assert result.status_code == 200
+    assert result.json == {
+        "status": "OK",
+        "species": ["Iris-setosa", "Iris-virginica"],
+    }
+
+
+def test_classify_invalid(app_client, authorization):
+    result = app_client.post(
+        "classify",
+        json=[
+            {
+                "sepal_length": 5.1,
+                "sepal_width": 3.5,
+                "petal_length": 1.4,
+                "petal_width": 0.2,
+            },
+            {"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4},
+        ],
+        headers=authorization,
+    )
+    assert result.status_code == 400
+    assert result.json == {
+        "message": "1 invalid sample",
+        "errors": [
+            {"index": 1, "path": "", "error": "'petal_width' is a required property"}
+        ],
+    }
+
+
+def test_classify_not_json(app_client, authorization):
+    result = app_client.post("classify", data="5.1,3.5,1.4,0.2", headers=authorization)
+    assert result.status_code == 400
+
+
+def test_classify_unauthorized(app_client):
+    result = app_client.post("classify", json=[])
+    assert result.status_code == 401
+
+
+def test_credential_cache(app_client, authorization, monkeypatch):
+    checked = []
+    valid_password = classifier.User.valid_password
+
+    def counting_valid_password(user, plain_text):
+        checked.append(user.username)
+        return valid_password(user, plain_text)
+
+    monkeypatch.setattr(classifier.User, "valid_password", counting_valid_password)
+    classifier.credential_cache.clear()
+    for _ in range(3):
+        assert app_client.get("whoami", headers=authorization).status_code == 200
+    assert checked == ["noriko"]
+
+    noriko = classifier.users.get_user("noriko")
+    monkeypatch.setattr(noriko, "password", noriko.password)
+    noriko.set_password("Hunter2")
+    assert app_client.get("whoami", headers=authorization).status_code == 200
+    assert checked == ["noriko", "noriko"]
+
+
+def test_credential_cache_failures(app_client, authorization):
+    classifier.credential_cache.clear()
+    assert app_client.get("whoami", headers=authorization).status_code == 200
+    credentials = base64.b64encode("noriko:not my password".encode("utf-8"))
+    bad = {"Authorization": f"BASIC {credentials.decode('ASCII')}"}
+    limit = classifier.app.config["AUTH_FAILURE_LIMIT"]
+    statuses = [
+        app_client.get("whoami", headers=bad).status_code for _ in range(limit + 1)
+    ]
+    assert statuses == [401] * limit + [429]
+    # Credentials that were already verified aren't refused.
+    assert app_client.get("whoami", headers=authorization).status_code == 200
+    classifier.credential_cache.clear()
+
+
+def test_credential_cache_concurrent_failures(monkeypatch):
+    cache = classifier.CredentialCache(failure_limit=5)
+    user = classifier.User(
+        "kenji", "kenji@example.com", "Kenji T.", classifier.Role.BOTANIST
+    )
+    user.set_password("Hunter2")
+    checked = []
+    started = threading.Barrier(5, timeout=5)
+
+    def slow_valid_password(self, plain_text):
+        checked.append(plain_text)
+        started.wait()
+        return False
+
+    monkeypatch.setattr(classifier.User, "valid_password", slow_valid_password)
+
+    def guess(n):
+        try:
+            return cache.valid(user, "kenji", f"guess {n}", "10.0.0.1")
+        except classifier.NotAuthorized as error:
+            return error.status_code
+
+    with futures.ThreadPoolExecutor(40) as pool:
+        results = list(pool.map(guess, range(40)))
+    assert len(checked) == 5
+    assert results.count(429) == 35
+
+
+def test_credential_cache_unknown_users():
+    cache = classifier.CredentialCache(failure_limit=2, failure_size=8)
+    user = classifier.User(
+        "kenji", "kenji@example.com", "Kenji T.", classifier.Role.BOTANIST
+    )
+    user.password = werkzeug.security.generate_password_hash(
+        "Hunter2", "pbkdf2:sha256:1"
+    )
+    anonymous = classifier.User("", "", "", classifier.Role.UNDEFINED)
+    assert not cache.valid(user, "kenji", "guess 1", "10.0.0.1")
+    for n in range(100):
+        assert not cache.valid(anonymous, f"junk{n}", "guess", "10.0.0.1")
+    assert not cache.valid(user, "kenji", "guess 2", "10.0.0.1")
+    with raises(classifier.NotAuthorized):
+        cache.valid(user, "kenji", "Hunter2", "10.0.0.1")
+
+
+def test_credential_cache_lru():
+    cache = classifier.CredentialCache(size=2)
+    users = {}
+    for name in ("a", "b", "c"):
+        users[name] = classifier.User(name, "", "", classifier.Role.BOTANIST)
+        users[name].password = werkzeug.security.generate_password_hash(
+            "Hunter2", "pbkdf2:sha256:1"
+        )
+    assert cache.valid(users["a"], "a", "Hunter2", "")
+    assert cache.valid(users["b"], "b", "Hunter2", "")
+    assert cache.cached(users["a"], "a", "Hunter2")
+    assert cache.valid(users["c"], "c", "Hunter2", "")
+    assert cache.cached(users["a"], "a", "Hunter2")
+    assert not cache.cached(users["b"], "b", "Hunter2")
+
+
+def write_users(path, *users):
+    with path.open("w", newline="") as user_file:
+        writer = csv.DictWriter(user_file, classifier.User.headers)
+        writer.writeheader()
+        writer.writerows(u.asdict() for u in users)
+
+
+def test_reloading_users(tmp_path, monkeypatch):
+    noriko = classifier.User(
+        "noriko", "noriko@example.com", "Noriko K. L.", classifier.Role.BOTANIST
+    )
+    emma = classifier.User(
+        "emma", "emma@example.com", "Emma K.", classifier.Role.RESEARCHER
+    )
+    app = Flask("test")
+    app.config["USER_FILE"] = tmp_path / "users.csv"
+    app.config["USER_FILE_INTERVAL"] = 60.0
+    write_users(app.config["USER_FILE"], noriko)
+    users = classifier.ReloadingUsers()
+    users.init_app(app)
+    assert users.get_user("noriko") == noriko
+    assert users.get_user("emma").role == classifier.Role.UNDEFINED
+
+    write_users(tmp_path / "new.csv", noriko, emma)
+    (tmp_path / "new.csv").replace(app.config["USER_FILE"])
+    stats = []
+    stat = users.stat
+    monkeypatch.setattr(users, "stat", lambda: stats.append(1) or stat())
+    # Not checked again until the interval has passed.
+    assert users.get_user("emma").role == classifier.Role.UNDEFINED
+    assert stats == []
+
+    users.checked -= 60.0
+    users.get_user("emma")
+    with users.reloading:
+        assert users.get_user("emma") == emma
+    assert stats == [1]
+
+
+def test_sqlite_users(tmp_path):
+    app = Flask("test")
+    app.config["USER_DATABASE"] = tmp_path / "users.db"
+    noriko = classifier.User(
+        "noriko", "noriko@example.com", "Noriko K. L.", classifier.Role.BOTANIST
+    )
+    emma = classifier.User(
+        "emma", "emma@example.com", "Emma K.", classifier.Role.RESEARCHER
+    )
+    write_users(tmp_path / "users.csv", noriko, emma)
+    users = classifier.SQLiteUsers()
+    users.init_app(app)
+    assert users.import_csv(tmp_path / "users.csv") == 2
+    assert users.get_user("emma") == emma
+    with raises(ValueError):
+        users.add_user(emma)
+    assert list(users.values()) == [emma, noriko]
+    assert len(users) == 2
+    # Only init_app() creates the table; another thread only connects.
+    users.schema = "not SQL"
+    with futures.ThreadPoolExecutor(1) as pool:
+        assert pool.submit(users.get_user, "emma").result() == emma
+
+
+def test_classify_not_finite(app_client, authorization):
+    # Flask's JSON parser accepts these, though they aren't JSON numbers.
+    for value in ("NaN", "Infinity", "-Infinity", "1e400", "1" + "0" * 400):
+        result = app_client.post(
+            "classify",
+            data=(
+                '{"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4, '
+                f'"petal_width": {value}}}'
+            ),
+            content_type="application/json",
+            headers=authorization,
+        )
+        assert result.status_code == 400, value
+        assert result.json["message"] == "1 invalid sample"
@@ -10,8 +10,10 @@ import yaml
 from model import (
     CSVIrisReader, CSVIrisReader_2,
     JSONIrisReader, NDJSONIrisReader, ValidatingNDJSONIrisReader,
-    IRIS_SCHEMA,
-    YAMLIrisReader
+    ParallelCSVIrisReader, ParallelNDJSONIrisReader, TrainingData,
+    IRIS_SCHEMA, RowError, compile_schema,
+    YAMLIrisReader,
+    BinaryIrisReader, KnownSample, write_binary,
 )
 
 @fixture
@@ -38,6 +40,20 @@ def test_csv_iris_reader_2(sample_csv_file):
         {'sepal_length': '7.0', 'sepal_width': '3.2', 'petal_length': '4.7', 'petal_width': '1.4', 'species': 'Iris-versicolor'}
     ]
 
+def test_csv_iris_reader_columns(sample_csv_file):
+    rdr = CSVIrisReader(sample_csv_file)
+    columns = rdr.columns()
+    assert list(columns.data_iter()) == [
+        {'sepal_length': 5.0, 'sepal_width': 3.3, 'petal_length': 1.4, 'petal_width': 0.2, 'species': 'Iris-setosa'},
+        {'sepal_length': 7.0, 'sepal_width': 3.2, 'petal_length': 4.7, 'petal_width': 1.4, 'species': 'Iris-versicolor'}
+    ]
+
+def test_csv_iris_reader_columns_rejects(tmp_path):
+    bad_data = tmp_path/"bad.data"
+    bad_data.write_text("5.0,3.3,1.4,Iris-setosa\n7.0,3.2,4.7,1.4,0.1,Iris-versicolor\n")
+    with raises(ValueError):
+        CSVIrisReader(bad_data).columns()
+
 @fixture
 def sample_json_file(tmp_path):
     test_data = tmp_path/"iris.json"
@@ -103,6 +119,42 @@ def test_ndjson_iris_reader(sample_ndjson_file):
     ]
 
 
+@fixture
+def many_samples():
+    return [
+        {
+            "sepal_length": 5.0 + i / 100,
+            "sepal_width": 3.3,
+            "petal_length": 1.4,
+            "petal_width": 0.2,
+            "species": "Iris-setosa"
+        }
+        for i in range(100)
+    ]
+
+def test_parallel_ndjson_iris_reader(tmp_path, many_samples):
+    test_data = tmp_path/"iris.ndjson"
+    with test_data.open('w') as tmpfile:
+        for sample in many_samples:
+            print(json.dumps(sample), file=tmpfile)
+    ordered = ParallelNDJSONIrisReader(test_data, workers=2, chunk_size=256)
+    assert list(ordered.data_iter()) == list(NDJSONIrisReader(test_data).data_iter())
+    unordered = ParallelNDJSONIrisReader(test_data, workers=2, chunk_size=256, ordered=False)
+    data = list(unordered.data_iter())
+    assert sorted(data, key=lambda s: s["sepal_length"]) == many_samples
+
+def test_parallel_csv_iris_reader(tmp_path, many_samples):
+    test_data = tmp_path/"iris.data"
+    with test_data.open('w', newline="") as tmpfile:
+        writer = csv.DictWriter(tmpfile, list(many_samples[0].keys()))
+        writer.writerows(many_samples)
+    rdr = ParallelCSVIrisReader(test_data, workers=2, chunk_size=256)
+    assert list(rdr.data_iter()) == list(CSVIrisReader_2(test_data).data_iter())
+    td = TrainingData("parallel")
+    td.load(rdr.data_iter())
+    assert len(td.training) == 80 and len(td.testing) == 20
+
+
 def test_validating_ndjson_iris_reader(sample_ndjson_file):
     rdr = ValidatingNDJSONIrisReader(sample_ndjson_file, IRIS_SCHEMA)
     data = list(rdr.data_iter())
@@ -111,6 +163,60 @@ def test_validating_ndjson_iris_reader(sample_ndjson_file):
         {'sepal_length': 7.0, 'sepal_width': 3.2, 'petal_length': 4.7, 'petal_width': 1.4, 'species': 'Iris-versicolor'}
     ]
 
+def test_validating_ndjson_iris_reader_report(tmp_path):
+    test_data = tmp_path/"iris.ndjson"
+    rows = [
+        {"sepal_length": 5.0, "sepal_width": 3.3, "petal_length": 1.4, "petal_width": 0.2, "species": "Iris-setosa"},
+        {"sepal_length": 5.0, "sepal_width": 3.3, "petal_length": 1.4, "petal_width": "0.2", "species": "Iris-setosa"},
+        {"sepal_length": 7, "sepal_width": 3.2, "petal_length": 4.7, "petal_width": 1.4},
+        {"sepal_length": 7.0, "sepal_width": 3.2, "petal_length": 4.7, "species": "Iris"},
+    ]
+    with test_data.open('w') as tmpfile:
+        for sample in rows:
+            print(json.dumps(sample), file=tmpfile)
+    rdr = ValidatingNDJSONIrisReader(test_data, IRIS_SCHEMA, batch_size=3, limit=2)
+    assert list(rdr.data_iter()) == rows[:1] + rows[2:3]
+    assert (rdr.report.rows, rdr.report.invalid) == (4, 2)
+    # Row 4 has two errors, the report keeps the first one jsonschema finds.
+    assert rdr.report.errors[0] == RowError(2, "petal_width", "'0.2' is not of type 'number'")
+    assert [e.line for e in rdr.report.errors] == [2, 4]
+    assert rdr.report.truncated
+    assert rdr.report.dropped == 1
+    # Exactly limit errors: all of them are kept, so nothing was truncated.
+    exact = ValidatingNDJSONIrisReader(test_data, IRIS_SCHEMA, batch_size=3, limit=3)
+    list(exact.data_iter())
+    assert len(exact.report.errors) == 3
+    assert not exact.report.truncated
+    assert repr(exact.report) == "ValidationReport(rows=4, invalid=2, errors=3)"
+
+def test_validating_ndjson_iris_reader_fallback(sample_ndjson_file):
+    schema = dict(IRIS_SCHEMA, properties={"sepal_length": {"type": "number", "minimum": 6.0}})
+    with raises(ValueError):
+        compile_schema(schema)
+    rdr = ValidatingNDJSONIrisReader(sample_ndjson_file, schema)
+    assert [s["sepal_length"] for s in rdr.data_iter()] == [7.0]
+    assert rdr.report.errors == [RowError(1, "sepal_length", "5.0 is less than the minimum of 6.0")]
+
+def test_compile_schema_names():
+    schema = {"type": "object", "required": ["sepal-length"], "properties": {
+        "sepal-length": {"type": "number"},
+        "species') or True or ('": {"enum": ["Iris-setosa"]},
+    }}
+    invalid = compile_schema(schema)
+    assert invalid([{"sepal-length": 5.0}, {"sepal-length": "5.0"}, {}]) == [1, 2]
+    assert invalid([{"sepal-length": 5.0, "species') or True or ('": "Iris"}]) == [0]
+
+def test_compile_schema_unsupported():
+    for schema in (
+        {"properties": {"sepal_length": {"type": ["number", "null"]}}},
+        {"properties": {"species": {"enum": "Iris-setosa"}}},
+        {"properties": {"sepal_length": "number"}},
+        {"required": "sepal_length"},
+        {"type": ["object"]},
+    ):
+        with raises(ValueError):
+            compile_schema(schema)
+
 @fixture
 def sample_yaml_file(tmp_path):
     test_data = tmp_path/"iris.yaml"
@@ -141,3 +247,43 @@ def test_yaml_iris_reader(sample_yaml_file):
         {'sepal_length': 5.0, 'sepal_width': 3.3, 'petal_length': 1.4, 'petal_width': 0.2, 'species': 'Iris-setosa'},
         {'sepal_length': 7.0, 'sepal_width': 3.2, 'petal_length': 4.7, 'petal_width': 1.4, 'species': 'Iris-versicolor'}
     ]
+
+
+def test_binary_iris_reader(sample_csv_file, tmp_path):
+    target = tmp_path/"iris.bin"
+    assert write_binary(CSVIrisReader(sample_csv_file), target) == 2
+    with BinaryIrisReader(target) as rdr:
+        assert len(rdr) == 2
+        assert rdr.species == ['Iris-setosa', 'Iris-versicolor']
+        assert rdr[-1] == KnownSample(
+            species='Iris-versicolor', sepal_length=7.0, sepal_width=3.2, petal_length=4.7, petal_width=1.4
+        )
+        assert list(rdr.data_iter()) == [
+            {'sepal_length': 5.0, 'sepal_width': 3.3, 'petal_length': 1.4, 'petal_width': 0.2, 'species': 'Iris-setosa'},
+            {'sepal_length': 7.0, 'sepal_width': 3.2, 'petal_length': 4.7, 'petal_width': 1.4, 'species': 'Iris-versicolor'}
+        ]
+        with raises(IndexError):
+            rdr[2]
+
+def test_binary_iris_reader_float32(sample_yaml_file, tmp_path):
+    target = tmp_path/"iris.bin"
+    write_binary(YAMLIrisReader(sample_yaml_file), target, float_size=4)
+    with BinaryIrisReader(target) as rdr:
+        assert [s["sepal_length"] for s in rdr.data_iter()] == [5.0, 7.0]
+        assert rdr[0].petal_width == approx(0.2)
+    assert target.stat().st_size == 64 + 2 * 4 * 4 + 2 * 2 + 2 + 11 + 2 + 15
+
+def test_binary_iris_reader_rejects(sample_csv_file):
+    with raises(ValueError):
+        BinaryIrisReader(sample_csv_file)
+
+
+def test_binary_iris_reader_truncated(sample_csv_file, tmp_path):
+    target = tmp_path / "iris.bin"
+    write_binary(CSVIrisReader(sample_csv_file), target)
+    whole = target.read_bytes()
+    damaged = tmp_path / "damaged.bin"
+    for size in range(1, len(whole)):
+        damaged.write_bytes(whole[:size])
+        with raises(ValueError):
+            BinaryIrisReader(damaged)
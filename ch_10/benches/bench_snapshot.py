@@ -0,0 +1,54 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 10.
+
+Start-up time: building a hyperparameter's training data and index,
+compared with loading a snapshot of it.
+"""
+from __future__ import annotations
+from pathlib import Path
+import sys
+import tempfile
+import time
+from typing import Callable, TypeVar
+from model import *
+from spatial import KDTree, k_nn_kd, spatial_index
+import snapshot
+from bench_knn import a_lot_of_data
+
+T = TypeVar("T")
+
+
+def timed(label: str, action: Callable[[], T]) -> T:
+    start = time.perf_counter()
+    result = action()
+    end = time.perf_counter()
+    print(f"| {label:32s} | {(end-start)*1000:10.3f}ms |")
+    return result
+
+
+def main(n: int = 1_000_000) -> None:
+    unknown = UnknownSample(Sample(0.5, 0.5, 0.5, 0.5))
+    print("| step                             | time         |")
+    print("|----------------------------------|--------------|")
+    training, testing = timed(f"generate {n:,d} samples", lambda: a_lot_of_data(n))
+    timed("training_arrays()", lambda: training_arrays(training))
+    index = timed("spatial_index() KDTree", lambda: spatial_index(training, None))
+    h = Hyperparameter(5, euclidean, training, k_nn_kd)
+    timed("first classify()", lambda: h.classify(unknown))
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "knn.snapshot"
+        timed("snapshot.save()", lambda: snapshot.save(path, h, index=index))
+        print(f"| {'snapshot size':32s} | {path.stat().st_size:10,d}B |")
+        saved = timed("Snapshot() open", lambda: snapshot.Snapshot(path))
+        timed("Snapshot.arrays", lambda: saved.arrays)
+        timed("Snapshot.training_data", lambda: saved.training_data)
+        timed("Snapshot.index", lambda: saved.index)
+        restored = timed("Snapshot.hyperparameter()", saved.hyperparameter)
+        timed("first classify()", lambda: restored.classify(unknown))
+        assert restored.classify(unknown) == h.classify(unknown)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
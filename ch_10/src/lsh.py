@@ -0,0 +1,233 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 10. The Iterator Pattern
+
+Approximate k-NN with locality-sensitive hashing.
+An :class:`LSHIndex` hashes each training sample into several tables;
+an unknown is only compared with the samples that share a bucket with it
+in at least one table.
+"""
+from __future__ import annotations
+from typing import Optional
+import numpy as np
+from numpy.typing import NDArray
+from model import (
+    AnySample,
+    Classifier,
+    DistanceFunc,
+    NP_METRICS,
+    TrainingList,
+    euclidean,
+    k_nn_np,
+    manhattan,
+    np_mode,
+    training_arrays,
+)
+
+# Defaults for k_nn_lsh(). The width is in the units of the measurements.
+LSH_TABLES = 8
+LSH_HASHES = 4
+LSH_WIDTH = 1.0
+
+
+class LSHIndex:
+    """
+    Hash tables built from p-stable random projections.
+
+    Each hash is ``floor((a . v + b) / width)``, with ``a`` drawn from a p-stable
+    distribution and ``b`` uniform in ``[0, width)``.
+    For Euclidean distance, ``a`` is Gaussian (2-stable): a plain random projection.
+    For Manhattan distance, ``a`` is Cauchy (1-stable).
+    Either way, nearer samples are more likely to land in the same bucket.
+    Each table's key combines ``hashes`` of these;
+    more hashes per table make buckets smaller, more tables find more of the true neighbors.
+
+    >>> from model import KnownSample, Sample, TrainingKnownSample, UnknownSample
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(i, i + 1, i + 2, i + 3), species=str(i)))
+    ...     for i in range(10)
+    ... ]
+    >>> index = LSHIndex(data, euclidean, tables=8, hashes=2, width=4.0)
+    >>> sorted(index.nearest(3, UnknownSample(Sample(4.2, 5.2, 6.2, 7.2))).tolist())
+    [3, 4, 5]
+    """
+
+    PROJECTIONS = {euclidean: "normal", manhattan: "cauchy"}
+
+    def __init__(
+        self,
+        training_data: TrainingList,
+        dist: DistanceFunc,
+        tables: int = LSH_TABLES,
+        hashes: int = LSH_HASHES,
+        width: float = LSH_WIDTH,
+        seed: int = 42,
+    ) -> None:
+        if dist not in self.PROJECTIONS:
+            raise ValueError(f"no p-stable hash family for distance {dist!r}")
+        self.training_data = training_data
+        self.dist = dist
+        self.metric = NP_METRICS[dist]
+        self.tables = tables
+        self.hashes = hashes
+        self.width = width
+        self.arrays = training_arrays(training_data)
+        rng = np.random.default_rng(seed)
+        shape = (tables * hashes, self.arrays.features.shape[0])
+        if self.PROJECTIONS[dist] == "normal":
+            self.projections = rng.standard_normal(shape)
+        else:
+            self.projections = rng.standard_cauchy(shape)
+        self.offsets = rng.uniform(0, width, tables * hashes)
+        keys = self.keys(self.arrays.features)
+        self.buckets: list[dict[tuple[int, ...], NDArray[np.intp]]] = []
+        for t in range(tables):
+            members: dict[tuple[int, ...], list[int]] = {}
+            rows = keys[t * hashes : (t + 1) * hashes].tolist()
+            for i, key in enumerate(zip(*rows)):
+                members.setdefault(key, []).append(i)
+            self.buckets.append(
+                {key: np.array(m, dtype=np.intp) for key, m in members.items()}
+            )
+
+    def keys(self, features: NDArray[np.float64]) -> NDArray[np.int64]:
+        """One row of hash values for each projection, with a column for each sample."""
+        projected = self.projections @ features + self.offsets[:, np.newaxis]
+        return np.floor_divide(projected, self.width).astype(np.int64)
+
+    def candidates(self, unknown: AnySample) -> NDArray[np.intp]:
+        """Indices of the training samples sharing a bucket with the unknown, in order."""
+        query = np.array(unknown.sample, dtype=np.float64).reshape(-1, 1)
+        keys = self.keys(query).reshape(self.tables, self.hashes).tolist()
+        found = [
+            bucket
+            for buckets, key in zip(self.buckets, keys)
+            if (bucket := buckets.get(tuple(key))) is not None
+        ]
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        return np.unique(np.concatenate(found))
+
+    def nearest(self, k: int, unknown: AnySample) -> Optional[NDArray[np.intp]]:
+        """
+        Indices of the (approximately) _k_ nearest training samples, nearest first.
+        ``None`` if fewer than _k_ samples share a bucket with the unknown.
+        """
+        candidates = self.candidates(unknown)
+        if len(candidates) < k:
+            return None
+        query = np.array([unknown.sample], dtype=np.float64)
+        distances = self.metric(query, self.arrays.features[:, candidates], None)
+        distances = distances.reshape(-1)
+        if k < len(distances):
+            nearest = np.argpartition(distances, k - 1)[:k]
+        else:
+            nearest = np.arange(len(distances))
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        return candidates[nearest]
+
+
+_indexes: dict[
+    tuple[int, DistanceFunc, int, int, float], tuple[TrainingList, int, LSHIndex]
+] = {}
+INDEX_LIMIT = 8
+
+
+def lsh_index(
+    training_data: TrainingList,
+    dist: DistanceFunc,
+    tables: int = LSH_TABLES,
+    hashes: int = LSH_HASHES,
+    width: float = LSH_WIDTH,
+) -> LSHIndex:
+    """Build an index for a training list, distance, and hash settings once, and reuse it.
+
+    Like :func:`spatial.spatial_index`, the cache is keyed by the identity of the list,
+    and only the most recent :data:`INDEX_LIMIT` indexes are kept.
+    """
+    key = (id(training_data), dist, tables, hashes, width)
+    cached = _indexes.get(key)
+    if (
+        cached is None
+        or cached[0] is not training_data
+        or cached[1] != len(training_data)
+    ):
+        cached = remember_index(LSHIndex(training_data, dist, tables, hashes, width))
+    return cached[2]
+
+
+def remember_index(index: LSHIndex) -> tuple[TrainingList, int, LSHIndex]:
+    """Cache an index for :func:`lsh_index`; it may have been built elsewhere, like a snapshot."""
+    training_data = index.training_data
+    key = (id(training_data), index.dist, index.tables, index.hashes, index.width)
+    cached = (training_data, len(training_data), index)
+    _indexes[key] = cached
+    if len(_indexes) > INDEX_LIMIT:
+        del _indexes[next(iter(_indexes))]
+    return cached
+
+
+def k_nn_lsh(
+    k: int,
+    dist: DistanceFunc,
+    training_data: TrainingList,
+    unknown: AnySample,
+    tables: int = LSH_TABLES,
+    hashes: int = LSH_HASHES,
+    width: float = LSH_WIDTH,
+) -> str:
+    """
+    Use an :class:`LSHIndex`, built once for the training data, distance, and settings,
+    to locate the (approximately) _k_ nearest neighbors.
+    See :func:`lsh_classifier` for a :data:`model.Classifier` with other settings.
+
+    A distance without a p-stable hash family, or an unknown
+    with fewer than _k_ samples in its buckets, is handled exactly by :func:`model.k_nn_np`.
+
+    >>> from model import KnownSample, Sample, TrainingKnownSample, UnknownSample
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(2, 3, 4, 5), species="b")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(3, 4, 5, 6), species="c")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(4, 5, 6, 7), species="d")),
+    ... ]
+    >>> k_nn_lsh(1, euclidean, data, UnknownSample(Sample(1.1, 2.1, 3.1, 4.1)))
+    'a'
+    """
+    if dist not in LSHIndex.PROJECTIONS:
+        return k_nn_np(k, dist, training_data, unknown)
+    index = lsh_index(training_data, dist, tables, hashes, width)
+    nearest = index.nearest(k, unknown)
+    if nearest is None:
+        return k_nn_np(k, dist, training_data, unknown)
+    return np_mode(index.arrays, index.arrays.labels[nearest])
+
+
+def lsh_classifier(
+    tables: int = LSH_TABLES, hashes: int = LSH_HASHES, width: float = LSH_WIDTH
+) -> Classifier:
+    """
+    :func:`k_nn_lsh` with the given settings, as a :data:`model.Classifier`.
+
+    >>> from model import KnownSample, Sample, TrainingKnownSample, UnknownSample
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(2, 3, 4, 5), species="b")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(3, 4, 5, 6), species="c")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(4, 5, 6, 7), species="d")),
+    ... ]
+    >>> k_nn_lsh_wide = lsh_classifier(tables=4, hashes=1, width=8.0)
+    >>> k_nn_lsh_wide.__name__
+    'k_nn_lsh_4x1_w8.0'
+    >>> k_nn_lsh_wide(1, manhattan, data, UnknownSample(Sample(3.9, 4.9, 5.9, 6.9)))
+    'd'
+    """
+
+    def classifier(
+        k: int, dist: DistanceFunc, training_data: TrainingList, unknown: AnySample
+    ) -> str:
+        return k_nn_lsh(k, dist, training_data, unknown, tables, hashes, width)
+
+    classifier.__name__ = f"k_nn_lsh_{tables}x{hashes}_w{width}"
+    return classifier
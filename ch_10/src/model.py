@@ -7,7 +7,22 @@ from __future__ import annotations
 import bisect
 import heapq
 import collections
-from typing import cast, NamedTuple, Callable, Iterable, List, Union, Counter
+import operator
+import struct
+import zlib
+from typing import (
+    cast,
+    NamedTuple,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Union,
+    Counter,
+    Sequence,
+)
+import numpy as np
+from numpy.typing import NDArray
 
 
 class Sample(NamedTuple):
@@ -59,10 +74,108 @@ class Measured(NamedTuple):
     sample: TrainingKnownSample
 
 
-import itertools
-from typing import DefaultDict, Tuple, Iterator
+class Farthest:
+    """Reverses the ordering of :class:`Measured`, so a heapq has the farthest at the top."""
 
-ModuloDict = DefaultDict[int, List[KnownSample]]
+    __slots__ = ("measured",)
+
+    def __init__(self, measured: Measured) -> None:
+        self.measured = measured
+
+    def __lt__(self, other: Farthest) -> bool:
+        return other.measured < self.measured
+
+
+SAMPLE_STRUCT = struct.Struct("<4d")
+
+
+def stable_hash(s: KnownSample) -> int:
+    """
+    A CRC-32 of the measurements and the species.
+    Unlike :func:`hash`, it doesn't depend on PYTHONHASHSEED,
+    so it's the same in every run and every process.
+
+    >>> stable_hash(KnownSample(sample=Sample(2, 3, 5, 7), species="C"))
+    2274330009
+    """
+    return zlib.crc32(
+        s.species.encode("utf-8"), zlib.crc32(SAMPLE_STRUCT.pack(*s.sample))
+    )
+
+
+class Split(NamedTuple):
+    """A partition into training and testing, with a fingerprint to identify it."""
+
+    training: TrainingList
+    testing: TestingList
+    fingerprint: str
+
+
+def format_fingerprint(
+    training_count: int, training_sum: int, testing_count: int, testing_sum: int
+) -> str:
+    return (
+        f"{training_count}:{training_sum % 2**64:016x}"
+        f"/{testing_count}:{testing_sum % 2**64:016x}"
+    )
+
+
+def split_fingerprint(training: TrainingList, testing: TestingList) -> str:
+    """
+    Summarize a split: the size of each subset, and the sum of the :func:`stable_hash`
+    values of its samples. The order of the samples doesn't matter,
+    so workers reading the same data in any order can confirm they agree
+    by exchanging only this string.
+    """
+    return format_fingerprint(
+        len(training),
+        sum(stable_hash(t.sample) for t in training),
+        len(testing),
+        sum(stable_hash(t.sample) for t in testing),
+    )
+
+
+def partition_stable(
+    samples: Iterable[KnownSample],
+    training_rule: Callable[[int], bool],
+    rule_multiple: int = 60,
+) -> Split:
+    """
+    Assign each sample to a bucket, ``stable_hash(s) % rule_multiple``,
+    and the bucket number to training or testing with ``training_rule``.
+    This is a single pass over the samples: each one is routed as it arrives.
+    The fingerprint is the one :func:`split_fingerprint` computes, built up along the way.
+
+    >>> data = [
+    ...     KnownSample(sample=Sample(i, i + 1, i + 2, i + 3), species="abc"[i % 3])
+    ...     for i in range(1000)
+    ... ]
+    >>> split = partition_stable(iter(data), lambda i: i % 4 != 0)
+    >>> len(split.training), len(split.testing)
+    (740, 260)
+    >>> split.fingerprint
+    '740:00000168b06d4b14/260:0000008567848524'
+    >>> split.fingerprint == split_fingerprint(split.training, split.testing)
+    True
+    >>> partition_stable(reversed(data), lambda i: i % 4 != 0).fingerprint == split.fingerprint
+    True
+    """
+    training: TrainingList = []
+    testing: TestingList = []
+    training_sum = testing_sum = 0
+    for s in samples:
+        h = stable_hash(s)
+        if training_rule(h % rule_multiple):
+            training.append(TrainingKnownSample(s))
+            training_sum += h
+        else:
+            testing.append(TestingKnownSample(s))
+            testing_sum += h
+    return Split(
+        training,
+        testing,
+        format_fingerprint(len(training), training_sum, len(testing), testing_sum),
+    )
 
 
 def partition_2(
@@ -70,33 +183,18 @@ def partition_2(
 ) -> tuple[TrainingList, TestingList]:
     """Separate into non-equal buckets.
     Combine buckets into testing and training subsets.
-    Chain into lists.
 
-    Highly dependent on Hash Seed randomization; use PYTHONHASHSEED=0 in the environment.
+    The buckets come from :func:`stable_hash`, not :func:`hash`,
+    so the split is the same for any PYTHONHASHSEED, in any process.
+    See :func:`partition_stable` for the split's fingerprint.
     """
-    rule_multiple = 60
-    partitions: ModuloDict = collections.defaultdict(list)
-    for s in samples:
-        partitions[hash(s) % rule_multiple].append(s)
-
-    training_partitions: list[Iterator[TrainingKnownSample]] = []
-    testing_partitions: list[Iterator[TestingKnownSample]] = []
-    for i, p in enumerate(partitions.values()):
-        if training_rule(i):
-            training_partitions.append(TrainingKnownSample(s) for s in p)
-        else:
-            testing_partitions.append(TestingKnownSample(s) for s in p)
-
-    training = list(itertools.chain(*training_partitions))
-    testing = list(itertools.chain(*testing_partitions))
-    return training, testing
+    split = partition_stable(samples, training_rule)
+    return split.training, split.testing
 
 
 test_partition_2 = """
-With certain hash seeds and a very small pool of data,
-we *can* have collisions.
-To keep the dataset small and minimize collisions, 
-we use prime numbers < 250.
+The buckets are computed from the values, so a very small pool of data
+may not follow the rule closely. These four samples are in buckets 9, 24, 28, and 33.
 
 >>> data = [
 ...     KnownSample(sample=Sample(2, 3, 5, 7), species="C"),
@@ -108,9 +206,11 @@ we use prime numbers < 250.
 The 25%/75% rule.
 >>> train, test = partition_2(data, lambda i: i % 4 != 0)
 >>> len(train)
-3
+2
 >>> len(test)
-1
+2
+>>> [t.sample.species for t in test]
+['G', 'I']
 
 """
 
@@ -154,7 +254,7 @@ def k_nn_b(
 
     1. For each item:
 
-        1. Compute the distance.
+        1. Compute the distance, abandoning it when it passes the last of the _k_ nearest neighbors.
 
         2. If it's greater than the last of the _k_ nearest neighbors, discard it.
 
@@ -180,11 +280,12 @@ def k_nn_b(
     >>> k_nn_b(1, dist, data, UnknownSample(Sample(1.1, 2.1, 3.1, 4.1)))
     'a'
     """
+    bounded = bounded_distance(dist)
     k_nearest = [
         Measured(float("inf"), cast(TrainingKnownSample, None)) for _ in range(k)
     ]
     for t in training_data:
-        t_dist = dist(t, unknown)
+        t_dist = bounded(t, unknown, k_nearest[-1].distance)
         if t_dist > k_nearest[-1].distance:
             continue
         new = Measured(t_dist, t)
@@ -201,14 +302,14 @@ def k_nn_q(
     k: int, dist: DistanceFunc, training_data: TrainingList, unknown: AnySample
 ) -> str:
     """
-    Use heapq to maintain a list of the neighbors, in order, avoiding a sort
+    Use heapq to maintain a list of the _k_ nearest neighbors, avoiding a sort
     after all computations are completed.
 
     1. For each item:
 
-        1. Compute the distance.
+        1. Compute the distance, abandoning it when it passes the farthest of the _k_ nearest neighbors.
 
-        2. Push it to the heap queue, maintaining distance order.
+        2. If it's nearer, replace the farthest in the heap queue.
 
     2.  Find the frequencies of result values among the _k_ nearest neighbors.
 
@@ -224,8 +325,19 @@ def k_nn_q(
     >>> k_nn_q(1, dist, data, UnknownSample(Sample(1.1, 2.1, 3.1, 4.1)))
     'a'
     """
-    measured_iter = (Measured(dist(t, unknown), t) for t in training_data)
-    k_nearest = heapq.nsmallest(k, measured_iter)
+    bounded = bounded_distance(dist)
+    heap: list[Farthest] = []
+    for t in training_data:
+        if len(heap) < k:
+            heapq.heappush(
+                heap, Farthest(Measured(bounded(t, unknown, float("inf")), t))
+            )
+            continue
+        farthest = heap[0].measured
+        new = Measured(bounded(t, unknown, farthest.distance), t)
+        if new < farthest:
+            heapq.heapreplace(heap, Farthest(new))
+    k_nearest = sorted(f.measured for f in heap)
     k_frequencies: Counter[str] = collections.Counter(
         s.sample.sample.species for s in k_nearest
     )
@@ -233,7 +345,217 @@ def k_nn_q(
     return mode
 
 
+class TrainingArrays(NamedTuple):
+    """A training partition as contiguous arrays.
+
+    ``features`` has one row per feature, with a column for each training sample;
+    keeping each feature contiguous lets the distances accumulate one feature
+    at a time. ``labels`` has the index of each sample's species in the ``species`` tuple.
+    """
+
+    features: NDArray[np.float64]
+    labels: NDArray[np.intp]
+    species: tuple[str, ...]
+
+    @classmethod
+    def from_training(cls, training_data: TrainingList) -> TrainingArrays:
+        features = (
+            np.array([t.sample.sample for t in training_data], dtype=np.float64)
+            .reshape(-1, 4)
+            .T
+        )
+        names = sorted({t.sample.species for t in training_data})
+        code = {name: i for i, name in enumerate(names)}
+        labels = np.array(
+            [code[t.sample.species] for t in training_data], dtype=np.intp
+        )
+        return cls(np.ascontiguousarray(features), labels, tuple(names))
+
+
+_training_arrays: dict[int, tuple[TrainingList, int, TrainingArrays]] = {}
+TRAINING_ARRAYS_LIMIT = 8
+
+
+def training_arrays(training_data: TrainingList) -> TrainingArrays:
+    """Convert a training list to arrays once, and reuse the arrays.
+
+    The cache is keyed by the identity of the list; it holds a reference
+    to the list so the identity can't be reused. A change to the list's length
+    forces a rebuild. Replacing items in place is not detected.
+    Only the most recent :data:`TRAINING_ARRAYS_LIMIT` lists are kept.
+    """
+    key = id(training_data)
+    cached = _training_arrays.get(key)
+    if (
+        cached is None
+        or cached[0] is not training_data
+        or cached[1] != len(training_data)
+    ):
+        cached = remember_training_arrays(
+            training_data, TrainingArrays.from_training(training_data)
+        )
+    return cached[2]
+
+
+def remember_training_arrays(
+    training_data: TrainingList, arrays: TrainingArrays
+) -> tuple[TrainingList, int, TrainingArrays]:
+    """Cache arrays for :func:`training_arrays`; they may have been built elsewhere, like a snapshot."""
+    cached = (training_data, len(training_data), arrays)
+    _training_arrays[id(training_data)] = cached
+    if len(_training_arrays) > TRAINING_ARRAYS_LIMIT:
+        del _training_arrays[next(iter(_training_arrays))]
+    return cached
+
+
+def k_nn_np(
+    k: int, dist: DistanceFunc, training_data: TrainingList, unknown: AnySample
+) -> str:
+    """
+    Use NumPy to compute all of the distances in one vectorized operation.
+
+    1.  Convert the training data to a float array and an integer label array.
+        This is done once for a given training list.
+
+    2.  Compute all distances. The known distance functions are evaluated
+        as array operations; any other distance function is applied to each
+        training sample.
+
+    3.  Use ``argpartition()`` to locate the _k_ nearest neighbors without a full sort.
+
+    4.  Chose the mode among the _k_ nearest neighbors. Ties are resolved
+        in favor of the nearest, which matches ``Counter.most_common()``.
+
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(2, 3, 4, 5), species="b")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(3, 4, 5, 6), species="c")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(4, 5, 6, 7), species="d")),
+    ... ]
+    >>> dist = lambda ts1, u2: max(abs(ts1.sample.sample[i] - u2.sample[i]) for i in range(len(ts1)))
+    >>> k_nn_np(1, dist, data, UnknownSample(Sample(1.1, 2.1, 3.1, 4.1)))
+    'a'
+    >>> k_nn_np(3, manhattan, data, UnknownSample(Sample(3.9, 4.9, 5.9, 6.9)))
+    'd'
+    """
+    arrays = training_arrays(training_data)
+    distances = np_distances(dist, arrays, training_data, unknown)
+    if k < len(distances):
+        nearest = np.argpartition(distances, k - 1)[:k]
+    else:
+        nearest = np.arange(len(distances))
+    nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+    return np_mode(arrays, arrays.labels[nearest])
+
+
+def np_distances(
+    dist: DistanceFunc,
+    arrays: TrainingArrays,
+    training_data: TrainingList,
+    unknown: AnySample,
+) -> NDArray[np.float64]:
+    """Distances from one unknown to every training sample."""
+    metric = NP_METRICS.get(dist)
+    if metric is None:
+        return np.fromiter(
+            (dist(t, unknown) for t in training_data),
+            dtype=np.float64,
+            count=len(training_data),
+        )
+    query = np.array([unknown.sample], dtype=np.float64)
+    return metric(query, arrays.features, None).reshape(-1)
+
+
+def np_mode(arrays: TrainingArrays, nearest_labels: NDArray[np.intp]) -> str:
+    """The most common label, with ties resolved by the first occurrence."""
+    counts = np.bincount(nearest_labels, minlength=len(arrays.species))
+    candidates = nearest_labels[counts[nearest_labels] == counts.max()]
+    return arrays.species[int(candidates[0])]
+
+
+# Unknowns and training samples per tile of the distance block: 16 x 4096 floats is 512KiB.
+QUERY_TILE = 16
+TRAINING_TILE = 4096
+
+
+def np_k_nearest(
+    k: int,
+    metric: NPMetric,
+    features: NDArray[np.float64],
+    queries: NDArray[np.float64],
+) -> NDArray[np.intp]:
+    """The indices of the _k_ nearest training samples for each query row, nearest first.
+
+    The queries-by-training distance block is computed one tile of
+    :data:`TRAINING_TILE` samples at a time. The _k_ best of each tile are
+    merged with the running _k_ best, with one ``argpartition()`` for all of the queries.
+    """
+    k = min(k, features.shape[1])
+    best_d = np.full((len(queries), k), np.inf)
+    best_i = np.zeros((len(queries), k), dtype=np.intp)
+    scratch = np.empty((2, len(queries), TRAINING_TILE))
+    for t_start in range(0, features.shape[1], TRAINING_TILE):
+        tile_d = metric(
+            queries, features[:, t_start : t_start + TRAINING_TILE], scratch
+        )
+        tile_k = min(k, tile_d.shape[1])
+        tile_i = np.argpartition(tile_d, tile_k - 1, axis=1)[:, :tile_k]
+        cand_d = np.concatenate(
+            (best_d, np.take_along_axis(tile_d, tile_i, axis=1)), axis=1
+        )
+        cand_i = np.concatenate((best_i, tile_i + t_start), axis=1)
+        keep = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+        best_d = np.take_along_axis(cand_d, keep, axis=1)
+        best_i = np.take_along_axis(cand_i, keep, axis=1)
+    order = np.argsort(best_d, axis=1, kind="stable")
+    return np.take_along_axis(best_i, order, axis=1)
+
+
+def k_nn_np_many(
+    k: int,
+    dist: DistanceFunc,
+    training_data: TrainingList,
+    unknowns: Sequence[AnySample],
+) -> list[str]:
+    """
+    Classify a batch of unknowns with :func:`k_nn_np`.
+
+    The unknowns are processed in tiles of :data:`QUERY_TILE` rows,
+    so the selection of the _k_ nearest is shared by all the queries in a tile.
+    A distance function without an array implementation is handled one unknown at a time.
+
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(2, 3, 4, 5), species="b")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(3, 4, 5, 6), species="c")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(4, 5, 6, 7), species="d")),
+    ... ]
+    >>> unknowns = [UnknownSample(Sample(1.1, 2.1, 3.1, 4.1)), UnknownSample(Sample(3.9, 4.9, 5.9, 6.9))]
+    >>> k_nn_np_many(1, euclidean, data, unknowns)
+    ['a', 'd']
+    """
+    metric = NP_METRICS.get(dist)
+    if metric is None:
+        return [k_nn_np(k, dist, training_data, u) for u in unknowns]
+    arrays = training_arrays(training_data)
+    queries = np.array([u.sample for u in unknowns], dtype=np.float64).reshape(-1, 4)
+    results: list[str] = []
+    for q_start in range(0, len(queries), QUERY_TILE):
+        nearest = np_k_nearest(
+            k, metric, arrays.features, queries[q_start : q_start + QUERY_TILE]
+        )
+        results.extend(np_mode(arrays, arrays.labels[row]) for row in nearest)
+    return results
+
+
 Classifier = Callable[[int, DistanceFunc, TrainingList, AnySample], str]
+BatchClassifier = Callable[
+    [int, DistanceFunc, TrainingList, Sequence[AnySample]], list[str]
+]
+
+BATCH_CLASSIFIERS: dict[Classifier, BatchClassifier] = {
+    k_nn_np: k_nn_np_many,
+}
 
 
 class Hyperparameter(NamedTuple):
@@ -246,16 +568,22 @@ class Hyperparameter(NamedTuple):
         classifier = self.classifier
         return classifier(self.k, self.distance_function, self.training_data, unknown)
 
+    def classify_many(self, unknowns: Sequence[AnySample]) -> list[str]:
+        """Classify all of the unknowns.
+        A classifier in :data:`BATCH_CLASSIFIERS` handles them in one batch;
+        any other classifier is used one unknown at a time.
+        """
+        batch_classifier = BATCH_CLASSIFIERS.get(self.classifier)
+        if batch_classifier is None:
+            return [self.classify(u) for u in unknowns]
+        return batch_classifier(
+            self.k, self.distance_function, self.training_data, unknowns
+        )
+
     def test(self, testing: TestingList) -> int:
-        classifier = self.classifier
+        classifications = self.classify_many([t.sample for t in testing])
         test_results = (
-            ClassifiedKnownSample(
-                t.sample,
-                classifier(
-                    self.k, self.distance_function, self.training_data, t.sample
-                ),
-            )
-            for t in testing
+            ClassifiedKnownSample(t.sample, c) for t, c in zip(testing, classifications)
         )
         pass_fail = map(
             lambda t: (1 if t.sample.species == t.classification else 0), test_results
@@ -294,6 +622,144 @@ def chebyshev(s1: TrainingKnownSample, s2: AnySample) -> float:
     return minkowski(s1, s2, m=1, summarize=max)
 
 
+BoundedDistanceFunc = Callable[[TrainingKnownSample, AnySample, float], float]
+
+
+def bounded_minkowski(
+    s1: TrainingKnownSample,
+    s2: AnySample,
+    bound: float,
+    m: int,
+    combine: Callable[[float, float], float] = operator.add,
+) -> float:
+    """
+    A Minkowski distance that stops at the first feature where the partial result
+    passes ``bound``, returning infinity.
+    The partial result is compared with ``bound ** m``, avoiding the root.
+
+    >>> s1 = TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a"))
+    >>> s2 = UnknownSample(Sample(2, 4, 6, 8))
+    >>> bounded_minkowski(s1, s2, float("inf"), m=3) == minkowski(s1, s2, m=3)
+    True
+    >>> bounded_minkowski(s1, s2, 2.0, m=3)
+    inf
+    """
+    limit = bound**m
+    total = 0.0
+    for t, u in zip(s1.sample.sample, s2.sample):
+        total = combine(total, abs(t - u) ** m)
+        if total > limit:
+            return float("inf")
+    return float(total ** (1 / m))
+
+
+def bounded_manhattan(s1: TrainingKnownSample, s2: AnySample, bound: float) -> float:
+    t, u = s1.sample.sample, s2.sample
+    total = abs(t.sepal_length - u.sepal_length)
+    if total > bound:
+        return float("inf")
+    total += abs(t.sepal_width - u.sepal_width)
+    if total > bound:
+        return float("inf")
+    total += abs(t.petal_length - u.petal_length)
+    if total > bound:
+        return float("inf")
+    return total + abs(t.petal_width - u.petal_width)
+
+
+def bounded_euclidean(s1: TrainingKnownSample, s2: AnySample, bound: float) -> float:
+    t, u = s1.sample.sample, s2.sample
+    limit = bound * bound
+    total = (t.sepal_length - u.sepal_length) ** 2
+    if total > limit:
+        return float("inf")
+    total += (t.sepal_width - u.sepal_width) ** 2
+    if total > limit:
+        return float("inf")
+    total += (t.petal_length - u.petal_length) ** 2
+    if total > limit:
+        return float("inf")
+    return float((total + (t.petal_width - u.petal_width) ** 2) ** 0.5)
+
+
+def bounded_chebyshev(s1: TrainingKnownSample, s2: AnySample, bound: float) -> float:
+    t, u = s1.sample.sample, s2.sample
+    largest = abs(t.sepal_length - u.sepal_length)
+    if largest > bound:
+        return float("inf")
+    largest = max(largest, abs(t.sepal_width - u.sepal_width))
+    if largest > bound:
+        return float("inf")
+    largest = max(largest, abs(t.petal_length - u.petal_length))
+    if largest > bound:
+        return float("inf")
+    return max(largest, abs(t.petal_width - u.petal_width))
+
+
+BOUNDED_DISTANCES: dict[DistanceFunc, BoundedDistanceFunc] = {
+    manhattan: bounded_manhattan,
+    euclidean: bounded_euclidean,
+    chebyshev: bounded_chebyshev,
+}
+
+
+def bounded_distance(dist: DistanceFunc) -> BoundedDistanceFunc:
+    """
+    The early-abandoning version of a distance function.
+    The result is the same as ``dist()``, unless it's more than ``bound``;
+    then the result is infinity, often after looking at only one or two features.
+    A distance without a bounded version ignores the bound.
+
+    >>> s1 = TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a"))
+    >>> s2 = UnknownSample(Sample(2, 4, 6, 8))
+    >>> [bounded_distance(d)(s1, s2, 10.0) == d(s1, s2) for d in (manhattan, euclidean, chebyshev)]
+    [True, True, True]
+    >>> [bounded_distance(d)(s1, s2, 2.0) for d in (manhattan, euclidean, chebyshev)]
+    [inf, inf, inf]
+    >>> bounded_distance(lambda s1, s2: 42.0)(s1, s2, 2.0)
+    42.0
+    """
+    return BOUNDED_DISTANCES.get(dist, lambda s1, s2, bound: dist(s1, s2))
+
+
+NPMetric = Callable[
+    [NDArray[np.float64], NDArray[np.float64], Optional[NDArray[np.float64]]],
+    NDArray[np.float64],
+]
+
+
+def np_accumulate(
+    queries: NDArray[np.float64],
+    features: NDArray[np.float64],
+    term: np.ufunc,
+    combine: np.ufunc,
+    scratch: Optional[NDArray[np.float64]] = None,
+) -> NDArray[np.float64]:
+    """Queries-by-training array of ``combine(term(q_i - t_i))`` over the features.
+
+    The queries have one row per unknown, the features have one row per feature.
+    The optional ``scratch`` array has room for two queries-by-training blocks.
+    Reusing it avoids allocating (and page-faulting) fresh temporaries for each tile.
+    """
+    rows, columns = len(queries), features.shape[1]
+    if scratch is None:
+        scratch = np.empty((2, rows, columns))
+    total = scratch[0, :rows, :columns]
+    work = scratch[1, :rows, :columns]
+    term(np.subtract(queries[:, 0, np.newaxis], features[0], out=total), out=total)
+    for i in range(1, len(features)):
+        np.subtract(queries[:, i, np.newaxis], features[i], out=work)
+        combine(total, term(work, out=work), out=total)
+    return total
+
+
+NP_METRICS: dict[DistanceFunc, NPMetric] = {
+    manhattan: lambda q, f, w: np_accumulate(q, f, np.absolute, np.add, w),
+    euclidean: lambda q, f, w: np.sqrt(np_accumulate(q, f, np.square, np.add, w)),
+    chebyshev: lambda q, f, w: np_accumulate(q, f, np.absolute, np.maximum, w),
+}
+
+
 test_hyperparameter = """
 >>> data = [
 ...     KnownSample(sample=Sample(1, 2, 3, 4), species="a"),
@@ -311,6 +777,11 @@ test_hyperparameter = """
 ... ]
 >>> h.test(testing_data)/len(testing_data)
 0.5
+>>> h_np = Hyperparameter(1, manhattan, training_data, k_nn_np)
+>>> h_np.classify_many([t.sample for t in testing_data])
+['a', 'a']
+>>> h_np.test(testing_data)/len(testing_data)
+0.5
 """
 
 __test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
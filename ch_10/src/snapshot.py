@@ -0,0 +1,411 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 10. The Iterator Pattern
+
+Save a tuned :class:`model.Hyperparameter` to a file, and load it again without
+re-reading and re-partitioning the data, or rebuilding its arrays and index.
+
+The file has a fixed header, JSON metadata, the training partition as the
+arrays of a :class:`model.TrainingArrays`, and an optional pickled index.
+Loading reads only the header and the metadata; the arrays are memory-mapped,
+and the training list and the index are built when they're first needed.
+
+Only the classes of an index can be unpickled from a snapshot, but the
+file is still trusted: an index is used as it's found, without more checks.
+"""
+from __future__ import annotations
+from functools import cached_property
+import io
+import json
+import mmap
+from pathlib import Path
+import pickle
+import struct
+from typing import Any, Optional, Union, cast
+import zlib
+import numpy as np
+from model import (
+    Classifier,
+    DistanceFunc,
+    Hyperparameter,
+    KnownSample,
+    NP_METRICS,
+    Sample,
+    TrainingArrays,
+    TrainingKnownSample,
+    TrainingList,
+    chebyshev,
+    euclidean,
+    k_nn_1,
+    k_nn_b,
+    k_nn_np,
+    k_nn_q,
+    manhattan,
+    remember_training_arrays,
+    split_fingerprint,
+    training_arrays,
+)
+import lsh
+import spatial
+
+MAGIC = b"KNNS"
+VERSION = 1
+# Magic, version, rows, metadata size, metadata CRC-32, data CRC-32, index size.
+HEADER = struct.Struct("<4sHxxQIIIQ")
+ALIGNMENT = 64
+
+DISTANCES: dict[str, DistanceFunc] = {
+    f.__name__: f for f in (manhattan, euclidean, chebyshev)
+}
+CLASSIFIERS: dict[str, Classifier] = {
+    f.__name__: f
+    for f in (
+        k_nn_1,
+        k_nn_b,
+        k_nn_q,
+        k_nn_np,
+        spatial.k_nn_kd,
+        spatial.k_nn_ball,
+        lsh.k_nn_lsh,
+    )
+}
+
+METRIC_NAMES = {id(NP_METRICS[f]): name for name, f in DISTANCES.items()}
+
+# Everything a pickled index refers to. NumPy's array reconstructors are
+# found from an array, since the module they're in changes between releases.
+INDEX_GLOBALS = {
+    (g.__module__, g.__qualname__)
+    for g in (
+        spatial.KDTree,
+        spatial.KDSplit,
+        spatial.KDLeaf,
+        spatial.BallTree,
+        spatial.BallNode,
+        lsh.LSHIndex,
+        Sample,
+        *DISTANCES.values(),
+        np.dtype,
+        np.ndarray,
+        *(
+            cast(tuple[Any, ...], np.zeros(1).__reduce_ex__(protocol))[0]
+            for protocol in (2, pickle.HIGHEST_PROTOCOL)
+        ),
+    )
+}
+
+Index = Union[spatial.KDTree, spatial.BallTree, lsh.LSHIndex]
+
+
+def aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class IndexPickler(pickle.Pickler):
+    """
+    Pickle an index, without the training list and arrays it was built from.
+    The NumPy metrics, some of which are lambdas, are saved by the name of their distance.
+    """
+
+    def __init__(
+        self, file: io.BytesIO, training_data: TrainingList, arrays: TrainingArrays
+    ) -> None:
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.training_data = training_data
+        self.arrays = arrays
+
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        if obj is self.training_data:
+            return "training_data"
+        if obj is self.arrays:
+            return "arrays"
+        if id(obj) in METRIC_NAMES:
+            return f"metric:{METRIC_NAMES[id(obj)]}"
+        return None
+
+
+class IndexUnpickler(pickle.Unpickler):
+    """
+    Unpickle an index, connecting it to a snapshot's training list and arrays.
+    Only the classes and functions in :data:`INDEX_GLOBALS` can be loaded.
+
+    >>> IndexUnpickler(io.BytesIO(pickle.dumps(print)), None).load()
+    Traceback (most recent call last):
+    ...
+    _pickle.UnpicklingError: builtins.print isn't part of an index
+    """
+
+    def __init__(self, file: io.BytesIO, snapshot: Snapshot) -> None:
+        super().__init__(file)
+        self.snapshot = snapshot
+
+    def persistent_load(self, pid: Any) -> Any:
+        if pid == "training_data":
+            return self.snapshot.training_data
+        if pid == "arrays":
+            return self.snapshot.arrays
+        if pid.startswith("metric:"):
+            return NP_METRICS[DISTANCES[pid.removeprefix("metric:")]]
+        raise pickle.UnpicklingError(f"unknown persistent id {pid!r}")
+
+    def find_class(self, module: str, name: str) -> Any:
+        if (module, name) not in INDEX_GLOBALS:
+            raise pickle.UnpicklingError(f"{module}.{name} isn't part of an index")
+        return super().find_class(module, name)
+
+
+def save(
+    target: Path,
+    h: Hyperparameter,
+    fingerprint: Optional[str] = None,
+    index: Optional[Index] = None,
+) -> None:
+    """
+    Save the hyperparameter, its training data, and optionally an index built
+    from that training data. The ``fingerprint`` identifies the data the training
+    partition came from, like a :attr:`model.Split.fingerprint`;
+    the default is :func:`model.split_fingerprint` of the training data alone.
+    """
+    if h.distance_function.__name__ not in DISTANCES:
+        raise ValueError(f"can't save distance {h.distance_function!r}")
+    if h.classifier.__name__ not in CLASSIFIERS:
+        raise ValueError(f"can't save classifier {h.classifier!r}")
+    if index is not None and index.training_data is not h.training_data:
+        raise ValueError("the index wasn't built from the training data")
+    arrays = training_arrays(h.training_data)
+    index_bytes = b""
+    if index is not None:
+        buffer = io.BytesIO()
+        IndexPickler(buffer, h.training_data, arrays).dump(index)
+        index_bytes = buffer.getvalue()
+    metadata = json.dumps(
+        {
+            "k": h.k,
+            "distance": h.distance_function.__name__,
+            "classifier": h.classifier.__name__,
+            "fingerprint": fingerprint or split_fingerprint(h.training_data, []),
+            "species": arrays.species,
+            "index": type(index).__name__ if index else None,
+        }
+    ).encode("utf-8")
+    data = [
+        np.ascontiguousarray(arrays.features, dtype="<f8").tobytes(),
+        arrays.labels.astype("<i8").tobytes(),
+        index_bytes,
+    ]
+    data_crc = 0
+    for block in data:
+        data_crc = zlib.crc32(block, data_crc)
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        len(h.training_data),
+        len(metadata),
+        zlib.crc32(metadata),
+        data_crc,
+        len(index_bytes),
+    )
+    with target.open("wb") as output:
+        output.write(header)
+        output.write(metadata)
+        output.write(bytes(aligned(output.tell()) - output.tell()))
+        for block in data:
+            output.write(block)
+
+
+class Snapshot:
+    """
+    A saved hyperparameter. The header and metadata are checked when it's opened;
+    the arrays, training list, and index are loaded as they're used.
+    :meth:`verify` checks the rest of the file; it's done before the training list
+    is built, since that reads all of the arrays anyway.
+    Use it as a context manager, or :meth:`close` it, to release the file.
+
+    >>> from tempfile import TemporaryDirectory
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(i, i + 1, i + 2, i + 3), species="ab"[i % 2]))
+    ...     for i in range(10)
+    ... ]
+    >>> h = Hyperparameter(3, euclidean, data, spatial.k_nn_kd)
+    >>> with TemporaryDirectory() as directory:
+    ...     path = Path(directory) / "knn.snapshot"
+    ...     save(path, h, index=spatial.spatial_index(data, None))
+    ...     with Snapshot(path) as snapshot:
+    ...         print(snapshot.metadata["distance"], snapshot.metadata["index"], len(snapshot))
+    ...         restored = snapshot.hyperparameter()
+    ...         spatial.spatial_index(restored.training_data, None) is snapshot.index
+    ...     restored.classify(KnownSample(Sample(4.2, 5.2, 6.2, 7.2), "?"))
+    euclidean KDTree 10
+    True
+    'b'
+    >>> restored.training_data == data
+    True
+    """
+
+    def __init__(self, source: Path) -> None:
+        self.source = source
+        with source.open("rb") as source_file:
+            self.map = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.read_header()
+        except BaseException:
+            self.map.close()
+            raise
+
+    def read_header(self) -> None:
+        """Check the header and the metadata, and find the arrays and the index."""
+        source = self.source
+        if len(self.map) < HEADER.size:
+            raise ValueError(f"{source} is too short to be a snapshot")
+        (
+            magic,
+            version,
+            self.rows,
+            metadata_size,
+            metadata_crc,
+            self.data_crc,
+            self.index_size,
+        ) = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{source} isn't a version {VERSION} snapshot")
+        metadata = self.map[HEADER.size : HEADER.size + metadata_size]
+        if zlib.crc32(metadata) != metadata_crc:
+            raise ValueError(f"{source} metadata checksum doesn't match")
+        self.metadata: dict[str, Any] = json.loads(metadata)
+        self.data_offset = aligned(HEADER.size + metadata_size)
+        self.labels_offset = self.data_offset + 4 * 8 * self.rows
+        self.index_offset = self.labels_offset + 8 * self.rows
+        if len(self.map) != self.index_offset + self.index_size:
+            raise ValueError(f"{source} is truncated")
+        self.verified = False
+
+    def __len__(self) -> int:
+        return int(self.rows)
+
+    def __enter__(self) -> Snapshot:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Release the file. The arrays, and the training list and index built on them,
+        are views of the mapped file; if they're still in use, it's unmapped
+        when the last of them is freed. Don't use the snapshot after closing it.
+
+        >>> from tempfile import TemporaryDirectory
+        >>> data = [
+        ...     TrainingKnownSample(KnownSample(sample=Sample(i, i + 1, i + 2, i + 3), species="ab"[i % 2]))
+        ...     for i in range(10)
+        ... ]
+        >>> with TemporaryDirectory() as directory:
+        ...     path = Path(directory) / "knn.snapshot"
+        ...     save(path, Hyperparameter(1, manhattan, data, k_nn_1))
+        ...     with Snapshot(path) as snapshot:
+        ...         arrays = snapshot.arrays
+        ...     with Snapshot(path) as unused:
+        ...         unused.verify()
+        >>> float(arrays.features.sum())
+        240.0
+        >>> len(unused.map)
+        Traceback (most recent call last):
+        ...
+        ValueError: mmap closed or invalid
+        """
+        for name in ("arrays", "training_data", "index"):
+            self.__dict__.pop(name, None)
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # Arrays still refer to the map; it's closed when they're freed.
+
+    def verify(self) -> None:
+        """
+        Check the arrays and the index against the checksum.
+
+        >>> from tempfile import TemporaryDirectory
+        >>> data = [
+        ...     TrainingKnownSample(KnownSample(sample=Sample(i, i + 1, i + 2, i + 3), species="ab"[i % 2]))
+        ...     for i in range(10)
+        ... ]
+        >>> h = Hyperparameter(1, manhattan, data, lsh.k_nn_lsh)
+        >>> with TemporaryDirectory() as directory:
+        ...     path = Path(directory) / "knn.snapshot"
+        ...     save(path, h, "10:0/0:0", index=lsh.lsh_index(data, manhattan))
+        ...     lsh_index = Snapshot(path).index
+        ...     with path.open("r+b") as damaged:
+        ...         _ = damaged.seek(-1, 2)
+        ...         _ = damaged.write(b"?")
+        ...     Snapshot(path).verify()
+        Traceback (most recent call last):
+        ...
+        ValueError: ... data checksum doesn't match
+        >>> lsh_index.arrays is training_arrays(lsh_index.training_data)
+        True
+        """
+        if not self.verified:
+            with memoryview(self.map) as whole:
+                if zlib.crc32(whole[self.data_offset :]) != self.data_crc:
+                    raise ValueError(f"{self.source} data checksum doesn't match")
+            self.verified = True
+
+    @cached_property
+    def arrays(self) -> TrainingArrays:
+        """The features and labels, mapped from the file without copying."""
+        features = np.frombuffer(
+            self.map, dtype="<f8", count=4 * self.rows, offset=self.data_offset
+        ).reshape(4, self.rows)
+        labels = np.frombuffer(
+            self.map, dtype="<i8", count=self.rows, offset=self.labels_offset
+        ).astype(np.intp, copy=False)
+        return TrainingArrays(features, labels, tuple(self.metadata["species"]))
+
+    @cached_property
+    def training_data(self) -> TrainingList:
+        """The training list; its arrays are remembered for :func:`model.training_arrays`."""
+        self.verify()
+        arrays = self.arrays
+        species = arrays.species
+        training_data = [
+            TrainingKnownSample(KnownSample(Sample(*row), species[label]))
+            for row, label in zip(arrays.features.T.tolist(), arrays.labels.tolist())
+        ]
+        remember_training_arrays(training_data, arrays)
+        return training_data
+
+    def load_index(self) -> Optional[Index]:
+        """Unpickle the saved index, if it hasn't been, so it's found by the classifier."""
+        return self.index
+
+    @cached_property
+    def index(self) -> Optional[Index]:
+        """The saved index, if any; it's remembered by the module that builds it."""
+        if not self.index_size:
+            return None
+        self.verify()
+        data = self.map[self.index_offset : self.index_offset + self.index_size]
+        index = IndexUnpickler(io.BytesIO(data), self).load()
+        if isinstance(index, lsh.LSHIndex):
+            lsh.remember_index(index)
+        else:
+            spatial.remember_index(index)
+        return cast(Index, index)
+
+    def hyperparameter(self) -> Hyperparameter:
+        """Rebuild the :class:`model.Hyperparameter`, with the training list and index."""
+        h = Hyperparameter(
+            self.metadata["k"],
+            DISTANCES[self.metadata["distance"]],
+            self.training_data,
+            CLASSIFIERS[self.metadata["classifier"]],
+        )
+        self.load_index()
+        return h
+
+
+def load(source: Path) -> Hyperparameter:
+    """Open a snapshot, and rebuild its :class:`model.Hyperparameter`."""
+    with Snapshot(source) as snapshot:
+        return snapshot.hyperparameter()
@@ -0,0 +1,80 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 10. The iterator pattern
+"""
+
+import random
+from pytest import *
+from model import (
+    KnownSample,
+    Sample,
+    TrainingKnownSample,
+    UnknownSample,
+    chebyshev,
+    euclidean,
+    k_nn_1,
+    manhattan,
+    minkowski,
+)
+import spatial
+
+
+def squared_euclidean(s1, s2):
+    """Not a metric: it breaks the triangle inequality."""
+    return euclidean(s1, s2) ** 2
+
+
+def minkowski_3(s1, s2):
+    return minkowski(s1, s2, m=3)
+
+
+DISTANCES = [euclidean, manhattan, chebyshev, squared_euclidean, minkowski_3]
+
+
+@fixture(scope="module")
+def training_data():
+    random.seed(42)
+    return [
+        TrainingKnownSample(
+            KnownSample(
+                Sample(*(random.uniform(0, 2) for _ in range(4))),
+                random.choice(["a", "b", "c"]),
+            )
+        )
+        for _ in range(500)
+    ]
+
+
+@fixture(scope="module")
+def unknowns():
+    random.seed(43)
+    return [
+        UnknownSample(Sample(*(random.uniform(0, 2) for _ in range(4))))
+        for _ in range(100)
+    ]
+
+
+def exact(k, dist, training_data, unknown):
+    return sorted(dist(t, unknown) for t in training_data)[:k]
+
+
+@mark.parametrize("dist", DISTANCES, ids=lambda d: d.__name__)
+def test_trees_match_linear_scan(training_data, unknowns, dist):
+    kd_tree = spatial.KDTree(training_data, leaf_size=8)
+    ball_tree = spatial.BallTree(training_data, dist, leaf_size=8)
+    for unknown in unknowns:
+        expected = k_nn_1(5, dist, training_data, unknown)
+        assert spatial.k_nn_kd(5, dist, training_data, unknown) == expected
+        assert spatial.k_nn_ball(5, dist, training_data, unknown) == expected
+        if dist in spatial.KDTree.DISTANCES:
+            found = [m.distance for m in kd_tree.nearest(5, dist, unknown)]
+            assert found == exact(5, dist, training_data, unknown)
+        if spatial.BallTree.metric(dist):
+            found = [m.distance for m in ball_tree.nearest(5, unknown)]
+            assert found == exact(5, dist, training_data, unknown)
+
+
+def test_ball_tree_metrics():
+    assert spatial.BallTree.metric(euclidean)
+    assert not spatial.BallTree.metric(squared_euclidean)
@@ -8,7 +8,9 @@ import bisect
 import csv
 import heapq
 from collections import Counter
-from typing import cast, NamedTuple, Callable, Iterable, List, Union
+from typing import cast, NamedTuple, Callable, Iterable, List, Optional, Union, Sequence
+import numpy as np
+from numpy.typing import NDArray
 
 
 class Sample(NamedTuple):
@@ -60,6 +62,18 @@ class Measured(NamedTuple):
     sample: TrainingKnownSample
 
 
+class Farthest:
+    """Reverses the ordering of :class:`Measured`, so a heapq has the farthest at the top."""
+
+    __slots__ = ("measured",)
+
+    def __init__(self, measured: Measured) -> None:
+        self.measured = measured
+
+    def __lt__(self, other: Farthest) -> bool:
+        return other.measured < self.measured
+
+
 import itertools
 import collections
 from typing import Tuple, Iterator, DefaultDict
@@ -153,7 +167,7 @@ def k_nn_b(
 
     1. For each item:
 
-        1. Compute the distance.
+        1. Compute the distance, abandoning it when it passes the last of the _k_ nearest neighbors.
 
         2. If it's greater than the last of the _k_ nearest neighbors, discard it.
 
@@ -179,11 +193,12 @@ def k_nn_b(
     >>> k_nn_b(1, dist, data, UnknownSample(Sample(1.1, 2.1, 3.1, 4.1)))
     'a'
     """
+    bounded = bounded_distance(dist)
     k_nearest = [
         Measured(float("inf"), cast(TrainingKnownSample, None)) for _ in range(k)
     ]
     for t in training_data:
-        t_dist = dist(t, unknown)
+        t_dist = bounded(t, unknown, k_nearest[-1].distance)
         if t_dist > k_nearest[-1].distance:
             continue
         new = Measured(t_dist, t)
@@ -198,14 +213,14 @@ def k_nn_q(
     k: int, dist: DistanceFunc, training_data: TrainingList, unknown: AnySample
 ) -> str:
     """
-    Use heapq to maintain a list of the neighbors, in order, avoiding a sort
+    Use heapq to maintain a list of the _k_ nearest neighbors, avoiding a sort
     after all computations are completed.
 
     1. For each item:
 
-        1. Compute the distance.
+        1. Compute the distance, abandoning it when it passes the farthest of the _k_ nearest neighbors.
 
-        2. Push it to the heap queue, maintaining distance order.
+        2. If it's nearer, replace the farthest in the heap queue.
 
     2.  Find the frequencies of result values among the _k_ nearest neighbors.
 
@@ -221,14 +236,229 @@ def k_nn_q(
     >>> k_nn_q(1, dist, data, UnknownSample(Sample(1.1, 2.1, 3.1, 4.1)))
     'a'
     """
-    measured_iter = (Measured(dist(t, unknown), t) for t in training_data)
-    k_nearest = heapq.nsmallest(k, measured_iter)
+    bounded = bounded_distance(dist)
+    heap: list[Farthest] = []
+    for t in training_data:
+        if len(heap) < k:
+            heapq.heappush(
+                heap, Farthest(Measured(bounded(t, unknown, float("inf")), t))
+            )
+            continue
+        farthest = heap[0].measured
+        new = Measured(bounded(t, unknown, farthest.distance), t)
+        if new < farthest:
+            heapq.heapreplace(heap, Farthest(new))
+    k_nearest = sorted(f.measured for f in heap)
     k_frequencies: Counter[str] = Counter(s.sample.sample.species for s in k_nearest)
     mode, fq = k_frequencies.most_common(1)[0]
     return mode
 
 
+class TrainingArrays(NamedTuple):
+    """A training partition as contiguous arrays.
+
+    ``features`` has one row per feature, with a column for each training sample;
+    keeping each feature contiguous lets the distances accumulate one feature
+    at a time. ``labels`` has the index of each sample's species in the ``species`` tuple.
+    """
+
+    features: NDArray[np.float64]
+    labels: NDArray[np.intp]
+    species: tuple[str, ...]
+
+    @classmethod
+    def from_training(cls, training_data: TrainingList) -> TrainingArrays:
+        features = (
+            np.array([t.sample.sample for t in training_data], dtype=np.float64)
+            .reshape(-1, 4)
+            .T
+        )
+        names = sorted({t.sample.species for t in training_data})
+        code = {name: i for i, name in enumerate(names)}
+        labels = np.array(
+            [code[t.sample.species] for t in training_data], dtype=np.intp
+        )
+        return cls(np.ascontiguousarray(features), labels, tuple(names))
+
+
+_training_arrays: dict[int, tuple[TrainingList, int, TrainingArrays]] = {}
+TRAINING_ARRAYS_LIMIT = 8
+
+
+def training_arrays(training_data: TrainingList) -> TrainingArrays:
+    """Convert a training list to arrays once, and reuse the arrays.
+
+    The cache is keyed by the identity of the list; it holds a reference
+    to the list so the identity can't be reused. A change to the list's length
+    forces a rebuild. Replacing items in place is not detected.
+    Only the most recent :data:`TRAINING_ARRAYS_LIMIT` lists are kept.
+    """
+    key = id(training_data)
+    cached = _training_arrays.get(key)
+    if (
+        cached is None
+        or cached[0] is not training_data
+        or cached[1] != len(training_data)
+    ):
+        cached = (
+            training_data,
+            len(training_data),
+            TrainingArrays.from_training(training_data),
+        )
+        _training_arrays[key] = cached
+        if len(_training_arrays) > TRAINING_ARRAYS_LIMIT:
+            del _training_arrays[next(iter(_training_arrays))]
+    return cached[2]
+
+
+def k_nn_np(
+    k: int, dist: DistanceFunc, training_data: TrainingList, unknown: AnySample
+) -> str:
+    """
+    Use NumPy to compute all of the distances in one vectorized operation.
+
+    1.  Convert the training data to a float array and an integer label array.
+        This is done once for a given training list.
+
+    2.  Compute all distances. The known distance functions are evaluated
+        as array operations; any other distance function is applied to each
+        training sample.
+
+    3.  Use ``argpartition()`` to locate the _k_ nearest neighbors without a full sort.
+
+    4.  Chose the mode among the _k_ nearest neighbors. Ties are resolved
+        in favor of the nearest, which matches ``Counter.most_common()``.
+
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(2, 3, 4, 5), species="b")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(3, 4, 5, 6), species="c")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(4, 5, 6, 7), species="d")),
+    ... ]
+    >>> dist = lambda ts1, u2: max(abs(ts1.sample.sample[i] - u2.sample[i]) for i in range(len(ts1)))
+    >>> k_nn_np(1, dist, data, UnknownSample(Sample(1.1, 2.1, 3.1, 4.1)))
+    'a'
+    >>> k_nn_np(3, Manhattan().distance, data, UnknownSample(Sample(3.9, 4.9, 5.9, 6.9)))
+    'd'
+    """
+    arrays = training_arrays(training_data)
+    distances = np_distances(dist, arrays, training_data, unknown)
+    if k < len(distances):
+        nearest = np.argpartition(distances, k - 1)[:k]
+    else:
+        nearest = np.arange(len(distances))
+    nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+    return np_mode(arrays, arrays.labels[nearest])
+
+
+def np_distances(
+    dist: DistanceFunc,
+    arrays: TrainingArrays,
+    training_data: TrainingList,
+    unknown: AnySample,
+) -> NDArray[np.float64]:
+    """Distances from one unknown to every training sample."""
+    metric = np_metric(dist)
+    if metric is None:
+        return np.fromiter(
+            (dist(t, unknown) for t in training_data),
+            dtype=np.float64,
+            count=len(training_data),
+        )
+    query = np.array([unknown.sample], dtype=np.float64)
+    return metric(query, arrays.features, None).reshape(-1)
+
+
+def np_mode(arrays: TrainingArrays, nearest_labels: NDArray[np.intp]) -> str:
+    """The most common label, with ties resolved by the first occurrence."""
+    counts = np.bincount(nearest_labels, minlength=len(arrays.species))
+    candidates = nearest_labels[counts[nearest_labels] == counts.max()]
+    return arrays.species[int(candidates[0])]
+
+
+# Unknowns and training samples per tile of the distance block: 16 x 4096 floats is 512KiB.
+QUERY_TILE = 16
+TRAINING_TILE = 4096
+
+
+def np_k_nearest(
+    k: int,
+    metric: NPMetric,
+    features: NDArray[np.float64],
+    queries: NDArray[np.float64],
+) -> NDArray[np.intp]:
+    """The indices of the _k_ nearest training samples for each query row, nearest first.
+
+    The queries-by-training distance block is computed one tile of
+    :data:`TRAINING_TILE` samples at a time. The _k_ best of each tile are
+    merged with the running _k_ best, with one ``argpartition()`` for all of the queries.
+    """
+    k = min(k, features.shape[1])
+    best_d = np.full((len(queries), k), np.inf)
+    best_i = np.zeros((len(queries), k), dtype=np.intp)
+    scratch = np.empty((2, len(queries), TRAINING_TILE))
+    for t_start in range(0, features.shape[1], TRAINING_TILE):
+        tile_d = metric(
+            queries, features[:, t_start : t_start + TRAINING_TILE], scratch
+        )
+        tile_k = min(k, tile_d.shape[1])
+        tile_i = np.argpartition(tile_d, tile_k - 1, axis=1)[:, :tile_k]
+        cand_d = np.concatenate(
+            (best_d, np.take_along_axis(tile_d, tile_i, axis=1)), axis=1
+        )
+        cand_i = np.concatenate((best_i, tile_i + t_start), axis=1)
+        keep = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+        best_d = np.take_along_axis(cand_d, keep, axis=1)
+        best_i = np.take_along_axis(cand_i, keep, axis=1)
+    order = np.argsort(best_d, axis=1, kind="stable")
+    return np.take_along_axis(best_i, order, axis=1)
+
+
+def k_nn_np_many(
+    k: int,
+    dist: DistanceFunc,
+    training_data: TrainingList,
+    unknowns: Sequence[AnySample],
+) -> list[str]:
+    """
+    Classify a batch of unknowns with :func:`k_nn_np`.
+
+    The unknowns are processed in tiles of :data:`QUERY_TILE` rows,
+    so the selection of the _k_ nearest is shared by all the queries in a tile.
+    A distance function without an array implementation is handled one unknown at a time.
+
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(2, 3, 4, 5), species="b")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(3, 4, 5, 6), species="c")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(4, 5, 6, 7), species="d")),
+    ... ]
+    >>> unknowns = [UnknownSample(Sample(1.1, 2.1, 3.1, 4.1)), UnknownSample(Sample(3.9, 4.9, 5.9, 6.9))]
+    >>> k_nn_np_many(1, Euclidean().distance, data, unknowns)
+    ['a', 'd']
+    """
+    metric = np_metric(dist)
+    if metric is None:
+        return [k_nn_np(k, dist, training_data, u) for u in unknowns]
+    arrays = training_arrays(training_data)
+    queries = np.array([u.sample for u in unknowns], dtype=np.float64).reshape(-1, 4)
+    results: list[str] = []
+    for q_start in range(0, len(queries), QUERY_TILE):
+        nearest = np_k_nearest(
+            k, metric, arrays.features, queries[q_start : q_start + QUERY_TILE]
+        )
+        results.extend(np_mode(arrays, arrays.labels[row]) for row in nearest)
+    return results
+
+
 Classifier = Callable[[int, DistanceFunc, TrainingList, AnySample], str]
+BatchClassifier = Callable[
+    [int, DistanceFunc, TrainingList, Sequence[AnySample]], list[str]
+]
+
+BATCH_CLASSIFIERS: dict[Classifier, BatchClassifier] = {
+    k_nn_np: k_nn_np_many,
+}
 
 
 from typing import Protocol
@@ -242,6 +472,14 @@ class Distance(Protocol):
         """Matches the DistanceFunc protocol"""
         ...
 
+    def bounded(self, s1: TrainingKnownSample, s2: AnySample, bound: float) -> float:
+        """
+        The same as :meth:`distance`, unless the distance is more than ``bound``;
+        then the result is infinity. A subclass can stop computing as soon as
+        the partial result passes the bound.
+        """
+        return self.distance(s1, s2)
+
 
 class Euclidean(Distance):
     def distance(self, s1: TrainingKnownSample, s2: AnySample) -> float:
@@ -252,6 +490,25 @@ class Euclidean(Distance):
             (s1.sample.sample.petal_width - s2.sample.petal_width) ** 2,
         )
 
+    def bounded(self, s1: TrainingKnownSample, s2: AnySample, bound: float) -> float:
+        # distance() applies hypot() to the squared differences,
+        # so the sum of their squares is compared with the square of the bound.
+        t, u = s1.sample.sample, s2.sample
+        limit = bound * bound
+        sl = (t.sepal_length - u.sepal_length) ** 2
+        total = sl * sl
+        if total > limit:
+            return float("inf")
+        sw = (t.sepal_width - u.sepal_width) ** 2
+        total += sw * sw
+        if total > limit:
+            return float("inf")
+        pl = (t.petal_length - u.petal_length) ** 2
+        total += pl * pl
+        if total > limit:
+            return float("inf")
+        return hypot(sl, sw, pl, (t.petal_width - u.petal_width) ** 2)
+
 
 class Manhattan(Distance):
     def distance(self, s1: TrainingKnownSample, s2: AnySample) -> float:
@@ -264,6 +521,19 @@ class Manhattan(Distance):
             ]
         )
 
+    def bounded(self, s1: TrainingKnownSample, s2: AnySample, bound: float) -> float:
+        t, u = s1.sample.sample, s2.sample
+        total = abs(t.sepal_length - u.sepal_length)
+        if total > bound:
+            return float("inf")
+        total += abs(t.sepal_width - u.sepal_width)
+        if total > bound:
+            return float("inf")
+        total += abs(t.petal_length - u.petal_length)
+        if total > bound:
+            return float("inf")
+        return total + abs(t.petal_width - u.petal_width)
+
 
 class Chebyshev(Distance):
     def distance(self, s1: TrainingKnownSample, s2: AnySample) -> float:
@@ -276,6 +546,132 @@ class Chebyshev(Distance):
             ]
         )
 
+    def bounded(self, s1: TrainingKnownSample, s2: AnySample, bound: float) -> float:
+        t, u = s1.sample.sample, s2.sample
+        largest = abs(t.sepal_length - u.sepal_length)
+        if largest > bound:
+            return float("inf")
+        largest = max(largest, abs(t.sepal_width - u.sepal_width))
+        if largest > bound:
+            return float("inf")
+        largest = max(largest, abs(t.petal_length - u.petal_length))
+        if largest > bound:
+            return float("inf")
+        return max(largest, abs(t.petal_width - u.petal_width))
+
+
+class Minkowski(Distance):
+    """
+    The general case: the ``m``-th root of the sum of ``m``-th powers of the differences.
+    ``Minkowski(1)`` is the same as :class:`Manhattan`.
+
+    >>> s1 = TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a"))
+    >>> s2 = UnknownSample(Sample(2, 4, 6, 8))
+    >>> Minkowski(1).distance(s1, s2) == Manhattan().distance(s1, s2)
+    True
+    >>> Minkowski(3).bounded(s1, s2, float("inf")) == Minkowski(3).distance(s1, s2)
+    True
+    >>> Minkowski(3).bounded(s1, s2, 2.0)
+    inf
+    """
+
+    def __init__(self, m: int) -> None:
+        self.m = m
+
+    def distance(self, s1: TrainingKnownSample, s2: AnySample) -> float:
+        return float(
+            sum(abs(t - u) ** self.m for t, u in zip(s1.sample.sample, s2.sample))
+            ** (1 / self.m)
+        )
+
+    def bounded(self, s1: TrainingKnownSample, s2: AnySample, bound: float) -> float:
+        # The partial sum of powers is compared with the bound's power, avoiding the root.
+        limit = bound**self.m
+        total = 0.0
+        for t, u in zip(s1.sample.sample, s2.sample):
+            total += abs(t - u) ** self.m
+            if total > limit:
+                return float("inf")
+        return float(total ** (1 / self.m))
+
+
+BoundedDistanceFunc = Callable[[TrainingKnownSample, AnySample, float], float]
+
+
+def bounded_distance(dist: DistanceFunc) -> BoundedDistanceFunc:
+    """
+    The early-abandoning version of a :class:`Distance` instance's ``distance()`` method.
+    The result is the same, unless it's more than ``bound``;
+    then the result is infinity, often after looking at only one or two features.
+    Any other distance function ignores the bound.
+
+    >>> s1 = TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a"))
+    >>> s2 = UnknownSample(Sample(2, 4, 6, 8))
+    >>> distances = [Manhattan(), Euclidean(), Chebyshev()]
+    >>> [bounded_distance(d.distance)(s1, s2, 100.0) == d.distance(s1, s2) for d in distances]
+    [True, True, True]
+    >>> [bounded_distance(d.distance)(s1, s2, 2.0) for d in distances]
+    [inf, inf, inf]
+    >>> bounded_distance(lambda s1, s2: 42.0)(s1, s2, 2.0)
+    42.0
+    """
+    bounded = getattr(getattr(dist, "__self__", None), "bounded", None)
+    if bounded is None:
+        return lambda s1, s2, bound: dist(s1, s2)
+    return cast(BoundedDistanceFunc, bounded)
+
+
+NPMetric = Callable[
+    [NDArray[np.float64], NDArray[np.float64], Optional[NDArray[np.float64]]],
+    NDArray[np.float64],
+]
+
+
+def np_accumulate(
+    queries: NDArray[np.float64],
+    features: NDArray[np.float64],
+    term: Callable[..., NDArray[np.float64]],
+    combine: np.ufunc,
+    scratch: Optional[NDArray[np.float64]] = None,
+) -> NDArray[np.float64]:
+    """Queries-by-training array of ``combine(term(q_i - t_i))`` over the features.
+
+    The queries have one row per unknown, the features have one row per feature.
+    The optional ``scratch`` array has room for two queries-by-training blocks.
+    Reusing it avoids allocating (and page-faulting) fresh temporaries for each tile.
+    """
+    rows, columns = len(queries), features.shape[1]
+    if scratch is None:
+        scratch = np.empty((2, rows, columns))
+    total = scratch[0, :rows, :columns]
+    work = scratch[1, :rows, :columns]
+    term(np.subtract(queries[:, 0, np.newaxis], features[0], out=total), out=total)
+    for i in range(1, len(features)):
+        np.subtract(queries[:, i, np.newaxis], features[i], out=work)
+        combine(total, term(work, out=work), out=total)
+    return total
+
+
+def np_fourth_power(
+    x: NDArray[np.float64], out: NDArray[np.float64]
+) -> NDArray[np.float64]:
+    return np.square(np.square(x, out=out), out=out)
+
+
+NP_METRICS: dict[Callable[..., float], NPMetric] = {
+    # Euclidean.distance() applies hypot() to the squared differences.
+    Euclidean.distance: lambda q, f, w: np.sqrt(
+        np_accumulate(q, f, np_fourth_power, np.add, w)
+    ),
+    Manhattan.distance: lambda q, f, w: np_accumulate(q, f, np.absolute, np.add, w),
+    Chebyshev.distance: lambda q, f, w: np_accumulate(q, f, np.absolute, np.maximum, w),
+}
+
+
+def np_metric(dist: DistanceFunc) -> Optional[NPMetric]:
+    """The array version of a :class:`Distance` instance's ``distance()`` method, if there is one."""
+    return NP_METRICS.get(getattr(dist, "__func__", dist))
+
 
 class Hyperparameter(NamedTuple):
     k: int
@@ -288,15 +684,21 @@ class Hyperparameter(NamedTuple):
         distance = self.distance
         return classifier(self.k, distance.distance, self.training_data, unknown)
 
-    def test(self, testing: TestingList) -> float:
-        classifier = self.classifier
+    def classify_many(self, unknowns: Sequence[AnySample]) -> list[str]:
+        """Classify all of the unknowns.
+        A classifier in :data:`BATCH_CLASSIFIERS` handles them in one batch;
+        any other classifier is used one unknown at a time.
+        """
+        batch_classifier = BATCH_CLASSIFIERS.get(self.classifier)
+        if batch_classifier is None:
+            return [self.classify(u) for u in unknowns]
         distance = self.distance
+        return batch_classifier(self.k, distance.distance, self.training_data, unknowns)
+
+    def test(self, testing: TestingList) -> float:
+        classifications = self.classify_many([t.sample for t in testing])
         test_results = (
-            ClassifiedKnownSample(
-                t.sample,
-                classifier(self.k, distance.distance, self.training_data, t.sample),
-            )
-            for t in testing
+            ClassifiedKnownSample(t.sample, c) for t, c in zip(testing, classifications)
         )
         pass_fail = map(
             lambda t: (1 if t.sample.species == t.classification else 0), test_results
@@ -322,6 +724,11 @@ test_hyperparameter = """
 ... ]
 >>> h.test(testing_data)
 0.5
+>>> h_np = Hyperparameter(1, manhattan, training_data, k_nn_np)
+>>> h_np.classify_many([t.sample for t in testing_data])
+['a', 'a']
+>>> h_np.test(testing_data)
+0.5
 """
 
 
@@ -359,6 +766,118 @@ class TestCommand:
         return timing
 
 
+class SweepCommand:
+    """
+    Test every _k_ in ``k_range`` for one distance.
+
+    The training samples are ranked once for each testing sample, up to the largest _k_.
+    Each _k_ is then scored from running vote counts over that ranking.
+    This gives the same classifications as :func:`k_nn_np`, at roughly the cost of one test.
+    (Other classifiers can differ only where neighbors at equal distances are ranked differently.)
+    The elapsed time is shared equally among the :class:`Timing` records.
+
+    >>> data = [
+    ...     KnownSample(sample=Sample(1, 2, 3, 4), species="a"),
+    ...     KnownSample(sample=Sample(2, 3, 4, 5), species="b"),
+    ...     KnownSample(sample=Sample(3, 4, 5, 6), species="b"),
+    ...     KnownSample(sample=Sample(4, 5, 6, 7), species="b"),
+    ... ]
+    >>> training_data = [TrainingKnownSample(s) for s in data]
+    >>> testing_data = [
+    ...     TestingKnownSample(KnownSample(sample=Sample(1.1, 2.1, 3.1, 4.1), species="a")),
+    ... ]
+    >>> sweep = SweepCommand(Manhattan(), training_data, testing_data, range(1, 5, 2))
+    >>> [(t.k, t.classifier_name, t.quality) for t in sweep.test()]
+    [(1, 'sweep', 1.0), (3, 'sweep', 0.0)]
+    >>> [TestCommand(Hyperparameter(k, Manhattan(), training_data, k_nn_1), testing_data).test().quality for k in (1, 3)]
+    [1.0, 0.0]
+
+    Every _k_ must have that many training samples to vote.
+
+    >>> SweepCommand(Manhattan(), training_data, testing_data, range(1, 7, 2))
+    Traceback (most recent call last):
+    ...
+    ValueError: k=5 needs at least 5 training samples, there are 4
+    """
+
+    def __init__(
+        self,
+        distance: Distance,
+        training: TrainingList,
+        testing: TestingList,
+        k_range: Iterable[int],
+    ) -> None:
+        self.distance = distance
+        self.training_samples = training
+        self.testing_samples = testing
+        self.k_range = sorted(k_range)
+        if not self.k_range or self.k_range[0] < 1:
+            raise ValueError(f"k values must be 1 or more, not {self.k_range}")
+        if self.k_range[-1] > len(training):
+            raise ValueError(
+                f"k={self.k_range[-1]} needs at least {self.k_range[-1]} training samples, "
+                f"there are {len(training)}"
+            )
+
+    def ranking(self, max_k: int) -> list[list[str]]:
+        """The species of the ``max_k`` nearest training samples, nearest first, for each testing sample."""
+        unknowns = [t.sample for t in self.testing_samples]
+        metric = np_metric(self.distance.distance)
+        if metric is None:
+            dist = self.distance.distance
+            return [
+                [
+                    m.sample.sample.species
+                    for m in heapq.nsmallest(
+                        max_k,
+                        (Measured(dist(t, u), t) for t in self.training_samples),
+                    )
+                ]
+                for u in unknowns
+            ]
+        arrays = training_arrays(self.training_samples)
+        queries = np.array([u.sample for u in unknowns], dtype=np.float64).reshape(
+            -1, 4
+        )
+        ranking: list[list[str]] = []
+        for q_start in range(0, len(queries), QUERY_TILE):
+            nearest = np_k_nearest(
+                max_k, metric, arrays.features, queries[q_start : q_start + QUERY_TILE]
+            )
+            ranking.extend(
+                [arrays.species[label] for label in arrays.labels[row]]
+                for row in nearest
+            )
+        return ranking
+
+    def test(self) -> list[Timing]:
+        start = time.perf_counter()
+        passed = Counter[int]()
+        for t, ranked in zip(self.testing_samples, self.ranking(self.k_range[-1])):
+            votes = Counter[str]()
+            k_iter = iter(self.k_range)
+            next_k = next(k_iter, None)
+            for n, species in enumerate(ranked, start=1):
+                votes[species] += 1
+                while next_k is not None and n >= next_k:
+                    # max() finds the first of any ties, like Counter.most_common().
+                    if max(votes, key=votes.__getitem__) == t.sample.species:
+                        passed[next_k] += 1
+                    next_k = next(k_iter, None)
+        end = time.perf_counter()
+        elapsed = round((end - start) * 1000.0 / len(self.k_range), 3)
+        return [
+            Timing(
+                k=k,
+                distance_name=self.distance.__class__.__name__,
+                classifier_name="sweep",
+                quality=passed[k] / len(self.testing_samples),
+                time=elapsed,
+            )
+            for k in self.k_range
+        ]
+
+
 from pathlib import Path
 
 manhattan = Manhattan()
@@ -393,21 +912,31 @@ def load(source: Path) -> tuple[TrainingList, TestingList]:
     return train, test
 
 
-def tuning(source: Path) -> None:
+def tuning(source: Path, sweep: bool = False) -> None:
     """
     1. Load data. Requires ``PYTHONHASHSEED=0`` in the environment settings.
     2. Create test scenarios.
+       With ``sweep``, there's one :class:`SweepCommand` per distance,
+       instead of a :class:`TestCommand` for each k, distance, and classifier.
     3. Execute all tests and gather timing.
     4. Display results.
     """
     train, test = load(source)
-    scenarios = [
-        TestCommand(Hyperparameter(k, df, train, cl), test)
-        for k in range(3, 33, 2)
-        for df in (euclidean, manhattan, chebyshev)
-        for cl in (k_nn_1, k_nn_b, k_nn_q)
-    ]
-    timings = [s.test() for s in scenarios]
+    timings: list[Timing]
+    if sweep:
+        sweeps = [
+            SweepCommand(df, train, test, range(3, 33, 2))
+            for df in (euclidean, manhattan, chebyshev)
+        ]
+        timings = [t for s in sweeps for t in s.test()]
+    else:
+        scenarios = [
+            TestCommand(Hyperparameter(k, df, train, cl), test)
+            for k in range(3, 33, 2)
+            for df in (euclidean, manhattan, chebyshev)
+            for cl in (k_nn_1, k_nn_b, k_nn_q, k_nn_np)
+        ]
+        timings = [s.test() for s in scenarios]
     for t in timings:
         if t.quality >= 1.0:
             print(t)
@@ -417,4 +946,6 @@ __test__ = {name: case for name, case in globals().items() if name.startswith("t
 
 
 if __name__ == "__main__":
-    tuning(Path.cwd().parent / "bezdekiris.data")
+    import sys
+
+    tuning(Path.cwd().parent / "bezdekiris.data", sweep="--sweep" in sys.argv[1:])
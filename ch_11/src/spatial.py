@@ -0,0 +1,354 @@
+"""
+Python 3 Object-Oriented Programming Case Study
+
+Chapter 11. Common Design Patterns
+
+Spatial indexes for the k-NN classifiers.
+A :class:`KDTree` or :class:`BallTree` is built once from a training list,
+and answers k-nearest queries with branch-and-bound pruning.
+"""
+
+from __future__ import annotations
+import collections
+import heapq
+from typing import Callable, Counter, NamedTuple, Optional, Union
+from model import (
+    AnySample,
+    Chebyshev,
+    DistanceFunc,
+    Euclidean,
+    Manhattan,
+    Measured,
+    TrainingList,
+    k_nn_1,
+)
+
+
+class Nearest:
+    """
+    The _k_ nearest training samples seen so far.
+
+    This is a heap of ``(-distance, -index)`` pairs, so the farthest
+    of the _k_ is at the top, ready to be replaced by a nearer sample.
+    """
+
+    def __init__(self, k: int) -> None:
+        self.k = k
+        self.heap: list[tuple[float, int]] = []
+
+    def bound(self) -> float:
+        """Distance a sample has to beat to be one of the _k_ nearest."""
+        if len(self.heap) < self.k:
+            return float("inf")
+        return -self.heap[0][0]
+
+    def offer(self, distance: float, index: int) -> None:
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, (-distance, -index))
+        elif distance < -self.heap[0][0]:
+            heapq.heapreplace(self.heap, (-distance, -index))
+
+    def measured(self, training_data: TrainingList) -> list[Measured]:
+        """The nearest samples, in ascending order of distance."""
+        return [
+            Measured(-d, training_data[-i]) for d, i in sorted(self.heap, reverse=True)
+        ]
+
+
+class KDLeaf(NamedTuple):
+    indices: list[int]
+
+
+class KDSplit(NamedTuple):
+    axis: int
+    value: float
+    below: KDNode
+    above: KDNode
+
+
+KDNode = Union[KDLeaf, KDSplit]
+
+
+class KDTree:
+    """
+    A k-d tree over the four measurements of the training samples.
+
+    Each split divides the samples at the median of the axis with the widest spread.
+    The difference along one axis is never more than the :class:`Manhattan`
+    or :class:`Chebyshev` distance; its square is never more than the :class:`Euclidean`
+    distance, which is the root of the sum of the differences' fourth powers.
+    A subtree on the far side of a split plane can be skipped when this bound
+    on its distance is more than the _k_-th nearest so far.
+
+    >>> from model import KnownSample, Sample, TrainingKnownSample, UnknownSample
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(i, i + 1, i + 2, i + 3), species=str(i)))
+    ...     for i in range(10)
+    ... ]
+    >>> tree = KDTree(data, leaf_size=2)
+    >>> [m.sample.sample.species for m in tree.nearest(3, Manhattan().distance, UnknownSample(Sample(4.2, 5.2, 6.2, 7.2)))]
+    ['4', '5', '3']
+    """
+
+    # The least distance to a point, given its offset along one axis.
+    DISTANCES: dict[Callable[..., float], Callable[[float], float]] = {
+        Manhattan.distance: abs,
+        Chebyshev.distance: abs,
+        Euclidean.distance: lambda offset: offset * offset,
+    }
+
+    @classmethod
+    def bounds(cls, dist: DistanceFunc) -> bool:
+        """Is this the ``distance()`` method of one of the :class:`Distance` classes the tree can bound?"""
+        return getattr(dist, "__func__", dist) in cls.DISTANCES
+
+    def __init__(self, training_data: TrainingList, leaf_size: int = 16) -> None:
+        self.training_data = training_data
+        self.leaf_size = leaf_size
+        self.points = [t.sample.sample for t in training_data]
+        self.root = self.build(list(range(len(training_data))))
+
+    def build(self, indices: list[int]) -> KDNode:
+        if len(indices) <= self.leaf_size:
+            return KDLeaf(indices)
+        spreads = [
+            max(self.points[i][axis] for i in indices)
+            - min(self.points[i][axis] for i in indices)
+            for axis in range(4)
+        ]
+        axis = spreads.index(max(spreads))
+        if spreads[axis] == 0:
+            return KDLeaf(indices)
+        indices.sort(key=lambda i: self.points[i][axis])
+        middle = len(indices) // 2
+        return KDSplit(
+            axis,
+            self.points[indices[middle]][axis],
+            self.build(indices[:middle]),
+            self.build(indices[middle:]),
+        )
+
+    def nearest(self, k: int, dist: DistanceFunc, unknown: AnySample) -> list[Measured]:
+        if not self.bounds(dist):
+            raise ValueError(f"k-d tree can't bound distance {dist!r}")
+        nearest = Nearest(k)
+        axis_bound = self.DISTANCES[getattr(dist, "__func__", dist)]
+        self.search(self.root, nearest, dist, axis_bound, unknown)
+        return nearest.measured(self.training_data)
+
+    def search(
+        self,
+        node: KDNode,
+        nearest: Nearest,
+        dist: DistanceFunc,
+        axis_bound: Callable[[float], float],
+        unknown: AnySample,
+    ) -> None:
+        if isinstance(node, KDLeaf):
+            for i in node.indices:
+                nearest.offer(dist(self.training_data[i], unknown), i)
+            return
+        offset = unknown.sample[node.axis] - node.value
+        near, far = (node.below, node.above) if offset < 0 else (node.above, node.below)
+        self.search(near, nearest, dist, axis_bound, unknown)
+        if axis_bound(offset) <= nearest.bound():
+            self.search(far, nearest, dist, axis_bound, unknown)
+
+
+class BallNode(NamedTuple):
+    center: int
+    radius: float
+    indices: list[int]
+    children: tuple[BallNode, ...]
+
+
+class BallTree:
+    """
+    A ball tree for any distance function that obeys the triangle inequality.
+
+    Each node has a training sample as its center, and a radius that covers all of its samples.
+    No sample in a ball can be nearer than the distance to the center, less the radius.
+    The :class:`Euclidean` distance here, the root of the sum of fourth powers,
+    isn't a metric; :func:`k_nn_ball` only uses a tree for the :attr:`METRICS`.
+
+    >>> from model import KnownSample, Sample, TrainingKnownSample, UnknownSample
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(i, i + 1, i + 2, i + 3), species=str(i)))
+    ...     for i in range(10)
+    ... ]
+    >>> tree = BallTree(data, Manhattan().distance, leaf_size=2)
+    >>> [m.sample.sample.species for m in tree.nearest(3, UnknownSample(Sample(4.2, 5.2, 6.2, 7.2)))]
+    ['4', '5', '3']
+    """
+
+    METRICS = {Manhattan.distance, Chebyshev.distance}
+
+    @classmethod
+    def metric(cls, dist: DistanceFunc) -> bool:
+        """Is this the ``distance()`` method of a :class:`Distance` that obeys the triangle inequality?"""
+        return getattr(dist, "__func__", dist) in cls.METRICS
+
+    def __init__(
+        self, training_data: TrainingList, dist: DistanceFunc, leaf_size: int = 16
+    ) -> None:
+        self.training_data = training_data
+        self.dist = dist
+        self.leaf_size = leaf_size
+        self.root = self.build(list(range(len(training_data))))
+
+    def distance(self, i: int, j: int) -> float:
+        """Distance between two training samples."""
+        return self.dist(self.training_data[i], self.training_data[j].sample)
+
+    def build(self, indices: list[int]) -> BallNode:
+        center = self.medoid(indices)
+        radius = max(self.distance(i, center) for i in indices)
+        if len(indices) <= self.leaf_size or radius == 0:
+            return BallNode(center, radius, indices, ())
+        # Two far-apart pivots; each sample goes with the nearer pivot.
+        left = max(indices, key=lambda i: self.distance(i, center))
+        right = max(indices, key=lambda i: self.distance(i, left))
+        left_indices, right_indices = [], []
+        for i in indices:
+            if self.distance(i, left) <= self.distance(i, right):
+                left_indices.append(i)
+            else:
+                right_indices.append(i)
+        if not right_indices:
+            return BallNode(center, radius, indices, ())
+        return BallNode(
+            center, radius, [], (self.build(left_indices), self.build(right_indices))
+        )
+
+    def medoid(self, indices: list[int]) -> int:
+        """The sample nearest the mean of the measurements."""
+        points = [self.training_data[i].sample.sample for i in indices]
+        mean = [sum(p[axis] for p in points) / len(points) for axis in range(4)]
+        return min(
+            indices,
+            key=lambda i: sum(
+                (self.training_data[i].sample.sample[axis] - mean[axis]) ** 2
+                for axis in range(4)
+            ),
+        )
+
+    def nearest(self, k: int, unknown: AnySample) -> list[Measured]:
+        nearest = Nearest(k)
+        root_distance = self.dist(self.training_data[self.root.center], unknown)
+        self.search(self.root, root_distance, nearest, unknown)
+        return nearest.measured(self.training_data)
+
+    def search(
+        self,
+        node: BallNode,
+        center_distance: float,
+        nearest: Nearest,
+        unknown: AnySample,
+    ) -> None:
+        if center_distance - node.radius > nearest.bound():
+            return
+        for i in node.indices:
+            nearest.offer(self.dist(self.training_data[i], unknown), i)
+        children = sorted(
+            (self.dist(self.training_data[child.center], unknown), n, child)
+            for n, child in enumerate(node.children)
+        )
+        for child_distance, _, child in children:
+            self.search(child, child_distance, nearest, unknown)
+
+
+SpatialIndex = Union[KDTree, BallTree]
+
+_indexes: dict[
+    tuple[int, Optional[DistanceFunc]], tuple[TrainingList, int, SpatialIndex]
+] = {}
+INDEX_LIMIT = 8
+
+
+def spatial_index(
+    training_data: TrainingList, dist: Optional[DistanceFunc]
+) -> SpatialIndex:
+    """Build an index for a training list once, and reuse it.
+
+    With a ``dist`` of ``None``, this is a :class:`KDTree`,
+    otherwise it's a :class:`BallTree` for the given distance.
+    Like :func:`model.training_arrays`, the cache is keyed by the identity of the list,
+    and only the most recent :data:`INDEX_LIMIT` indexes are kept.
+    """
+    key = (id(training_data), dist)
+    cached = _indexes.get(key)
+    if (
+        cached is None
+        or cached[0] is not training_data
+        or cached[1] != len(training_data)
+    ):
+        index: SpatialIndex
+        if dist is None:
+            index = KDTree(training_data)
+        else:
+            index = BallTree(training_data, dist)
+        cached = (training_data, len(training_data), index)
+        _indexes[key] = cached
+        if len(_indexes) > INDEX_LIMIT:
+            del _indexes[next(iter(_indexes))]
+    return cached[2]
+
+
+def mode(k_nearest: list[Measured]) -> str:
+    k_frequencies: Counter[str] = collections.Counter(
+        s.sample.sample.species for s in k_nearest
+    )
+    mode, fq = k_frequencies.most_common(1)[0]
+    return mode
+
+
+def k_nn_kd(
+    k: int, dist: DistanceFunc, training_data: TrainingList, unknown: AnySample
+) -> str:
+    """
+    Use a :class:`KDTree`, built once for the training data, to locate the _k_ nearest neighbors.
+    A distance the k-d tree can't bound is handled by :func:`k_nn_ball`.
+
+    >>> from model import KnownSample, Sample, TrainingKnownSample, UnknownSample
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(2, 3, 4, 5), species="b")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(3, 4, 5, 6), species="c")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(4, 5, 6, 7), species="d")),
+    ... ]
+    >>> k_nn_kd(1, Chebyshev().distance, data, UnknownSample(Sample(1.1, 2.1, 3.1, 4.1)))
+    'a'
+    """
+    if not KDTree.bounds(dist):
+        return k_nn_ball(k, dist, training_data, unknown)
+    tree = spatial_index(training_data, None)
+    assert isinstance(tree, KDTree)
+    return mode(tree.nearest(k, dist, unknown))
+
+
+def k_nn_ball(
+    k: int, dist: DistanceFunc, training_data: TrainingList, unknown: AnySample
+) -> str:
+    """
+    Use a :class:`BallTree`, built once for the training data and distance,
+    to locate the _k_ nearest neighbors.
+    A distance that isn't one of the :attr:`BallTree.METRICS` can't be pruned,
+    and is handled by the linear scan of :func:`model.k_nn_1`.
+
+    >>> from model import KnownSample, Sample, TrainingKnownSample, UnknownSample
+    >>> data = [
+    ...     TrainingKnownSample(KnownSample(sample=Sample(1, 2, 3, 4), species="a")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(2, 3, 4, 5), species="b")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(3, 4, 5, 6), species="c")),
+    ...     TrainingKnownSample(KnownSample(sample=Sample(4, 5, 6, 7), species="d")),
+    ... ]
+    >>> k_nn_ball(1, Manhattan().distance, data, UnknownSample(Sample(1.1, 2.1, 3.1, 4.1)))
+    'a'
+    >>> k_nn_ball(1, Euclidean().distance, data, UnknownSample(Sample(3.9, 4.9, 5.9, 6.9)))
+    'd'
+    """
+    if not BallTree.metric(dist):
+        return k_nn_1(k, dist, training_data, unknown)
+    tree = spatial_index(training_data, dist)
+    assert isinstance(tree, BallTree)
+    return mode(tree.nearest(k, unknown))
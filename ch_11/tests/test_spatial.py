@@ -0,0 +1,67 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+
+import random
+from pytest import *
+from model import (
+    Chebyshev,
+    Euclidean,
+    KnownSample,
+    Manhattan,
+    Minkowski,
+    Sample,
+    TrainingKnownSample,
+    UnknownSample,
+    k_nn_1,
+)
+import spatial
+
+DISTANCES = [Euclidean(), Manhattan(), Chebyshev(), Minkowski(3)]
+
+
+@fixture(scope="module")
+def training_data():
+    # Differences under 1 are where a squared axis offset is less than the offset.
+    random.seed(42)
+    return [
+        TrainingKnownSample(
+            KnownSample(
+                Sample(*(random.uniform(0, 2) for _ in range(4))),
+                random.choice(["a", "b", "c"]),
+            )
+        )
+        for _ in range(500)
+    ]
+
+
+@fixture(scope="module")
+def unknowns():
+    random.seed(43)
+    return [
+        UnknownSample(Sample(*(random.uniform(0, 2) for _ in range(4))))
+        for _ in range(100)
+    ]
+
+
+def exact(k, dist, training_data, unknown):
+    return sorted(dist(t, unknown) for t in training_data)[:k]
+
+
+@mark.parametrize("algorithm", DISTANCES, ids=lambda a: type(a).__name__)
+def test_trees_match_linear_scan(training_data, unknowns, algorithm):
+    dist = algorithm.distance
+    kd_tree = spatial.KDTree(training_data, leaf_size=8)
+    ball_tree = spatial.BallTree(training_data, dist, leaf_size=8)
+    for unknown in unknowns:
+        expected = k_nn_1(5, dist, training_data, unknown)
+        assert spatial.k_nn_kd(5, dist, training_data, unknown) == expected
+        assert spatial.k_nn_ball(5, dist, training_data, unknown) == expected
+        if spatial.KDTree.bounds(dist):
+            found = [m.distance for m in kd_tree.nearest(5, dist, unknown)]
+            assert found == exact(5, dist, training_data, unknown)
+        if spatial.BallTree.metric(dist):
+            found = [m.distance for m in ball_tree.nearest(5, unknown)]
+            assert found == exact(5, dist, training_data, unknown)
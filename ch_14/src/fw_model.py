@@ -5,12 +5,20 @@ Chapter 14.  Concurrency
 """
 from __future__ import annotations
 import abc
+import argparse
 import collections
 from concurrent import futures
 import csv
 import datetime
+from array import array
 from math import isclose, hypot
+import os
 from pathlib import Path
+import secrets
+import socket
+import sys
+import threading
+import time
 from typing import (
     cast,
     Any,
@@ -20,11 +28,12 @@ from typing import (
     Iterable,
     Counter,
     NamedTuple,
+    Sequence,
     TextIO,
     TypedDict,
 )
 
-from multiprocessing.shared_memory import ShareableList
+from multiprocessing.shared_memory import ShareableList, SharedMemory
 from multiprocessing.managers import BaseManager, SharedMemoryManager
 from csv import DictReader
 
@@ -97,10 +106,25 @@ class SharedSamplesCSV:
 
     def __init__(self, shareable: ShareableList[Any]) -> None:
         self._data = shareable
+        self._columns: Optional[SampleColumns] = None
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # The parsed columns are local to each process; only the ShareableList is sent.
+        return (self.__class__, (self._data,))
 
     def __len__(self) -> int:
         return len(self._data) // len(self.fieldnames)
 
+    @property
+    def columns(self) -> SampleColumns:
+        """The rows parsed into columns, once, the first time they're needed."""
+        if self._columns is None:
+            rows = list(self.row_iter())
+            self._columns = SampleColumns(
+                *([row[name] for row in rows] for name in self.fieldnames)
+            )
+        return self._columns
+
     def row(self, r: int) -> dict[str, Any]:
         row_len = len(self.fieldnames)
         str_row = {
@@ -122,11 +146,194 @@ class SharedSamplesCSV:
             yield self.row(i)
 
 
+class SampleColumns(NamedTuple):
+    """One sequence per attribute; a sample is a row number into all of them."""
+
+    sepal_length: Sequence[float]
+    sepal_width: Sequence[float]
+    petal_length: Sequence[float]
+    petal_width: Sequence[float]
+    species: Sequence[str]
+
+
+class SpeciesColumn(Sequence[str]):
+    """Species names, looked up from a column of small integer codes."""
+
+    def __init__(self, codes: Sequence[int], names: tuple[str, ...]) -> None:
+        self.codes = codes
+        self.names = names
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self.names[c] for c in self.codes[index]]
+        return self.names[self.codes[index]]
+
+
+class SharedColumnsName(NamedTuple):
+    """The names of the shared memory blocks; this is all a worker needs to attach."""
+
+    features: tuple[str, ...]
+    species_codes: str
+    species_names: str
+    size: int
+
+
+class SharedSamplesColumns:
+    """
+    Samples in shared memory as typed columns.
+    Each of the four measurements is a block of float64 values.
+    The species is a block of uint16 codes, plus a ShareableList of the distinct names.
+
+    The columns are ``memoryview`` objects over the shared memory: there's no copying,
+    and no conversion from text when an attribute is read.
+
+    Usual multiprocessing parent::
+
+        with SharedMemoryManager() as smm:
+            with source_path.open() as source:
+                reader = csv.DictReader(source, SharedSamplesColumns.fieldnames)
+                factory = SharedSamplesColumns.load(smm, reader)
+            with futures.ProcessPoolExecutor() as workers:
+                workers.submit(function, factory.name)
+
+    Usual function(name)::
+
+        with SharedSamplesColumns(name) as factory:
+            sample = KnownSample(factory, i)
+
+    A factory can also be pickled; it's sent as the names of its blocks,
+    and reattached on the other side.
+
+    The columns can't be used after :meth:`close`, and the blocks can't be closed
+    while a slice of a column is still in use.
+    Close a factory explicitly, or use it as a context manager;
+    left to the garbage collector, the blocks may be closed before the views over them,
+    and that raises :exc:`BufferError`.
+
+    >>> data = [
+    ...     {"sepal_length": "5.1",
+    ...      "sepal_width": "3.5",
+    ...      "petal_length": "1.4",
+    ...      "petal_width": "0.2",
+    ...      "species": "Iris-setosa"},
+    ...     {"sepal_length": 7.9, "sepal_width": 3.2, "petal_length": 4.7, "petal_width": 1.4, "species": "Iris-versicolor"},
+    ... ]
+    >>> with SharedMemoryManager() as smm:
+    ...     with SharedSamplesColumns.load(smm, data) as factory:
+    ...         len(factory)
+    ...         factory.row(1)
+    ...         KnownSample(factory, 0)
+    ...         list(factory.columns.sepal_length)
+    2
+    {'sepal_length': 7.9, 'sepal_width': 3.2, 'petal_length': 4.7, 'petal_width': 1.4, 'species': 'Iris-versicolor'}
+    KnownSample(sample=Sample(sepal_length=5.1, sepal_width=3.5, petal_length=1.4, petal_width=0.2, ), species='Iris-setosa')
+    [5.1, 7.9]
+    """
+
+    fieldnames = SharedSamplesCSV.fieldnames
+    features = fieldnames[:4]
+
+    @classmethod
+    def load(
+        cls, smm: SharedMemoryManager, source: Iterable[dict[str, Any]]
+    ) -> SharedSamplesColumns:
+        """Convert the rows to typed columns and copy each column to its own shared block."""
+        feature_arrays = [array("d") for _ in cls.features]
+        codes = array("H")
+        species_code: dict[str, int] = {}
+        for row in source:
+            for column, name in zip(feature_arrays, cls.features):
+                column.append(float(row[name]))
+            species = sys.intern(str(row["species"]))
+            codes.append(species_code.setdefault(species, len(species_code)))
+
+        def share(column: array[Any]) -> str:
+            block = smm.SharedMemory(size=max(1, len(column) * column.itemsize))
+            buffer = cast(memoryview, block.buf)
+            buffer[: len(column) * column.itemsize] = memoryview(column).cast("B")
+            return block.name
+
+        names = smm.ShareableList(list(species_code))
+        return cls(
+            SharedColumnsName(
+                features=tuple(share(column) for column in feature_arrays),
+                species_codes=share(codes),
+                species_names=names.shm.name,
+                size=len(codes),
+            )
+        )
+
+    def __init__(self, name: SharedColumnsName) -> None:
+        """Attach to the shared memory blocks by name."""
+        self.name = name
+        self._blocks = [SharedMemory(name=n) for n in name.features]
+        codes_block = SharedMemory(name=name.species_codes)
+        names: ShareableList[str] = ShareableList(name=name.species_names)
+        self._views: list[memoryview[Any]] = [
+            cast(memoryview, block.buf)[: name.size * 8].cast("d")
+            for block in self._blocks
+        ]
+        self._views.append(cast(memoryview, codes_block.buf)[: name.size * 2].cast("H"))
+        self._blocks.append(codes_block)
+        sepal_length, sepal_width, petal_length, petal_width, codes = cast(
+            list[Sequence[Any]], self._views
+        )
+        self.columns = SampleColumns(
+            sepal_length,
+            sepal_width,
+            petal_length,
+            petal_width,
+            SpeciesColumn(
+                codes, tuple(sys.intern(names[i]) for i in range(len(names)))
+            ),
+        )
+        names.shm.close()
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (self.__class__, (self.name,))
+
+    def __len__(self) -> int:
+        return self.name.size
+
+    def row(self, r: int) -> dict[str, Any]:
+        return {name: column[r] for name, column in zip(self.fieldnames, self.columns)}
+
+    def row_iter(self) -> Iterable[dict[str, Any]]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def __enter__(self) -> SharedSamplesColumns:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the memoryviews, then detach from the shared memory blocks."""
+        while self._views:
+            self._views.pop().release()
+        while self._blocks:
+            self._blocks.pop().close()
+
+
+SampleFactory = Union[SharedSamplesCSV, SharedSamplesColumns]
+
+
 class FWSample:
-    """A Flyweight design that relies on a collection of ShareableList instances."""
+    """A Flyweight design that relies on a collection of ShareableList instances.
+    An attribute is one indexed read from a column of the factory.
+    """
 
-    def __init__(self, shareable: SharedSamplesCSV, row_num: int) -> None:
-        self._data = shareable.row(row_num)
+    def __init__(self, shareable: SampleFactory, row_num: int) -> None:
+        self._factory = shareable
+        self._columns = shareable.columns
+        self._row = row_num
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (self.__class__, (self._factory, self._row))
 
     def __repr__(self) -> str:
         return (
@@ -139,19 +346,19 @@ class FWSample:
 
     @property
     def sepal_length(self) -> float:
-        return float(self._data["sepal_length"])
+        return self._columns.sepal_length[self._row]
 
     @property
     def sepal_width(self) -> float:
-        return float(self._data["sepal_width"])
+        return self._columns.sepal_width[self._row]
 
     @property
     def petal_length(self) -> float:
-        return float(self._data["petal_length"])
+        return self._columns.petal_length[self._row]
 
     @property
     def petal_width(self) -> float:
-        return float(self._data["petal_width"])
+        return self._columns.petal_width[self._row]
 
     def astuple(self) -> tuple[float, float, float, float]:
         return (
@@ -173,8 +380,7 @@ class FWSample:
 
 
 class KnownSample:
-    def __init__(self, shareable: SharedSamplesCSV, row_num: int) -> None:
-        self._data = shareable.row(row_num)
+    def __init__(self, shareable: SampleFactory, row_num: int) -> None:
         self.sample = FWSample(shareable, row_num)
 
     def __repr__(self) -> str:
@@ -188,7 +394,7 @@ class KnownSample:
 
     @property
     def species(self) -> str:
-        return str(self._data["species"])
+        return self.sample._columns.species[self.sample._row]
 
     def __lt__(self, other: Any) -> bool:
         if isinstance(other, KnownSample):
@@ -608,7 +814,7 @@ class TrainingData:
         self.training: list[TrainingKnownSample] = []
         self.testing: list[TestingKnownSample] = []
 
-    def load(self, factory: SharedSamplesCSV) -> None:
+    def load(self, factory: SampleFactory) -> None:
         """Extract TestingKnownSample and TrainingKnownSample from raw data"""
         for n in range(len(factory)):
             if n % 5 == 0:
@@ -633,23 +839,21 @@ def grid_search_1() -> None:
     with SharedMemoryManager() as smm:
         source_path = Path.cwd().parent / "bezdekiris.data"
         with source_path.open() as source:
-            reader = csv.DictReader(source, SharedSamplesCSV.fieldnames)
-            shareable_data = SharedSamplesCSV.load(
-                cast(SharedMemoryManager, smm), reader
-            )
-
-        factory = SharedSamplesCSV(shareable_data)
-        td = TrainingData("Iris")
-        td.load(factory)
-        tuning_results: list[Hyperparameter] = []
-        with futures.ProcessPoolExecutor(8) as workers:
-            test_runs: list[futures.Future[Hyperparameter]] = []
-            for k in range(1, 41, 2):
-                for algo in ED(), MD(), CD(), SD():
-                    h = Hyperparameter(k, algo, td)
-                    test_runs.append(workers.submit(h.test))
-            for f in futures.as_completed(test_runs):
-                tuning_results.append(f.result())
+            reader = csv.DictReader(source, SharedSamplesColumns.fieldnames)
+            factory = SharedSamplesColumns.load(cast(SharedMemoryManager, smm), reader)
+
+        with factory:
+            td = TrainingData("Iris")
+            td.load(factory)
+            tuning_results: list[Hyperparameter] = []
+            with futures.ProcessPoolExecutor(8) as workers:
+                test_runs: list[futures.Future[Hyperparameter]] = []
+                for k in range(1, 41, 2):
+                    for algo in ED(), MD(), CD(), SD():
+                        h = Hyperparameter(k, algo, td)
+                        test_runs.append(workers.submit(h.test))
+                for f in futures.as_completed(test_runs):
+                    tuning_results.append(f.result())
         for result in tuning_results:
             print(
                 f"{result.k:2d} {result.algorithm.__class__.__name__:2s}"
@@ -657,6 +861,214 @@ def grid_search_1() -> None:
             )
 
 
+ALGORITHMS: dict[str, type[Distance]] = {
+    algo.__name__: algo for algo in (ED, MD, CD, SD)
+}
+
+
+class GridResult(NamedTuple):
+    k: int
+    algorithm: str
+    quality: float
+    worker: str
+
+
+class GridCoordinator:
+    """
+    A queue of ``(k, algorithm)`` work items and a collection of results,
+    shared with workers on any host through a :class:`GridManager`.
+
+    Each item handed to a worker is leased for ``lease`` seconds.
+    If the result doesn't arrive in time -- the worker died or lost its connection --
+    the item goes back on the queue for another worker.
+    A late result for an item already done is ignored.
+
+    >>> coordinator = GridCoordinator([(1, "ED"), (3, "ED")], rows=[], lease=0.0)
+    >>> coordinator.get_work("w1")
+    (1, 'ED')
+    >>> coordinator.get_work("w2")
+    (3, 'ED')
+    >>> coordinator.put_result("w2", 3, "ED", 0.75)
+    >>> coordinator.get_work("w2")  # w1's lease has expired
+    (1, 'ED')
+    >>> coordinator.put_result("w2", 1, "ED", 0.5)
+    >>> coordinator.put_result("w1", 1, "ED", 0.25)
+    >>> coordinator.finished()
+    True
+    >>> coordinator.results()
+    [GridResult(k=3, algorithm='ED', quality=0.75, worker='w2'), GridResult(k=1, algorithm='ED', quality=0.5, worker='w2')]
+    """
+
+    def __init__(
+        self,
+        work: Iterable[tuple[int, str]],
+        rows: list[dict[str, Any]],
+        lease: float = 60.0,
+    ) -> None:
+        self._rows = rows
+        self.lease = lease
+        self._queue: collections.deque[tuple[int, str]] = collections.deque(work)
+        self._leased: dict[tuple[int, str], float] = {}
+        self._results: dict[tuple[int, str], GridResult] = {}
+        self._expected = len(self._queue)
+        self._lock = threading.Lock()
+
+    def rows(self) -> list[dict[str, Any]]:
+        """The raw samples, so a worker on another host doesn't need its own copy of the data."""
+        return self._rows
+
+    def get_work(self, worker: str) -> Optional[tuple[int, str]]:
+        """The next item, or ``None`` if everything is done or leased to other workers."""
+        with self._lock:
+            now = time.monotonic()
+            for item, deadline in list(self._leased.items()):
+                if deadline <= now:
+                    del self._leased[item]
+                    self._queue.append(item)
+            while self._queue:
+                item = self._queue.popleft()
+                if item not in self._results:
+                    self._leased[item] = now + self.lease
+                    return item
+            return None
+
+    def put_result(self, worker: str, k: int, algorithm: str, quality: float) -> None:
+        with self._lock:
+            item = (k, algorithm)
+            self._leased.pop(item, None)
+            if item not in self._results:
+                self._results[item] = GridResult(k, algorithm, quality, worker)
+
+    def finished(self) -> bool:
+        with self._lock:
+            return len(self._results) == self._expected
+
+    def results(self) -> list[GridResult]:
+        with self._lock:
+            return list(self._results.values())
+
+
+class GridManager(BaseManager):
+    """Serves a :class:`GridCoordinator` over TCP."""
+
+
+GridManager.register("coordinator")
+
+
+def serve_grid(
+    coordinator: GridCoordinator,
+    address: tuple[str, int],
+    authkey: bytes,
+) -> tuple[Any, threading.Thread]:
+    """
+    Serve the coordinator from a thread of this process, so its results are local.
+    Use port 0 to pick any free port; the server's ``address`` has the actual port.
+    Stop the server with ``server.stop_event.set()``.
+
+    A manager unpickles what its clients send, so anyone who can reach
+    the address, and has the ``authkey``, can run code in this process.
+    """
+
+    class CoordinatorManager(GridManager):
+        """A :class:`GridManager` for this coordinator; registering doesn't change the base class."""
+
+    CoordinatorManager.register("coordinator", callable=lambda: coordinator)
+    manager = CoordinatorManager(address=address, authkey=authkey)
+    server = manager.get_server()
+
+    def serve() -> None:
+        # serve_forever() ends with sys.exit(), meant for a manager's own process.
+        try:
+            server.serve_forever()
+        except SystemExit:
+            pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def grid_worker(
+    address: tuple[str, int],
+    authkey: bytes,
+    worker: Optional[str] = None,
+    poll: float = 0.1,
+) -> int:
+    """
+    Connect to a coordinator, build a local training set from its rows,
+    and work until every item has a result. Returns the number of items this worker did.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    manager = GridManager(address=address, authkey=authkey)
+    manager.connect()
+    coordinator = manager.coordinator()  # type: ignore [attr-defined]
+    done = 0
+    with SharedMemoryManager() as smm:
+        with SharedSamplesColumns.load(smm, coordinator.rows()) as factory:
+            td = TrainingData("grid")
+            td.load(factory)
+            while not coordinator.finished():
+                item = coordinator.get_work(worker)
+                if item is None:
+                    # The rest are leased to other workers; one of them may fail.
+                    time.sleep(poll)
+                    continue
+                k, algorithm = item
+                h = Hyperparameter(k, ALGORITHMS[algorithm](), td).test()
+                coordinator.put_result(worker, k, algorithm, h.quality)
+                done += 1
+    return done
+
+
+def grid_coordinator(
+    port: int, authkey: bytes, lease: float, host: str = "127.0.0.1"
+) -> None:
+    source_path = Path.cwd().parent / "bezdekiris.data"
+    with source_path.open() as source:
+        rows = list(csv.DictReader(source, SharedSamplesColumns.fieldnames))
+    coordinator = GridCoordinator(
+        ((k, algo) for k in range(1, 41, 2) for algo in ALGORITHMS), rows, lease
+    )
+    server, thread = serve_grid(coordinator, (host, port), authkey)
+    print(f"Coordinator at {server.address}")
+    while not coordinator.finished():
+        time.sleep(1.0)
+    server.stop_event.set()
+    for result in sorted(coordinator.results()):
+        print(
+            f"{result.k:2d} {result.algorithm:2s} {result.quality:.3f} {result.worker}"
+        )
+
+
+def get_options(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """
+    The coordinator listens on ``--host``, 127.0.0.1 unless it's given; workers connect to it.
+    A worker needs the coordinator's ``--authkey``, or ``GRID_AUTHKEY``;
+    a coordinator without one makes a random key, and prints it.
+
+    >>> options = get_options(["coordinator"])
+    Authkey ...
+    >>> options.host, len(options.authkey)
+    ('127.0.0.1', 32)
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "role", nargs="?", choices=("local", "coordinator", "worker"), default="local"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=50_000)
+    parser.add_argument("--authkey", default=os.environ.get("GRID_AUTHKEY"))
+    parser.add_argument("--lease", type=float, default=60.0)
+    options = parser.parse_args(argv)
+    if options.authkey is None:
+        if options.role == "worker":
+            parser.error("a worker needs the coordinator's --authkey")
+        options.authkey = secrets.token_hex(16)
+        if options.role == "coordinator":
+            print(f"Authkey {options.authkey}")
+    return options
+
+
 # Special case, we don't *often* test abstract superclasses.
 # In this example, however, we can create instances of the abstract class.
 test_Sample = """
@@ -873,10 +1285,16 @@ data='test', k=3, quality=0.0
 
 __test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
 
-import time
-
 if __name__ == "__main__":
+    options = get_options()
     start = time.perf_counter()
-    grid_search_1()
+    if options.role == "coordinator":
+        grid_coordinator(
+            options.port, options.authkey.encode(), options.lease, options.host
+        )
+    elif options.role == "worker":
+        grid_worker((options.host, options.port), options.authkey.encode())
+    else:
+        grid_search_1()
     end = time.perf_counter()
     print(f"Training Complete: {(end-start)*1000:.3f}ms")
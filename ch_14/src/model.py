@@ -5,12 +5,19 @@ Chapter 14.  Concurrency
 """
 from __future__ import annotations
 import abc
+from array import array
 import collections
 from concurrent import futures
 import csv
 import datetime
+import json
 from math import isclose, hypot
+import mmap
 from pathlib import Path
+import pickle
+import struct
+import sys
+import time
 from typing import (
     cast,
     Any,
@@ -23,6 +30,7 @@ from typing import (
     Protocol,
     NamedTuple,
 )
+import zlib
 
 
 class Sample(NamedTuple):
@@ -438,6 +446,112 @@ class Hyperparameter:
         return species
 
 
+def nearest(
+    algorithm: Distance,
+    training: Iterable[TrainingKnownSample],
+    sample: Sample,
+    k: int,
+) -> str:
+    """The most common species among the _k_ training samples nearest to ``sample``."""
+    distances = sorted(
+        (algorithm.distance(known.sample.sample, sample), known) for known in training
+    )
+    frequency: Counter[str] = collections.Counter(
+        known.sample.species for d, known in distances[:k]
+    )
+    species, votes = frequency.most_common(1)[0]
+    return species
+
+
+def wilson_edit(
+    training: list[TrainingKnownSample], algorithm: Distance, k: int = 3
+) -> list[TrainingKnownSample]:
+    """
+    Wilson editing: drop each sample that its _k_ nearest neighbors (not counting itself)
+    would misclassify. This removes noise and overlap at the class boundaries.
+
+    >>> training = [
+    ...     TrainingKnownSample(KnownSample(Sample(1.0, 1.0, 1.0, 1.0), "a")),
+    ...     TrainingKnownSample(KnownSample(Sample(1.1, 1.0, 1.0, 1.0), "a")),
+    ...     TrainingKnownSample(KnownSample(Sample(1.0, 1.1, 1.0, 1.0), "b")),
+    ...     TrainingKnownSample(KnownSample(Sample(1.0, 1.0, 1.1, 1.0), "a")),
+    ...     TrainingKnownSample(KnownSample(Sample(5.0, 5.0, 5.0, 5.0), "b")),
+    ...     TrainingKnownSample(KnownSample(Sample(5.1, 5.0, 5.0, 5.0), "b")),
+    ...     TrainingKnownSample(KnownSample(Sample(5.0, 5.1, 5.0, 5.0), "b")),
+    ... ]
+    >>> [t.sample.species for t in wilson_edit(training, ED(), k=3)]
+    ['a', 'a', 'a', 'b', 'b', 'b']
+    """
+    return [
+        known
+        for n, known in enumerate(training)
+        if nearest(
+            algorithm,
+            (other for i, other in enumerate(training) if i != n),
+            known.sample.sample,
+            k,
+        )
+        == known.sample.species
+    ]
+
+
+def condense(
+    training: list[TrainingKnownSample], algorithm: Distance, k: int = 1
+) -> list[TrainingKnownSample]:
+    """
+    Hart's condensed nearest neighbor: start from one sample and add each sample
+    the kept samples misclassify, repeating until a pass adds nothing.
+    Samples far from a decision boundary are redundant, and are left out.
+    Hart used 1-NN; checking with the _k_ the reduced set will be used with
+    keeps enough prototypes near each boundary to outvote the other side.
+
+    >>> training = [
+    ...     TrainingKnownSample(KnownSample(Sample(1.0, 1.0, 1.0, 1.0), "a")),
+    ...     TrainingKnownSample(KnownSample(Sample(1.1, 1.0, 1.0, 1.0), "a")),
+    ...     TrainingKnownSample(KnownSample(Sample(1.0, 1.0, 1.1, 1.0), "a")),
+    ...     TrainingKnownSample(KnownSample(Sample(5.0, 5.0, 5.0, 5.0), "b")),
+    ...     TrainingKnownSample(KnownSample(Sample(5.1, 5.0, 5.0, 5.0), "b")),
+    ...     TrainingKnownSample(KnownSample(Sample(5.0, 5.1, 5.0, 5.0), "b")),
+    ... ]
+    >>> [t.sample.sample for t in condense(training, ED())]
+    [Sample(sepal_length=1.0, sepal_width=1.0, petal_length=1.0, petal_width=1.0), Sample(sepal_length=5.0, sepal_width=5.0, petal_length=5.0, petal_width=5.0)]
+    """
+    if not training:
+        return []
+    kept = [training[0]]
+    absorbed = training[1:]
+    changed = True
+    while changed:
+        changed = False
+        remaining: list[TrainingKnownSample] = []
+        for known in absorbed:
+            if nearest(algorithm, kept, known.sample.sample, k) == known.sample.species:
+                remaining.append(known)
+            else:
+                kept.append(known)
+                changed = True
+        absorbed = remaining
+    return kept
+
+
+class Reduction(NamedTuple):
+    """The effect of :meth:`TrainingData.reduce`."""
+
+    before: int
+    after: int
+    quality_before: float
+    quality_after: float
+
+    @property
+    def ratio(self) -> float:
+        """Fraction of the training samples removed."""
+        return 1 - self.after / self.before if self.before else 0.0
+
+    @property
+    def quality_change(self) -> float:
+        return self.quality_after - self.quality_before
+
+
 class TrainingData:
     """A set of training data and testing data with methods to load and test the samples."""
 
@@ -470,6 +584,18 @@ class TrainingData:
                 # print(train)
         self.uploaded = datetime.datetime.now(tz=datetime.timezone.utc)
 
+    def reduce(self, algorithm: Distance, k: int = 3) -> Reduction:
+        """
+        Replace the training samples with the prototypes needed to keep the decision boundaries:
+        :func:`wilson_edit` removes noisy samples, then :func:`condense` removes redundant ones.
+        The quality of ``Hyperparameter(k, algorithm, self)`` is tested before and after.
+        """
+        before = len(self.training)
+        quality_before = cast(float, Hyperparameter(k, algorithm, self).test().quality)
+        self.training = condense(wilson_edit(self.training, algorithm, k), algorithm, k)
+        quality_after = cast(float, Hyperparameter(k, algorithm, self).test().quality)
+        return Reduction(before, len(self.training), quality_before, quality_after)
+
     def classify(
         self, parameter: Hyperparameter, unknown: UnknownSample
     ) -> ClassifiedSample:
@@ -528,6 +654,304 @@ def grid_search_2() -> None:
             print(f"{k:2d} {algo_name:2s} {quality:.3f}")
 
 
+DISTANCES: dict[str, type[Distance]] = {
+    algo.__name__: algo for algo in (ED, MD, CD, SD)
+}
+
+
+class TuningResult(NamedTuple):
+    k: int
+    distance_name: str
+    quality: float
+    time: float  # Milliseconds, in the worker
+
+
+class IPCBytes(NamedTuple):
+    """
+    An estimate of what's sent between the parent and the workers: the pickled sizes
+    of the payloads. The executor's own call and result wrappers aren't counted.
+    """
+
+    initializer: int  # Once per worker
+    tasks: int
+    results: int
+
+
+# Each worker process has its own copy, set by worker_init().
+worker_training: Optional[TrainingData] = None
+
+
+def worker_init(training: TrainingData) -> None:
+    """Executor initializer: the training data arrives once per worker."""
+    global worker_training
+    worker_training = training
+
+
+def worker_tune(k: int, distance_name: str) -> TuningResult:
+    """Test one hyperparameter setting against the worker's training data."""
+    if worker_training is None:
+        raise RuntimeError("worker_init() was not run in this process")
+    start = time.perf_counter()
+    h = Hyperparameter(k, DISTANCES[distance_name](), worker_training)
+    h.test()
+    end = time.perf_counter()
+    return TuningResult(
+        k, distance_name, cast(float, h.quality), round((end - start) * 1000.0, 3)
+    )
+
+
+def tune_in_workers(
+    training: TrainingData,
+    k_values: Iterable[int],
+    distance_names: Iterable[str],
+    max_workers: Optional[int] = None,
+) -> tuple[list[TuningResult], IPCBytes]:
+    """
+    Variant 3:
+    Each worker gets the training data once, via the executor's initializer.
+    Each task is only ``(k, distance_name)``; each result is a :class:`TuningResult`.
+    """
+    names = list(distance_names)
+    tasks = [(k, name) for k in k_values for name in names]
+    results: list[TuningResult] = []
+    with futures.ProcessPoolExecutor(
+        max_workers, initializer=worker_init, initargs=(training,)
+    ) as workers:
+        test_runs = [workers.submit(worker_tune, *task) for task in tasks]
+        for f in futures.as_completed(test_runs):
+            results.append(f.result())
+    ipc = IPCBytes(
+        initializer=len(pickle.dumps((training,))),
+        tasks=sum(len(pickle.dumps(task)) for task in tasks),
+        results=sum(len(pickle.dumps(result)) for result in results),
+    )
+    return results, ipc
+
+
+def grid_search_3() -> None:
+    td = TrainingData("Iris")
+    source_path = Path.cwd().parent / "bezdekiris.data"
+    reader = CSVIrisReader(source_path)
+    td.load(reader.data_iter())
+    workers = 8
+    results, ipc = tune_in_workers(td, range(1, 41, 2), DISTANCES, workers)
+    for result in results:
+        print(
+            f"{result.k:2d} {result.distance_name:2s}"
+            f" {result.quality:.3f} {result.time:8.3f}ms"
+        )
+    # For comparison, grid_search_1() pickles a bound h.test for every task.
+    bound_method_bytes = sum(
+        len(pickle.dumps(Hyperparameter(r.k, DISTANCES[r.distance_name](), td).test))
+        for r in results
+    )
+    print(
+        f"IPC (estimated): initializer {ipc.initializer:,d} bytes x {workers} workers, "
+        f"tasks {ipc.tasks:,d} bytes, results {ipc.results:,d} bytes; "
+        f"bound-method tasks would be {bound_method_bytes:,d} bytes"
+    )
+
+
+def reduction_report() -> None:
+    source_path = Path.cwd().parent / "bezdekiris.data"
+    for k in 1, 3, 5:
+        for name, algo in DISTANCES.items():
+            td = TrainingData("Iris")
+            td.load(CSVIrisReader(source_path).data_iter())
+            start = time.perf_counter()
+            r = td.reduce(algo(), k)
+            end = time.perf_counter()
+            print(
+                f"{k:2d} {name:2s} {r.before:4d} -> {r.after:4d} ({r.ratio:.1%} removed)"
+                f" quality {r.quality_before:.3f} -> {r.quality_after:.3f}"
+                f" ({r.quality_change:+.3f}) {(end - start) * 1000:8.3f}ms"
+            )
+
+
+# Every distance that can be rebuilt from its name, for snapshots.
+SNAPSHOT_DISTANCES: dict[str, type[Distance]] = {
+    algo.__name__: algo
+    for algo in (
+        ED,
+        MD,
+        CD,
+        SD,
+        Chebyshev,
+        Euclidean,
+        Manhattan,
+        Sorensen,
+        CD2,
+        MD2,
+        ED2,
+        ED2S,
+    )
+}
+
+SNAPSHOT_MAGIC = b"HYPS"
+SNAPSHOT_VERSION = 1
+# Magic, version, rows, metadata size, metadata CRC-32, data CRC-32.
+SNAPSHOT_HEADER = struct.Struct("<4sHxxQIII")
+SNAPSHOT_DATA_OFFSET = 64
+
+
+def training_fingerprint(training: Iterable[TrainingKnownSample]) -> str:
+    """
+    The number of samples, and the sum of a CRC-32 of each sample.
+    The order of the samples doesn't matter.
+    """
+    count, total = 0, 0
+    for t in training:
+        ks = t.sample
+        crc = zlib.crc32(struct.pack("<4d", *ks.sample))
+        total += zlib.crc32(ks.species.encode("utf-8"), crc)
+        count += 1
+    return f"{count}:{total:016x}"
+
+
+def save_snapshot(target: Path, h: Hyperparameter) -> None:
+    """
+    Save a tuned hyperparameter: k, the name of the distance class, the training samples,
+    and a :func:`training_fingerprint`. See :class:`Snapshot`.
+    """
+    name = h.algorithm.__class__.__name__
+    if SNAPSHOT_DISTANCES.get(name) is not h.algorithm.__class__:
+        raise ValueError(f"can't save distance {name}")
+    training = h.data.training
+    species = sorted({t.sample.species for t in training})
+    code = {name: i for i, name in enumerate(species)}
+    features = array("d", (x for t in training for x in t.sample.sample))
+    codes = array("H", (code[t.sample.species] for t in training))
+    if sys.byteorder == "big":
+        features.byteswap()
+        codes.byteswap()
+    metadata = json.dumps(
+        {
+            "k": h.k,
+            "distance": name,
+            "name": h.data.name,
+            "fingerprint": training_fingerprint(training),
+            "species": species,
+        }
+    ).encode("utf-8")
+    data = features.tobytes() + codes.tobytes()
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        len(training),
+        len(metadata),
+        zlib.crc32(metadata),
+        zlib.crc32(data),
+    )
+    data_offset = max(SNAPSHOT_DATA_OFFSET, -(-(len(header) + len(metadata)) // 8) * 8)
+    with target.open("wb") as output:
+        output.write(header + metadata)
+        output.write(bytes(data_offset - output.tell()))
+        output.write(data)
+
+
+class Snapshot:
+    """
+    A saved hyperparameter, memory-mapped.
+    Opening it only reads and checks the header and the metadata.
+    The training samples are checked and created by :meth:`hyperparameter`.
+    Use it as a context manager, or :meth:`close` it, to release the file.
+
+    >>> from tempfile import TemporaryDirectory
+    >>> td = TrainingData("test")
+    >>> td.load([
+    ...     {"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4, "petal_width": 0.2, "species": "Iris-setosa"},
+    ...     {"sepal_length": 7.9, "sepal_width": 3.2, "petal_length": 4.7, "petal_width": 1.4, "species": "Iris-versicolor"},
+    ...     {"sepal_length": 5.2, "sepal_width": 3.4, "petal_length": 1.5, "petal_width": 0.2, "species": "Iris-setosa"},
+    ... ])
+    >>> with TemporaryDirectory() as directory:
+    ...     path = Path(directory) / "iris.snapshot"
+    ...     save_snapshot(path, Hyperparameter(1, ED(), td))
+    ...     with Snapshot(path) as snapshot:
+    ...         print(snapshot.metadata["k"], snapshot.metadata["distance"], len(snapshot))
+    ...         h = snapshot.hyperparameter()
+    1 ED 2
+    >>> h.data.training == td.training
+    True
+    >>> snapshot.metadata["fingerprint"] == training_fingerprint(td.training)
+    True
+    >>> h.classify(UnknownSample(Sample(7.8, 3.1, 4.7, 1.5)))
+    'Iris-versicolor'
+    """
+
+    def __init__(self, source: Path) -> None:
+        self.source = source
+        with source.open("rb") as source_file:
+            self.map = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.read_header()
+        except BaseException:
+            self.map.close()
+            raise
+
+    def read_header(self) -> None:
+        """Check the header and the metadata, and find the samples."""
+        source = self.source
+        if len(self.map) < SNAPSHOT_HEADER.size:
+            raise ValueError(f"{source} is too short to be a snapshot")
+        (
+            magic,
+            version,
+            self.rows,
+            metadata_size,
+            metadata_crc,
+            self.data_crc,
+        ) = SNAPSHOT_HEADER.unpack_from(self.map)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"{source} isn't a version {SNAPSHOT_VERSION} snapshot")
+        metadata = self.map[SNAPSHOT_HEADER.size : SNAPSHOT_HEADER.size + metadata_size]
+        if zlib.crc32(metadata) != metadata_crc:
+            raise ValueError(f"{source} metadata checksum doesn't match")
+        self.metadata: dict[str, Any] = json.loads(metadata)
+        self.data_offset = len(self.map) - (4 * 8 + 2) * self.rows
+        if self.data_offset < SNAPSHOT_HEADER.size + metadata_size:
+            raise ValueError(f"{source} is truncated")
+
+    def __len__(self) -> int:
+        return cast(int, self.rows)
+
+    def __enter__(self) -> Snapshot:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the file; the samples that were created are copies, and don't need it."""
+        self.map.close()
+
+    def training(self) -> list[TrainingKnownSample]:
+        """Check the samples against the checksum, and create them."""
+        if sys.byteorder == "big":
+            raise ValueError("snapshots are little-endian")
+        with memoryview(self.map) as whole:
+            data = whole[self.data_offset :]
+            if zlib.crc32(data) != self.data_crc:
+                raise ValueError(f"{self.source} data checksum doesn't match")
+            features = data[: 4 * 8 * self.rows].cast("d").tolist()
+            codes = data[4 * 8 * self.rows :].cast("H").tolist()
+            data.release()
+        species = self.metadata["species"]
+        return [
+            TrainingKnownSample(
+                KnownSample(Sample(*features[4 * i : 4 * i + 4]), species[code])
+            )
+            for i, code in enumerate(codes)
+        ]
+
+    def hyperparameter(self) -> Hyperparameter:
+        """A :class:`Hyperparameter` with a :class:`TrainingData` of the saved samples."""
+        td = TrainingData(self.metadata["name"])
+        td.training = self.training()
+        td.uploaded = datetime.datetime.now(tz=datetime.timezone.utc)
+        algorithm = SNAPSHOT_DISTANCES[self.metadata["distance"]]()
+        return Hyperparameter(self.metadata["k"], algorithm, td)
+
+
 # Special case, we don't *often* test abstract superclasses.
 # In this example, however, we can create instances of the abstract class.
 test_Sample = """
@@ -696,8 +1120,6 @@ data='test', k=3, quality=0.0
 
 __test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
 
-import time
-
 if __name__ == "__main__":
     start = time.perf_counter()
     grid_search_1()
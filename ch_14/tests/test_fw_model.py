@@ -4,11 +4,13 @@ Python 3 Object-Oriented Programming
 Chapter 13.  Testing Object-Oriented Programs.
 """
 from __future__ import annotations
+import gc
+import sys
 import pytest
 from fw_model import TrainingKnownSample, UnknownSample, KnownSample, Sample, USample
 from fw_model import CD, ED, MD, SD
 from fw_model import SharedSamplesCSV
-from typing import Tuple, TypedDict, TextIO
+from typing import Any, Tuple, TypedDict, TextIO
 from multiprocessing.managers import SharedMemoryManager
 
 
@@ -73,6 +75,51 @@ def test_sd(known_unknown_example_15: Known_Unknown) -> None:
     assert SD().distance(k.sample.sample, u.sample) == pytest.approx(0.2773722627)
 
 
+from fw_model import SharedSamplesColumns, SharedColumnsName
+from concurrent import futures
+
+
+def worker_species(name: SharedColumnsName) -> list[tuple[str, float]]:
+    with SharedSamplesColumns(name) as factory:
+        samples = [KnownSample(factory, i) for i in range(len(factory))]
+        return [(s.species, s.sample.petal_width) for s in samples]
+
+
+def test_shared_columns() -> None:
+    rows = [
+        {"sepal_length": "5.1", "sepal_width": "3.5", "petal_length": "1.4", "petal_width": "0.2", "species": "Iris-setosa"},
+        {"sepal_length": "7.9", "sepal_width": "3.2", "petal_length": "4.7", "petal_width": "1.4", "species": "Iris-versicolor"},
+        {"sepal_length": "4.9", "sepal_width": "3.0", "petal_length": "1.4", "petal_width": "0.3", "species": "Iris-setosa"},
+    ]
+    with SharedMemoryManager() as smm:
+        factory = SharedSamplesColumns.load(smm, rows)
+        assert len(factory) == 3
+        assert factory.columns.sepal_width[1] == pytest.approx(3.2)
+        assert list(factory.columns.species) == ["Iris-setosa", "Iris-versicolor", "Iris-setosa"]
+        with futures.ProcessPoolExecutor(1) as workers:
+            result = workers.submit(worker_species, factory.name).result()
+        assert result == [("Iris-setosa", 0.2), ("Iris-versicolor", 1.4), ("Iris-setosa", 0.3)]
+        factory.close()
+
+
+def test_shared_columns_close(monkeypatch: pytest.MonkeyPatch) -> None:
+    rows = [
+        {"sepal_length": "5.1", "sepal_width": "3.5", "petal_length": "1.4", "petal_width": "0.2", "species": "Iris-setosa"},
+    ]
+    unraisable: list[Any] = []
+    monkeypatch.setattr(sys, "unraisablehook", unraisable.append)
+    with SharedMemoryManager() as smm:
+        with SharedSamplesColumns.load(smm, rows) as factory:
+            sample = KnownSample(factory, 0)
+            assert sample.species == "Iris-setosa"
+        with pytest.raises(ValueError):
+            factory.columns.sepal_length[0]
+        factory.close()
+        del sample, factory
+        gc.collect()
+    assert unraisable == []
+
+
 from model import Hyperparameter
 from unittest.mock import Mock, sentinel, call
 
@@ -107,3 +154,71 @@ def test_hyperparameter(sample_data: list[Mock], hyperparameter: Mock) -> None:
         call(sample_data[3].sample.sample, sentinel.Unknown),
         call(sample_data[4].sample.sample, sentinel.Unknown),
     ]
+
+
+import multiprocessing
+from fw_model import GridCoordinator, GridManager, serve_grid, grid_worker
+
+
+def test_grid_localhost_workers() -> None:
+    rows = [
+        {
+            "sepal_length": "5.1",
+            "sepal_width": "3.5",
+            "petal_length": "1.4",
+            "petal_width": "0.2",
+            "species": "Iris-setosa",
+        },
+        {
+            "sepal_length": "4.9",
+            "sepal_width": "3.0",
+            "petal_length": "1.4",
+            "petal_width": "0.2",
+            "species": "Iris-setosa",
+        },
+        {
+            "sepal_length": "7.0",
+            "sepal_width": "3.2",
+            "petal_length": "4.7",
+            "petal_width": "1.4",
+            "species": "Iris-versicolor",
+        },
+        {
+            "sepal_length": "6.4",
+            "sepal_width": "3.2",
+            "petal_length": "4.5",
+            "petal_width": "1.5",
+            "species": "Iris-versicolor",
+        },
+        {
+            "sepal_length": "6.9",
+            "sepal_width": "3.1",
+            "petal_length": "4.9",
+            "petal_width": "1.5",
+            "species": "Iris-versicolor",
+        },
+    ]
+    work = [(k, algo) for k in (1, 3) for algo in ("ED", "MD", "CD", "SD")]
+    coordinator = GridCoordinator(work, rows, lease=0.5)
+    server, thread = serve_grid(coordinator, ("127.0.0.1", 0), b"test")
+    # Serving a coordinator doesn't register it with every GridManager.
+    assert GridManager._registry["coordinator"][0] is None
+    # A worker that takes an item and dies: the item must be re-queued.
+    lost = coordinator.get_work("lost")
+    workers = [
+        multiprocessing.Process(
+            target=grid_worker, args=(server.address, b"test", f"w{i}")
+        )
+        for i in range(3)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(timeout=30)
+        assert w.exitcode == 0
+    server.stop_event.set()
+    assert coordinator.finished()
+    results = {(r.k, r.algorithm): r for r in coordinator.results()}
+    assert set(results) == set(work)
+    assert results[lost].worker != "lost"
+    assert results[(1, "ED")].quality == 1.0
@@ -111,3 +111,79 @@ def test_hyperparameter(sample_data: list[Mock], hyperparameter: Mock) -> None:
         call(sample_data[3].sample.sample, sentinel.Unknown),
         call(sample_data[4].sample.sample, sentinel.Unknown),
     ]
+
+
+from model import TrainingData, tune_in_workers
+
+
+def test_tune_in_workers() -> None:
+    td = TrainingData("test")
+    td.load(
+        [
+            {"sepal_length": "5.1", "sepal_width": "3.5", "petal_length": "1.4", "petal_width": "0.2", "species": "Iris-setosa"},
+            {"sepal_length": "4.9", "sepal_width": "3.0", "petal_length": "1.4", "petal_width": "0.2", "species": "Iris-setosa"},
+            {"sepal_length": "7.0", "sepal_width": "3.2", "petal_length": "4.7", "petal_width": "1.4", "species": "Iris-versicolor"},
+        ]
+    )
+    # Each distance name is used for every k, even from a generator.
+    names = (name for name in ["ED", "CD"])
+    results, ipc = tune_in_workers(td, [1, 3], names, max_workers=2)
+    assert sorted((r.k, r.distance_name, r.quality) for r in results) == [
+        (1, "CD", 1.0), (1, "ED", 1.0), (3, "CD", 1.0), (3, "ED", 1.0)
+    ]
+    assert all(r.time >= 0 for r in results)
+    assert ipc.tasks < ipc.initializer
+
+
+def test_reduce() -> None:
+    td = TrainingData("test")
+    td.load(
+        {
+            "sepal_length": str(5.0 + (n % 7) / 10),
+            "sepal_width": "3.4",
+            "petal_length": str(1.4 if n % 2 else 4.5),
+            "petal_width": "0.2",
+            "species": "Iris-setosa" if n % 2 else "Iris-versicolor",
+        }
+        for n in range(50)
+    )
+    reduction = td.reduce(ED(), k=1)
+    assert reduction.before == 40
+    assert reduction.after == len(td.training) == 2
+    assert reduction.ratio == 0.95
+    assert reduction.quality_before == reduction.quality_after == 1.0
+
+
+from pathlib import Path
+from model import CD2, Snapshot, save_snapshot
+
+
+def test_snapshot(tmp_path: Path) -> None:
+    td = TrainingData("test")
+    td.load(
+        {
+            "sepal_length": str(5.0 + n / 10),
+            "sepal_width": "3.4",
+            "petal_length": "1.4",
+            "petal_width": "0.2",
+            "species": "Iris-setosa" if n % 2 else "Iris-versicolor",
+        }
+        for n in range(10)
+    )
+    path = tmp_path / "iris.snapshot"
+    save_snapshot(path, Hyperparameter(3, CD2(), td))
+    with Snapshot(path) as snapshot:
+        h = snapshot.hyperparameter()
+    with pytest.raises(ValueError):
+        snapshot.map.size()  # The file is released.
+    assert (h.k, type(h.algorithm), h.data.name) == (3, CD2, "test")
+    assert h.data.training == td.training
+    with path.open("r+b") as damaged:
+        damaged.seek(-1, 2)
+        damaged.write(b"\xff")
+    with pytest.raises(ValueError):
+        Snapshot(path).hyperparameter()
+    class Unregistered(ED):
+        pass
+    with pytest.raises(ValueError):
+        save_snapshot(path, Hyperparameter(3, Unregistered(), td))